@@ -0,0 +1,310 @@
+"""
+Precomputed artifact bundle for the derived tables in data_prep.
+
+A bundle is a directory of uncompressed Feather files (one per table), JSON
+documents and plain files (the state shape files, components.geometry) plus a
+``manifest.json`` holding the format version, the content hashes of the
+inputs it was built from, and the size, mtime and SHA-256 of every file
+(with the schema and row count of the tables). Bundles are named by a hash of
+their inputs, so a bundle holds exactly one version of the data.
+
+Versions are built in one place, the build/watch command, never in the
+serving workers: it fetches the inputs, writes the bundle, the download files
+and the pre-rendered figures of a new version, and then publishes it by
+rewriting the POINTER file. Workers poll that file and re-open the published
+bundle, which is memory-mapped and so shared between them.
+
+The SHA-256 is taken once, when the bundle is written. Loading only compares
+each file's size and mtime with the manifest (and hashes a file only when
+they differ), so starting a worker doesn't read the whole bundle; --verify
+hashes every file.
+
+Build once, or keep building as the inputs change (from the app directory):
+    python -m components.artifacts build [--force] [--verify] [--workers N]
+    python -m components.artifacts watch [--workers N]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+
+import pyarrow.feather as feather
+
+from components import snapshot
+
+log = logging.getLogger(__name__)
+
+# Bump when build_tables changes so bundles from older code are not reused
+FORMAT = 8
+ARTIFACT_DIR = os.environ.get('ARTIFACT_DIR', os.path.join(snapshot.CACHE_DIR, 'artifacts'))
+KEEP = 2  # bundles kept on disk, newest first
+POINTER = 'CURRENT'  # file naming the published bundle
+
+
+def bundle_id(sources):
+    key = json.dumps({'format': FORMAT, 'sources': sources}, sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def _flatten(tables, prefix=''):
+    """Yield (name, frame) with nested dict keys joined by '/' (e.g. 'STATS/China/mean')."""
+    for key, value in tables.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, prefix + key + '/')
+        else:
+            yield prefix + key, value
+
+
+def _unflatten(flat):
+    tables = {}
+    for name, value in flat.items():
+        *parents, leaf = name.split('/')
+        node = tables
+        for p in parents:
+            node = node.setdefault(p, {})
+        node[leaf] = value
+    return tables
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _stat(path):
+    st = os.stat(path)
+    return {'bytes': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _check(path, info, verify=False):
+    """True if the file at ``path`` is the one the manifest ``info`` describes."""
+    try:
+        unchanged = _stat(path) == {'bytes': info.get('bytes'), 'mtime_ns': info.get('mtime_ns')}
+    except OSError:
+        return False
+    if unchanged and not verify:
+        return True
+    # Copied or touched (or --verify): the content decides
+    return _sha256(path) == info['sha256']
+
+
+def path(bundle, out_dir=ARTIFACT_DIR):
+    """Directory of ``bundle``."""
+    return os.path.join(out_dir, bundle)
+
+
+def files_dir(bundle, out_dir=ARTIFACT_DIR):
+    """Directory of the files stored as is in ``bundle`` (see write)."""
+    return os.path.join(out_dir, bundle, 'files')
+
+
+def _member(root, file, **extra):
+    full = os.path.join(root, file)
+    return {'file': file, 'sha256': _sha256(full), **_stat(full), **extra}
+
+
+def write(tables, sources, out_dir=ARTIFACT_DIR, documents=None, files=None):
+    """
+    Write ``tables`` as a bundle for ``sources``.
+
+    Args:
+        tables (dict): Frames by name; per-country tables as nested dicts
+        documents (dict): JSON values by name, loaded next to the tables
+        files (dict): File name -> bytes, stored as is under files_dir() (not loaded)
+
+    Returns:
+        str: Path of the bundle directory
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    final = path(bundle_id(sources), out_dir)
+    tmp = '{}.tmp-{}'.format(final, os.getpid())
+    os.makedirs(os.path.join(tmp, 'files'))
+
+    manifest = {'format': FORMAT, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'sources': sources, 'tables': {}, 'documents': {}, 'files': {}}
+    written = {}
+    for name, frame in _flatten(tables):
+        # Tables shared between names (DFILT_V2 is DFILT) are stored once
+        if id(frame) in written:
+            manifest['tables'][name] = {'alias': written[id(frame)]}
+            continue
+        written[id(frame)] = name
+        file = re.sub(r'\W+', '_', name) + '.feather'
+        feather.write_feather(frame, os.path.join(tmp, file), compression='uncompressed')
+        manifest['tables'][name] = _member(tmp, file, rows=len(frame),
+                                           schema={str(c): str(t) for c, t in frame.dtypes.items()})
+    for name, value in (documents or {}).items():
+        file = re.sub(r'\W+', '_', name) + '.json'
+        with open(os.path.join(tmp, file), 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False)
+        manifest['documents'][name] = _member(tmp, file)
+    for name, body in (files or {}).items():
+        with open(os.path.join(tmp, 'files', name), 'wb') as f:
+            f.write(body)
+        manifest['files'][name] = _member(tmp, 'files/' + name)
+    with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=1, ensure_ascii=False)
+
+    if os.path.exists(final):
+        shutil.rmtree(final)
+    os.replace(tmp, final)
+    _prune(out_dir)
+    return final
+
+
+def _prune(out_dir):
+    keep = published(out_dir)
+    bundles = sorted((d for d in os.listdir(out_dir)
+                      if os.path.exists(os.path.join(out_dir, d, 'manifest.json'))),
+                     key=lambda d: os.path.getmtime(os.path.join(out_dir, d)), reverse=True)
+    for old in bundles[KEEP:]:
+        if old != keep:
+            shutil.rmtree(os.path.join(out_dir, old), ignore_errors=True)
+
+
+def publish(bundle, out_dir=ARTIFACT_DIR):
+    """Make ``bundle`` the version the workers serve (they poll published())."""
+    pointer = os.path.join(out_dir, POINTER)
+    tmp = '{}.tmp-{}'.format(pointer, os.getpid())
+    with open(tmp, 'w') as f:
+        f.write(bundle)
+    os.replace(tmp, pointer)
+    log.info('Published artifact bundle %s', bundle)
+
+
+def published(out_dir=ARTIFACT_DIR):
+    """Id of the published bundle, None before the first publish."""
+    try:
+        with open(os.path.join(out_dir, POINTER)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def read(bundle, out_dir=ARTIFACT_DIR, verify=False):
+    """
+    Load a bundle by id.
+
+    Args:
+        verify (bool): Hash every file rather than comparing size and mtime
+
+    Returns:
+        tuple: (sources, tables): the inputs it was built from and its tables and documents in
+        the nesting they were written with, or None when there is no valid bundle ``bundle``
+    """
+    root = path(bundle, out_dir)
+    try:
+        with open(os.path.join(root, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('format') != FORMAT:
+        return None
+    for name, info in manifest['files'].items():
+        if not _check(os.path.join(root, info['file']), info, verify):
+            log.warning('Artifact %s does not match its manifest', info['file'])
+            return None
+
+    flat = {}
+    for name, info in manifest['tables'].items():
+        if 'alias' in info:
+            continue
+        file = os.path.join(root, info['file'])
+        if not _check(file, info, verify):
+            log.warning('Artifact %s does not match its manifest', file)
+            return None
+        # One block per column lets numeric columns stay views of the mapped file, so the
+        # pages live in the OS page cache and are shared by every worker process
+        flat[name] = feather.read_table(file, memory_map=True).to_pandas(split_blocks=True)
+    for name, info in manifest['tables'].items():
+        if 'alias' in info:
+            flat[name] = flat[info['alias']]
+    tables = _unflatten(flat)
+    for name, info in manifest['documents'].items():
+        file = os.path.join(root, info['file'])
+        if not _check(file, info, verify):
+            log.warning('Artifact %s does not match its manifest', file)
+            return None
+        with open(file, encoding='utf-8') as f:
+            tables[name] = json.load(f)
+    log.info('Loaded artifact bundle %s', root)
+    return manifest['sources'], tables
+
+
+def load(sources, out_dir=ARTIFACT_DIR, verify=False):
+    """
+    Load the bundle built from ``sources``.
+
+    Returns:
+        dict: Tables and documents (see read), or None when there is no valid bundle for these inputs
+    """
+    loaded = read(bundle_id(sources), out_dir, verify)
+    if loaded is None or loaded[0] != sources:
+        return None
+    return loaded[1]
+
+
+def build(force=False, verify=False, workers=None):
+    """
+    Bring the published version up to date with the inputs and publish it.
+
+    The bundle of the current inputs is built (or reused), then its download
+    files (components.partitions) and pre-rendered figures
+    (components.prerender) are written, and only then is it published, so a
+    worker that switches to it finds everything in place.
+
+    Args:
+        force (bool): Rebuild the bundle, the files and the figures even if they exist
+        verify (bool): Hash every file of an existing bundle
+        workers (int): Pool size of the partition and pre-render steps
+
+    Returns:
+        str: The published version
+    """
+    from components import data_prep, partitions, prerender
+    data_prep.update(force, verify)
+    version = data_prep.current().version
+    if force or version != published():
+        partitions.build(workers, force=force)
+        prerender.warm(workers)
+        publish(version)
+    return version
+
+
+def watch(interval=None, workers=None):
+    """Run build() every ``interval`` seconds (DATA_REFRESH_SECONDS); gunicorn.conf.py starts this next to the master."""
+    from components import data_prep
+    interval = interval or data_prep.REFRESH_SECONDS
+    while True:
+        try:
+            build(workers=workers)
+        except Exception:
+            log.exception('Dataset update failed; still publishing version %s', published())
+        time.sleep(interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m components.artifacts')
+    parser.add_argument('command', choices=['build', 'watch'])
+    parser.add_argument('--force', action='store_true', help='rebuild even if a bundle for the inputs exists')
+    parser.add_argument('--verify', action='store_true', help='hash every file of an existing bundle')
+    parser.add_argument('--workers', type=int, default=None, help='pool size (default: all CPUs)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'watch':
+        return watch(workers=args.workers)
+    start = time.perf_counter()
+    version = build(args.force, args.verify, args.workers)
+    print('Published {} in {:.1f}s'.format(path(version), time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -178,20 +178,52 @@ def pol_buttons(ident, selected_value='PM'):
 
 
 def pop_weighted(ident):
-    wgt = dbc.RadioItems(
+    wgt = html.Div([
+        html.H6("Regional mean", style={
+            'margin-bottom': '5px',
+            'font-weight': 'bold',
+            'color': '#000000',
+            'font-size': '18px',
+            'font-family': 'helvetica'
+        }),
+        dbc.RadioItems(
                     id='crossfilter-data-type'+ident,
                     className="btn-group",
                     inputClassName="btn-check",
                     labelClassName="btn btn-outline-secondary",
-                    labelCheckedClassName="secondary",
+                    labelCheckedClassName="selected-button",
                     options=[{'label': i, 'value': i} for i in ['Unweighted','Population Weighted']],
                     value='Unweighted',
                     labelStyle={'display': 'inline-block'}
                 )
+    ], className="control-group")
     return wgt
 
 
 
+def map_mode(ident):
+    mode = html.Div([
+        html.H6("Display", style={
+            'margin-bottom': '5px',
+            'font-weight': 'bold',
+            'color': '#000000',
+            'font-size': '18px',
+            'font-family': 'helvetica'
+        }),
+        dbc.RadioItems(
+                    id='map-mode'+ident,
+                    className="btn-group",
+                    inputClassName="btn-check",
+                    labelClassName="btn btn-outline-secondary",
+                    labelCheckedClassName="selected-button",
+                    options=[{'label': i, 'value': i} for i in ['Cities','Aggregated']],
+                    value='Cities',
+                    labelStyle={'display': 'inline-block'}
+                )
+    ], className="control-group")
+    return mode
+
+
 def metric_options(is_co2_selected):
     """
     Generate the available metric options based on whether CO2 is selected
@@ -1,31 +1,22 @@
 import pandas as pd
 import numpy as np
-import json
 import pickle
-from urllib.request import urlopen
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from components import snapshot, artifacts, schema, aggregate, lookup, tensor, geobin, geometry, search, hierarchy
+
+log = logging.getLogger(__name__)
 
 
 
 ## Data cleaning/handling
-df = pd.read_csv('https://raw.githubusercontent.com/anenbergresearch/app-files/main/unified_data_SYK_Apr2025.csv')
-
-def w_avg(df, values, weights):
-    d = df[values]
-    w = df[weights]
-    return (d * w).sum() / w.sum()
-
-## Filter df
-ds= df.query('Year<2005') #subsetted data before 2005
-da = df.query('Year>=2005') #subsetted data after 2005
-##Find 0 values in 2000
-s =df.query('Year ==2000 & NO2==0')
-ds.loc[(ds['ID'].isin(s.ID)),('NO2')] =np.nan
-ds.loc[(ds.ID ==923),('NO2')]=np.nan
-##Dataframe to be passed to other pages
-DFILT = pd.concat([ds,da]) #merged
-DFILT_V2 = DFILT.copy()
-
-# V2 column 
+DATA_URL = snapshot.APP_FILES + 'unified_data_SYK_Apr2025.csv'
+
+# V2 column
 V2_COLUMN_MAPPING = {
     'PM': 'Pw_PM_V2',
     'NO2': 'Pw_NO2_V2',
@@ -41,60 +32,51 @@ V1_COLUMN_MAPPING = {
 
 
 
-    
-## Percent change calculation : % change between two 2-year moving averages    
-def calculate_change(low,high,df,pol):
+
+## Percent change calculation : % change between two 2-year moving averages
+def calculate_change(low,high,df,pols):
+    """Percent change by CityCountry for each column in ``pols`` (one column name returns a Series)."""
+    cols = [pols] if isinstance(pols, str) else list(pols)
     lowb = low+1
     highb = high-1
-    ldf= df.query('@low <=Year <=@lowb').groupby('CityCountry')[['Population',pol]].mean()
-    hdf = df.query('@highb <=Year <=@high').groupby('CityCountry')[['Population',pol]].mean()
-    return ((hdf[pol]-ldf[pol])/ldf[pol])*100
-
-DF_CHANGE = DFILT.query('Year == 2019')[['CityCountry','Latitude','Longitude','Population','C40']].set_index('CityCountry') #empty template for percent change values
-for i in ['Pw_PM', 'Pw_NO2','Pw_O3','CO2']:
-    DF_CHANGE[i] = calculate_change(2010,2019,DFILT,i)
-DF_CHANGE.reset_index(inplace=True) 
-
-DF_CHANGE_V2 = DFILT.query('Year == 2019')[['CityCountry','Latitude','Longitude','Population','C40']].set_index('CityCountry') #empty template for percent change values
-for i in ['Pw_PM_V2','Pw_NO2_V2','Pw_O3_V2','CO2_V2']:
-    DF_CHANGE_V2[i] = calculate_change(2010,2019,DFILT,i)
-DF_CHANGE_V2.reset_index(inplace=True) 
-
-
-
+    ldf = aggregate.group_stats(df[df.Year.between(low, lowb)], ['CityCountry'], cols)['mean'].set_index('CityCountry')
+    hdf = aggregate.group_stats(df[df.Year.between(highb, high)], ['CityCountry'], cols)['mean'].set_index('CityCountry')
+    change = ((hdf-ldf)/ldf)*100
+    return change[pols] if isinstance(pols, str) else change
 
 
 col_stats = ['Population','Pw_NO2','Pw_PM','Pw_O3','CO2','PAF_PM','PAF_NO2','PAF_O3','Cases_NO2','Cases_PM','Cases_O3','Rates_NO2','Rates_O3','Rates_PM'] #Column Selection
 col_stats_v2 = ['Population','Pw_NO2_V2','Pw_PM_V2','Pw_O3_V2','CO2_V2'] #Column Selection
+CONT_QUANTILES = (0.25, 0.75)
 
 
-## Regional (country or state) summary statistics (min/max, population-weighted mean) 
-def find_stats(dataframe, region, version):
+## Regional (country, state or continent) summary statistics (min/max, mean and population-weighted mean)
+def find_stats(dataframe, region, version, quantiles=()):
     # Select appropriate columns based on version
     if version == '1':
         cols = col_stats
     else:  # version == '2'
         cols = col_stats_v2
-    
-    # Mean by region/year
-    me = dataframe.groupby([region, 'Year']).mean(numeric_only=True)[cols].round(decimals=2)
-    me.Population = me.Population.round(decimals=-3)
-    me = me.reset_index()
-    
-    # Max by region/year
-    ma = dataframe.groupby([region, 'Year']).max(numeric_only=True)[cols].round(decimals=2)
-    ma.Population = me.Population
-    ma = ma.reset_index()
-    
-    # Min by region/year
-    mi = dataframe.groupby([region, 'Year']).min(numeric_only=True)[cols].round(decimals=2)
-    mi.Population = me.Population
-    mi = mi.reset_index()
-    
-    return me, ma, mi
 
-MEAN, MAX, MIN = find_stats(DFILT, 'Country', '1')
-MEAN_V2, MAX_V2, MIN_V2 = find_stats(DFILT_V2, 'Country', '2')
+    # Mean/max/min by region/year in one grouped pass
+    groups = aggregate.Groups(dataframe, [region, 'Year'])
+    res = groups.stats(dataframe, cols, ('mean', 'max', 'min'))
+    me, ma, mi = (res[s].round({c: 2 for c in cols}) for s in ('mean', 'max', 'min'))
+    # Population-weighted means as w_<column>, for the "Population Weighted" toggle, and
+    # population-weighted quantiles as w<percent>_<column> (w25_Pw_PM: a quarter of the people live below it)
+    w = groups.stats(dataframe, cols[1:], quantiles=quantiles, weights='Population')
+    for c in cols[1:]:
+        me['w_' + c] = w['mean'][c].round(2)
+        for q in quantiles:
+            me['w{:g}_{}'.format(q * 100, c)] = w[q][c].round(2)
+    me['Population'] = me.Population.round(decimals=-3)
+    ma['Population'] = me.Population
+    mi['Population'] = me.Population
+
+    # Region names are used in hover text, so keep them as plain strings
+    for t in (me, ma, mi):
+        t[region] = t[region].astype(str)
+    return me, ma, mi
 
 
 
@@ -102,7 +84,7 @@ def get_column_name(version, metric, pollutant):
     # Version 2 only supports Concentration
     if version == '2':
         return V2_COLUMN_MAPPING.get(pollutant, pollutant + '_V2')
-    
+
     # Version 1 mapping
     if metric == 'Concentration':
         return V1_COLUMN_MAPPING[pollutant]
@@ -112,61 +94,365 @@ def get_column_name(version, metric, pollutant):
         return f'Cases_{pollutant}'
     elif metric == 'Rates':
         return f'Rates_{pollutant}'
-    
+
     # Default to concentration if no match
     return pollutant
 
 
 
+countries = ['United States','China','India'] #Country selection
+col_select = ['ID','City','C40','Year','Population','Pw_NO2','Pw_PM','Pw_O3','CO2','PAF_PM','PAF_NO2','PAF_O3','Cases_NO2','Cases_PM','Cases_O3','Rates_NO2','Rates_O3','Rates_PM']
+col_select_v2 = ['ID','City','C40','Year','Population','Pw_NO2_V2','Pw_PM_V2','Pw_O3_V2','CO2_V2']
 
 
+def build_tables(df, states_df, id_dict, compact=True):
+    """
+    Run the full cleaning/aggregation pipeline on the unified dataset.
+
+    Args:
+        df (pandas.DataFrame): Unified dataset as read from the CSV
+        states_df (dict): IDtoState table per country
+        id_dict (dict): State name translations per country
+        compact (bool): Apply the compact dtype schema (see components.schema)
+
+    Returns:
+        dict: Derived tables by name; per-country tables are nested dicts
+    """
+    if compact:
+        df = schema.apply(df)
+
+    ## Filter df
+    ds= df.query('Year<2005') #subsetted data before 2005
+    da = df.query('Year>=2005') #subsetted data after 2005
+    ##Find 0 values in 2000
+    s =df.query('Year ==2000 & NO2==0')
+    ds.loc[(ds['ID'].isin(s.ID)),('NO2')] =np.nan
+    ds.loc[(ds.ID ==923),('NO2')]=np.nan
+    ##Dataframe to be passed to other pages
+    DFILT = pd.concat([ds,da]).sort_values('Year', kind='stable', ignore_index=True) #merged, each year contiguous (see components.lookup)
+    # Read-only for the pages, so V2 shares the frame instead of holding a copy
+    DFILT_V2 = DFILT if compact else DFILT.copy()
+
+    DF_CHANGE = DFILT.query('Year == 2019')[['CityCountry','Latitude','Longitude','Population','C40']].set_index('CityCountry') #empty template for percent change values
+    change = calculate_change(2010,2019,DFILT,['Pw_PM', 'Pw_NO2','Pw_O3','CO2'])
+    for i in change.columns:
+        DF_CHANGE[i] = change[i]
+    DF_CHANGE.reset_index(inplace=True)
+
+    DF_CHANGE_V2 = DFILT.query('Year == 2019')[['CityCountry','Latitude','Longitude','Population','C40']].set_index('CityCountry') #empty template for percent change values
+    change = calculate_change(2010,2019,DFILT,['Pw_PM_V2','Pw_NO2_V2','Pw_O3_V2','CO2_V2'])
+    for i in change.columns:
+        DF_CHANGE_V2[i] = change[i]
+    DF_CHANGE_V2.reset_index(inplace=True)
+
+    MEAN, MAX, MIN = find_stats(DFILT, 'Country', '1')
+    MEAN_V2, MAX_V2, MIN_V2 = find_stats(DFILT_V2, 'Country', '2')
+    # Continent trends behind the cities page time series: weighted mean and interquartile band
+    MEAN_CONT = find_stats(DFILT, 'continent', '1', CONT_QUANTILES)[0]
+    MEAN_CONT_V2 = find_stats(DFILT_V2, 'continent', '2', CONT_QUANTILES)[0]
+
+    ## Data handling/cleaning for "States" tab
+    DF = {}
+    MEAN_DF = {}
+    STATS ={}
+
+    DF_V2 = {}
+    MEAN_DF_V2 = {}
+    STATS_V2 ={}
+
+    # V1 data preparation
+    for i in countries:
+        DF[i] = DFILT.query('Country ==@i')[col_select]
+        DF[i] = DF[i].merge(states_df[i][['ID','State']], how='left',on='ID')
+        if i =='China':
+            DF[i] = DF[i][DF[i].State != '자강도']
+            DF[i]["State"] = DF[i]["State"].apply(lambda x: id_dict[i][x])
+        DF[i]['CityID'] = DF[i].City.astype(str) + ' (' +DF[i].ID.apply(int).apply(str) +')' #create column CityID with "CityName (ID)"
+        mean_, max_, min_ = find_stats(DF[i],'State', '1')
+        STATS[i]={'mean':mean_,'min':min_,'max':max_}
+        MEAN_DF[i] = DF[i].groupby('Year')[col_stats[1:]].mean().reset_index()
+    # V2 data preparation
+    for i in countries:
+        DF_V2[i] = DFILT_V2.query('Country ==@i')[col_select_v2]
+        DF_V2[i] = DF_V2[i].merge(states_df[i][['ID','State']], how='left',on='ID')
+        if i =='China':
+            DF_V2[i] = DF_V2[i][DF_V2[i].State != '자강도']
+            DF_V2[i]["State"] = DF_V2[i]["State"].apply(lambda x: id_dict[i][x])
+        DF_V2[i]['CityID'] = DF_V2[i].City.astype(str) + ' (' +DF_V2[i].ID.apply(int).apply(str) +')' #create column CityID with "CityName (ID)"
+        mean_, max_, min_ = find_stats(DF_V2[i],'State', '2')
+        STATS_V2[i]={'mean':mean_,'min':min_,'max':max_}
+        MEAN_DF_V2[i] = DF_V2[i].groupby('Year')[col_stats_v2[1:]].mean().reset_index()
+
+    return {
+        'DFILT': DFILT, 'DFILT_V2': DFILT_V2,
+        'DF_CHANGE': DF_CHANGE, 'DF_CHANGE_V2': DF_CHANGE_V2,
+        'MEAN': MEAN, 'MAX': MAX, 'MIN': MIN,
+        'MEAN_V2': MEAN_V2, 'MAX_V2': MAX_V2, 'MIN_V2': MIN_V2,
+        'MEAN_CONT': MEAN_CONT, 'MEAN_CONT_V2': MEAN_CONT_V2,
+        'DF': DF, 'MEAN_DF': MEAN_DF, 'STATS': STATS,
+        'DF_V2': DF_V2, 'MEAN_DF_V2': MEAN_DF_V2, 'STATS_V2': STATS_V2,
+    }
+
+
+## Inputs: every remote file, fetched concurrently with deadlines (see snapshot.prefetch)
+CODEBOOK_URL = snapshot.APP_FILES + 'Codebook.csv'
+STATE_URLS = {
+    'United States': snapshot.APP_FILES + 'IDtoStateUnited%20States.csv',
+    'China': snapshot.APP_FILES + 'IDtoStateChina.csv',
+    'India': snapshot.APP_FILES + 'IDtoStateIndia.csv',
+}
+GJSON_URLS = {i: snapshot.APP_FILES + 'states_'+i.lower()+'.geojson' for i in ['India','China']}
+GJSON_ID = {'China': 'NAME_1', 'India': 'st_nm'}  # feature property the state choropleths match on
+
+
+def table_inputs():
+    """Inputs of the derived tables as url -> (local fallback, kind)."""
+    files = {DATA_URL: (None, 'frame')}
+    for i in countries:
+        files[STATE_URLS[i]] = ('./pages/geojs/IDtoState'+i+'.csv', 'frame')
+    return files
+
+
+def inputs():
+    """Every remote input of the app as url -> (local fallback, kind)."""
+    files = table_inputs()
+    files[CODEBOOK_URL] = ('./pages/Codebook.csv', 'frame')
+    for i, url in GJSON_URLS.items():
+        files[url] = ('./pages/geojs/states_'+i.lower()+'.geojson', 'json')
+    return files
+
+
+def load_states(entries):
+    return {i: snapshot.load_frame(STATE_URLS[i], entry=entries[STATE_URLS[i]]) for i in countries}
+
+
+def source_hashes(entries):
+    """Content hashes of every input of a dataset version."""
+    sources = {'unified': entries[DATA_URL]['sha256'], 'codebook': entries[CODEBOOK_URL]['sha256']}
+    for i in countries:
+        sources['IDtoState ' + i] = entries[STATE_URLS[i]]['sha256']
+    for i, url in GJSON_URLS.items():
+        sources['geojson ' + i] = entries[url]['sha256']
+    return sources
+
 
-## Data handling/cleaning for "States" tab
-countries = ['United States','China','India'] #Country selection 
-STATES_DF ={}
-STATES_DF['United States'] = pd.read_csv('https://raw.githubusercontent.com/anenbergresearch/app-files/main/IDtoStateUnited%20States.csv')
-GJSON={}
-for i in ['India','China']:
-    STATES_DF[i] = pd.read_csv('https://raw.githubusercontent.com/anenbergresearch/app-files/main/IDtoState'+i+'.csv')
-    url = "https://raw.githubusercontent.com/anenbergresearch/app-files/main/states_" +i.lower()+".geojson"
-    response = urlopen(url)
-    GJSON[i]= json.loads(response.read())
 id_dict={}
 
 with open('./pages/geojs/chinadict.pickle', 'rb') as handle:
     id_dict['China'] = pickle.load(handle)
-    
-    
-DF = {}
-MEAN_DF = {}
-STATS ={}
 
-DF_V2 = {}
-MEAN_DF_V2 = {}
-STATS_V2 ={}
-
-col_select = ['ID','City','C40','Year','Population','Pw_NO2','Pw_PM','Pw_O3','CO2','PAF_PM','PAF_NO2','PAF_O3','Cases_NO2','Cases_PM','Cases_O3','Rates_NO2','Rates_O3','Rates_PM']
-col_select_v2 = ['ID','City','C40','Year','Population','Pw_NO2_V2','Pw_PM_V2','Pw_O3_V2','CO2_V2']
 
-# V1 data preparation
-for i in countries:
-    DF[i] = DFILT.query('Country ==@i')[col_select]
-    DF[i] = DF[i].merge(STATES_DF[i][['ID','State']], how='left',on='ID')
-    if i =='China':
-        DF[i] = DF[i][DF[i].State != '자강도']
-        DF[i]["State"] = DF[i]["State"].apply(lambda x: id_dict[i][x])
-    DF[i]['CityID'] = DF[i].City + ' (' +DF[i].ID.apply(int).apply(str) +')' #create column CityID with "CityName (ID)"
-    mean_, max_, min_ = find_stats(DF[i],'State', '1') 
-    STATS[i]={'mean':mean_,'min':min_,'max':max_}
-    MEAN_DF[i] = DF[i].groupby('Year')[col_stats[1:]].mean().reset_index() 
-# V2 data preparation
-for i in countries:
-    DF_V2[i] = DFILT_V2.query('Country ==@i')[col_select_v2]
-    DF_V2[i] = DF_V2[i].merge(STATES_DF[i][['ID','State']], how='left',on='ID')
-    if i =='China':
-        DF_V2[i] = DF_V2[i][DF_V2[i].State != '자강도']
-        DF_V2[i]["State"] = DF_V2[i]["State"].apply(lambda x: id_dict[i][x])
-    DF_V2[i]['CityID'] = DF_V2[i].City + ' (' +DF_V2[i].ID.apply(int).apply(str) +')' #create column CityID with "CityName (ID)"
-    mean_, max_, min_ = find_stats(DF_V2[i],'State', '2') 
-    STATS_V2[i]={'mean':mean_,'min':min_,'max':max_}
-    MEAN_DF_V2[i] = DF_V2[i].groupby('Year')[col_stats_v2[1:]].mean().reset_index()
+class Dataset:
+    """
+    One version of the derived tables, built from one set of source hashes.
+
+    The tables, the codebook and the state shape URLs are attributes (DFILT,
+    MEAN, STATS, ..., CODEBOOK, GEOMETRY_URLS) and are shared by every
+    request, so callbacks must not modify them. A new source version never
+    touches an existing Dataset: its bundle is opened separately and replaces
+    the current handle in one assignment.
+    """
+    def __init__(self, sources, tables):
+        self.sources = sources
+        self.version = artifacts.bundle_id(sources)
+        self.tables = tables
+        self.__dict__.update(tables)
+        self._indexes = {}
+        self._tensors = {}
+        self._bins = None
+        self._search = None
+        self._hierarchies = {}
+        # Build the most used index up front rather than on the first request
+        self.index(self.DFILT)
+        self.search()
+
+    def index(self, frame):
+        """Row index (components.lookup) over one of this version's tables, built on first use."""
+        idx = self._indexes.get(id(frame))
+        if idx is None:
+            idx = self._indexes[id(frame)] = lookup.FrameIndex(frame)
+        return idx
+
+    def bins(self):
+        """Row index over the population-weighted map bins (components.geobin) of DFILT, built on first use."""
+        if self._bins is None:
+            cols = [c for c in col_stats + col_stats_v2[1:] if c in self.DFILT]
+            self._bins = lookup.FrameIndex(geobin.bin_frame(self.DFILT, cols), keys=())
+        return self._bins
+
+    def hierarchy(self, frame, city='CityCountry'):
+        """Country/State/city option lists (components.hierarchy) of one of this version's tables, built on first use."""
+        key = (id(frame), city)
+        h = self._hierarchies.get(key)
+        if h is None:
+            h = self._hierarchies[key] = hierarchy.Hierarchy(frame, city)
+        return h
+
+    def search(self):
+        """City name search (components.search) over DFILT, ranked by population, restrictable by Country."""
+        if self._search is None:
+            cities = self.DFILT.groupby('CityCountry', observed=True, sort=False).agg(
+                Population=('Population', 'max'), Country=('Country', 'first'))
+            self._search = search.Index(cities.index, cities['Population'].to_numpy(),
+                                        cities['Country'].astype(str).tolist())
+        return self._search
+
+    def tensor(self, name, region=None):
+        """
+        City x year arrays (components.tensor) of table ``name``, built on first use.
+
+        Args:
+            name (str): 'DFILT'/'DFILT_V2' (cities by CityCountry) or 'DF'/'DF_V2' (cities by CityID)
+            region (str): Country, for the per-country tables
+        """
+        key = name if region is None else name + '/' + region
+        t = self._tensors.get(key)
+        if t is None:
+            frame = self.tables[name] if region is None else self.tables[name][region]
+            city = 'CityCountry' if region is None else 'CityID'
+            path = os.path.join(TENSOR_DIR, self.version, re.sub(r'\W+', '_', key))
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                _prune_tensors(self.version)
+            except OSError:
+                pass  # tensor.cached keeps it in memory
+            t = self._tensors[key] = tensor.cached(path, lambda: tensor.CityYearTensor.from_frame(frame, city))
+        return t
+
+
+# Memory-mapped city x year arrays, one directory per dataset version
+TENSOR_DIR = os.path.join(snapshot.CACHE_DIR, 'tensors')
+
+
+def _prune_tensors(version):
+    # Workers still on an older version keep their open maps; the files go once they are unmapped
+    for old in os.listdir(TENSOR_DIR):
+        if old != version:
+            shutil.rmtree(os.path.join(TENSOR_DIR, old), ignore_errors=True)
+
+
+## Versions: the published bundle (components.artifacts), built by the build/watch command
+def write_bundle(entries, sources):
+    """
+    Build every table and document of a version from the fetched inputs and write its bundle.
+
+    Besides the derived tables the bundle holds the codebook (CODEBOOK), and the
+    simplified state shapes (components.geometry) as fingerprinted files, with
+    their URLs per country and level (GEOMETRY_URLS).
+    """
+    start = time.perf_counter()
+    tables = build_tables(snapshot.load_frame(DATA_URL, entry=entries[DATA_URL]), load_states(entries), id_dict)
+    tables['CODEBOOK'] = snapshot.load_frame(CODEBOOK_URL, entry=entries[CODEBOOK_URL])
+    shapes = {i: geometry.levels(snapshot.load_json(url, entry=entries[url]), GJSON_ID[i])
+              for i, url in GJSON_URLS.items()}
+    urls, files = geometry.assets(shapes)
+    path = artifacts.write(tables, sources, documents={'GEOMETRY_URLS': urls}, files=files)
+    log.info('Built dataset version %s in %.1fs', os.path.basename(path), time.perf_counter() - start)
+
+
+def _fetch(force=False, verify=False):
+    # Inputs refreshed, and the bundle for them written if there is none; returns (sources, tables)
+    entries = snapshot.prefetch(inputs())
+    sources = source_hashes(entries)
+    tables = None if force else artifacts.load(sources, verify=verify)
+    if tables is None:
+        write_bundle(entries, sources)
+        tables = artifacts.load(sources)
+    return sources, tables
+
+
+def _boot():
+    # Workers map the published bundle; without one (first start, a checkout) it is built here
+    version = artifacts.published()
+    loaded = artifacts.read(version) if version else None
+    if loaded is None:
+        loaded = _fetch()
+    return Dataset(*loaded)
+
+
+_current = _boot()
+_lock = threading.Lock()
+_refresher = None
+
+# Seconds between fetches of app-files for a new dataset version by the watch command (0 disables)
+REFRESH_SECONDS = int(os.environ.get('DATA_REFRESH_SECONDS', 900))
+# Seconds between checks of the published version by each serving process
+POLL_SECONDS = int(os.environ.get('DATA_POLL_SECONDS', 30))
+
+
+def current():
+    """The dataset version to serve; callbacks take it once and read every table from it."""
+    return _current
+
+
+def update(force=False, verify=False):
+    """
+    Fetch the inputs and make the version built from them current in this process, building its bundle if needed.
+
+    Used by the build/watch command (components.artifacts); serving processes only reload().
+
+    Args:
+        force (bool): Rebuild the bundle even if one exists for the inputs
+        verify (bool): Hash every file of an existing bundle
+
+    Returns:
+        bool: True if the version changed
+    """
+    global _current
+    with _lock:
+        sources, tables = _fetch(force, verify)
+        if sources == _current.sources and not force:
+            return False
+        _current = Dataset(sources, tables)
+        log.info('Dataset version %s installed', _current.version)
+        return True
+
+
+def reload():
+    """
+    Switch to the published version if it isn't the one being served.
+
+    Returns:
+        bool: True if a new version was installed
+    """
+    global _current
+    with _lock:
+        version = artifacts.published()
+        if version is None or version == _current.version:
+            return False
+        loaded = artifacts.read(version)
+        if loaded is None:
+            log.warning('Published version %s could not be opened; still serving %s', version, _current.version)
+            return False
+        _current = Dataset(*loaded)
+        log.info('Dataset version %s installed', version)
+        return True
+
+
+def start_refresher(interval=POLL_SECONDS):
+    """Poll the published version in a background thread, once per process (call after forking)."""
+    global _refresher
+    if interval <= 0 or (_refresher is not None and _refresher.is_alive()):
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                reload()
+            except Exception:
+                log.exception('Dataset reload failed; still serving version %s', _current.version)
+
+    _refresher = threading.Thread(target=run, name='dataset-refresher', daemon=True)
+    _refresher.start()
+
+
+def __getattr__(name):
+    # data_prep.DFILT, CODEBOOK, GEOMETRY_URLS etc. resolve against the current version
+    if name == 'SOURCES':
+        return _current.sources
+    if name == 'TABLES':
+        return _current.tables
+    if name in _current.tables:
+        return _current.tables[name]
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,161 @@
+"""
+Streamed exports of the Data Download selection as CSV, Parquet or XLSX.
+
+GET /export (index.py) takes the selection of the Data Download tab as query
+parameters:
+    format      csv (default), parquet or xlsx
+    year_from, year_to
+                required, within the years of the city table (else 400)
+    country, city
+                the dropdowns of the tab
+    columns     comma-separated columns to keep (all by default)
+    filter, sort
+                the table's filter_query and its sort_by as JSON
+and streams the rows EXPORT_CHUNK_ROWS (default 50000) at a time, so the
+file never sits whole in memory and the rows never pass through the
+browser. The selection is a set of row positions of the city table (from
+its FrameIndex); each chunk is taken from the table and widened for display
+on its own, so neither the selection nor a widened copy of it is built.
+CSV is written chunk by chunk, Parquet as one row group per chunk, and XLSX
+with openpyxl's write-only workbook (which keeps rows in a temporary file);
+the finished workbook is then read back in blocks.
+"""
+import io
+import logging
+import os
+import tempfile
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+
+from components import schema, tablequery
+
+log = logging.getLogger(__name__)
+
+CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 50000))
+EXCEL_ROWS = 1048575  # Sheet limit without the header row
+_BLOCK = 1 << 20
+
+FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def chunks(frame, columns, filter_query=None, sort_by=None, size=None, rows=None):
+    """
+    ``columns`` of the rows matching ``filter_query`` in ``sort_by`` order, ``size`` rows at a time.
+
+    Args:
+        rows (numpy.ndarray): Positions of the selection in ``frame``, all rows by default
+    """
+    size = size or CHUNK_ROWS
+    positions = tablequery.selected(frame, filter_query, sort_by, rows)
+    if positions is None:
+        positions = np.arange(len(frame))
+    # Only the chosen columns of the chunk's rows are copied out of the frame
+    cols = frame.columns.get_indexer(columns)
+    for start in range(0, len(positions), size):
+        yield schema.widen(frame.iloc[positions[start:start + size], cols])
+
+
+def count(frame, filter_query=None, rows=None):
+    """Number of rows an export of ``frame`` (or of its ``rows`` positions) would have."""
+    return int(tablequery.mask(frame, filter_query, rows).sum())
+
+
+def arrow_schema(frame, columns):
+    """Parquet schema of the chunks of ``columns`` (float32 widened to float64)."""
+    return pa.Schema.from_pandas(schema.widen(frame.iloc[:0, frame.columns.get_indexer(columns)]),
+                                 preserve_index=False)
+
+
+def write_csv(parts):
+    header = True
+    for part in parts:
+        yield part.to_csv(index=False, header=header).encode()
+        header = False
+
+
+class _Sink(io.RawIOBase):
+    # Write-only file that hands out what was written since the last drain; tell() counts everything
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        out = b''.join(self._parts)
+        self._parts = []
+        return out
+
+
+def write_parquet(parts, schema):
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema)
+    for part in parts:
+        writer.write_table(pa.Table.from_pandas(part, schema=schema, preserve_index=False))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def write_xlsx(parts, columns):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('data')
+    ws.append(list(columns))
+    for part in parts:
+        # Missing values as empty cells (openpyxl would write NaN as a number Excel can't read)
+        values = part.astype(object).where(part.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            ws.append(row)
+    with tempfile.TemporaryFile() as f:
+        wb.save(f)
+        f.seek(0)
+        while True:
+            block = f.read(_BLOCK)
+            if not block:
+                break
+            yield block
+
+
+def stream(frame, fmt, columns=None, filter_query=None, sort_by=None, rows=None):
+    """
+    Generator of the bytes of an export.
+
+    Args:
+        frame (pandas.DataFrame): The city table
+        fmt (str): A key of FORMATS
+        columns (list): Columns to keep, all by default
+        filter_query (str): DataTable filter_query (components.tablequery)
+        sort_by (list): DataTable sort_by
+        rows (numpy.ndarray): Positions of the selection in ``frame`` (home.selection), all rows by default
+
+    Raises:
+        ValueError: Unknown format, or more rows than an Excel sheet holds
+    """
+    if fmt not in FORMATS:
+        raise ValueError('Unknown export format {!r}'.format(fmt))
+    columns = [c for c in (columns or []) if c in frame] or list(frame.columns)
+    if fmt == 'xlsx' and count(frame, filter_query, rows) > EXCEL_ROWS:
+        raise ValueError('More than {} rows do not fit an Excel sheet, use CSV or Parquet'.format(EXCEL_ROWS))
+    parts = chunks(frame, columns, filter_query, sort_by, rows=rows)
+    log.debug('export %s of %d columns', fmt, len(columns))
+    if fmt == 'csv':
+        return write_csv(parts)
+    if fmt == 'parquet':
+        return write_parquet(parts, arrow_schema(frame, columns))
+    return write_xlsx(parts, columns)
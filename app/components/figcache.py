@@ -0,0 +1,197 @@
+"""
+Memoized figures for the page callbacks.
+
+Figure builders decorated with ``@figcache.memoize`` are keyed by their
+normalized arguments plus the current dataset version (data_prep.current()),
+so a new data version never serves an old figure. A cached figure is stored
+in its serialized form (the plain dict plotly's JSON encoder produces, with
+numeric arrays as typed buffers, see figures.compact) and
+returned as is on a hit, skipping the pandas work, the plotly object
+construction and its validation. The cache is a per-process LRU bounded by
+the JSON size of its entries (FIGURE_CACHE_MB, default 64). A miss falls
+back to the disk cache the workers share (components.sharedcache) before the
+figure is built, so a figure is built once per dataset version, not once per
+worker.
+
+Only functions whose output depends on nothing but their arguments and the
+dataset can be memoized; callbacks that read dash.callback_context resolve
+the trigger first and pass the result to a memoized builder.
+"""
+import base64
+import functools
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import plotly.io as pio
+
+from components import figures, sharedcache
+
+log = logging.getLogger(__name__)
+
+
+def _normalize(value):
+    # Hashable, canonical form of callback inputs: lists/dicts from the browser, numpy scalars, 2019.0 == 2019
+    if isinstance(value, dict):
+        return tuple(sorted((k, _normalize(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v) for v in value)
+    if hasattr(value, 'item') and not isinstance(value, (str, bytes)):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+class FigureCache:
+    """
+    LRU of serialized figures bounded by total JSON size.
+
+    Args:
+        max_bytes (int): Budget for the serialized size of all entries
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (figure dict, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.built = {}  # function -> [figures built, their total JSON bytes]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses[key[0]] = self.misses.get(key[0], 0) + 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits[key[0]] = self.hits.get(key[0], 0) + 1
+            return entry[0]
+
+    def put(self, key, text):
+        """Store the figure JSON ``text``; returns the parsed figure."""
+        value, size = json.loads(text), len(text)
+        if size > self.max_bytes:
+            return value
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+        return value
+
+    def record(self, name, size):
+        """Count a figure of ``name`` built by this process, ``size`` bytes of JSON."""
+        with self._lock:
+            built = self.built.setdefault(name, [0, 0])
+            built[0] += 1
+            built[1] += size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            names = sorted(set(self.hits) | set(self.misses) | set(self.built))
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': sum(self.hits.values()),
+                'misses': sum(self.misses.values()),
+                'functions': {n: {'hits': self.hits.get(n, 0), 'misses': self.misses.get(n, 0),
+                                  'built': self.built.get(n, [0, 0])[0], 'built_bytes': self.built.get(n, [0, 0])[1]}
+                              for n in names},
+            }
+
+
+CACHE = FigureCache(int(float(os.environ.get('FIGURE_CACHE_MB', 64)) * 2**20))
+
+
+def memoize(fn):
+    """Cache the figures ``fn`` returns in CACHE, keyed by its arguments and the dataset version."""
+    from components import data_prep
+    name = '{}.{}'.format(fn.__module__.rsplit('.', 1)[-1], fn.__name__)
+
+    def key(version, args, kwargs):
+        return (name, version, _normalize(args), _normalize(kwargs))
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        version = data_prep.current().version
+        k = key(version, args, kwargs)
+        figure = CACHE.get(k)
+        if figure is None:
+            text = _shared(fn, version, k, args, kwargs)
+            figure = CACHE.put(k, text)
+        return figure
+    wrapper.uncached = fn
+    wrapper.key = key
+    return wrapper
+
+
+def _shared(fn, version, key, args, kwargs):
+    # Figure JSON from the workers' disk cache, built (numeric arrays typed, components.figures) and stored there on a miss
+    text = sharedcache.CACHE.get(version, key)
+    if text is None:
+        fig = fn(*args, **kwargs)
+        text = pio.to_json(figures.compact(fig), validate=False)
+        CACHE.record(key[0], len(text))
+        log.info('%s: built %.1f kB of figure JSON', key[0], len(text) / 1024)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('%s: %.1f kB as plain JSON, %.1f kB with typed arrays', key[0],
+                      len(pio.to_json(fig, validate=False)) / 1024, len(text) / 1024)
+        sharedcache.CACHE.put(version, key, text)
+    return text
+
+
+def prerender(memoized, *args, **kwargs):
+    """Build the figure of a memoized builder into the shared disk cache (if it isn't there yet); returns its JSON size."""
+    from components import data_prep
+    version = data_prep.current().version
+    return len(_shared(memoized.uncached, version, memoized.key(version, args, kwargs), args, kwargs))
+
+
+def _array(value):
+    # Plain list of a serialized 1-d array, which plotly may have written as a typed array ({'dtype', 'bdata'})
+    if isinstance(value, dict) and 'bdata' in value:
+        return np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype']).tolist()
+    return list(value)
+
+
+def outline(figure, locations, line):
+    """
+    Serialized choropleth ``figure`` with the ``locations`` of its first trace drawn again with an outline.
+
+    Lets a map be cached once per year/pollutant and the selected country or state
+    be added per request, without building the figure again.
+
+    Args:
+        figure (dict): Figure as returned by a memoized builder (not modified)
+        locations (list): Locations to outline
+        line (dict): Marker line of the outline, e.g. dict(width=3)
+    """
+    base = figure['data'][0]
+    base_locations, z = _array(base.get('locations', [])), _array(base.get('z', []))
+    pos = {loc: i for i, loc in enumerate(base_locations)}
+    picked = [pos[loc] for loc in locations if loc in pos]
+    trace = {k: v for k, v in base.items()
+             if k in ('type', 'locationmode', 'geojson', 'featureidkey', 'colorscale', 'zmin', 'zmax', 'geo')}
+    trace.update(
+        locations=[base_locations[i] for i in picked],
+        z=[z[i] for i in picked],
+        hoverinfo='skip',
+        showscale=False,
+        marker=dict(line=line),
+    )
+    return dict(figure, data=list(figure['data']) + [trace])
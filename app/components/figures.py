@@ -0,0 +1,257 @@
+"""
+Figures as plain dicts, for the callbacks that build a figure per request.
+
+go.Figure validates every property on construction and again on each
+update_layout/update_xaxes/add_trace; Dash only needs the JSON. The builders
+here return the same structure plotly would produce (trace dicts plus a
+layout on the default template) without the validation. Layout parts that
+every page shares are kept as read-only templates and copied into each
+figure.
+
+compact() rewrites the numeric arrays of a finished figure as typed base64
+buffers ({'dtype', 'bdata'}, read natively by plotly.js): integral values as
+the smallest integer type that holds them, other floats as float32. The
+memoized figures (components.figcache) are stored and sent in this form.
+
+Benchmark against graph_objects on the scatter callbacks (from the app directory):
+    python -m components.figures
+Smoke check without the data (the image build runs it):
+    python -m components.figures check
+"""
+import base64
+import copy
+import json
+import sys
+import time
+from types import MappingProxyType
+
+import numpy as np
+import plotly.io as pio
+from plotly.utils import PlotlyJSONEncoder
+
+from components import const
+
+
+def _freeze(d):
+    return MappingProxyType({k: _freeze(v) if isinstance(v, dict) else v for k, v in d.items()})
+
+
+def _thaw(d):
+    return {k: _thaw(v) if isinstance(v, MappingProxyType) else copy.copy(v) for k, v in d.items()}
+
+
+def _merge(base, updates):
+    for k, v in updates.items():
+        if isinstance(v, dict) and isinstance(base.get(k), dict):
+            _merge(base[k], v)
+        else:
+            base[k] = v
+    return base
+
+
+## Templates
+# The template go.Figure applies by default, serialized once
+TEMPLATE = _freeze(json.loads(json.dumps(pio.templates[pio.templates.default].to_plotly_json(), cls=PlotlyJSONEncoder)))
+
+FONT = _freeze(dict(size=const.FONTSIZE, family=const.FONTFAMILY))
+
+SCATTER = _freeze(dict(
+    margin=dict(l=40, b=40, t=10, r=0),
+    hovermode='closest',
+    paper_bgcolor=const.DISP['background'],
+    plot_bgcolor=const.DISP['background'],
+    font=FONT,
+))
+
+MAP = _freeze(dict(
+    margin=dict(l=10, b=10, t=10, r=0),
+    hovermode='closest',
+    font=FONT,
+    geo=dict(
+        showland=True,
+        landcolor=const.MAP_COLORS['lake'],
+        coastlinewidth=0,
+        oceancolor=const.MAP_COLORS['ocean'],
+        subunitcolor='rgb(255, 255, 255)',
+        countrycolor=const.MAP_COLORS['land'],
+        countrywidth=0.5,
+        showlakes=True,
+        lakecolor=const.MAP_COLORS['ocean'],
+        showocean=True,
+        showcountries=True,
+        resolution=50,
+    ),
+))
+
+
+## Builders
+def layout(template, **updates):
+    """
+    Copy of ``template`` (one of the read-only templates above) with ``updates`` merged in.
+
+    Nested dicts are merged key by key, e.g. ``xaxis=dict(title='Population')``.
+    """
+    return _merge(_thaw(template), updates)
+
+
+def log_axis(xaxis_type, title, log_range=(0, 8), linear_range=(0, 50_000_000)):
+    """Population x axis for the Linear/Log toggle."""
+    log = xaxis_type != 'Linear'
+    return dict(title=dict(text=title), type='log' if log else 'linear',
+                range=list(log_range if log else linear_range))
+
+
+def _array(values):
+    # Series/Index -> numpy; plotly's JSON encoder takes it from there
+    return values.to_numpy() if hasattr(values, 'to_numpy') else values
+
+
+def trace(kind, **props):
+    """Trace dict of type ``kind`` ('scatter', 'scattergl', 'choropleth', ...); array properties may be Series."""
+    out = {'type': kind}
+    for k, v in props.items():
+        out[k] = _array(v) if k in ('x', 'y', 'z', 'customdata', 'locations', 'text', 'hovertext') else v
+    return out
+
+
+def figure(data, fig_layout):
+    """Figure dict on the default template."""
+    fig_layout = dict(fig_layout)
+    fig_layout.setdefault('template', _thaw(TEMPLATE))
+    return {'data': list(data), 'layout': fig_layout}
+
+
+## Payload encoding
+# Trace properties (and marker properties) sent as typed arrays when numeric
+TYPED = ('x', 'y', 'z', 'lat', 'lon', 'customdata')
+TYPED_MARKER = ('color', 'size')
+_INTS = ('u1', 'i1', 'u2', 'i2', 'u4', 'i4')
+
+
+def typed(values, floats=True):
+    """
+    Typed array spec of numeric ``values``, or ``values`` unchanged if they aren't numeric.
+
+    Integral values (populations, years, codes) use the smallest integer type that holds them,
+    so nothing is lost; other floats are sent as float32 (about 7 significant digits, NaN stays NaN),
+    or left as JSON numbers when ``floats`` is False.
+    """
+    if isinstance(values, (dict, str, bytes)):
+        return values
+    try:
+        a = np.asarray(values)
+    except (TypeError, ValueError):
+        return values
+    if a.ndim == 0:
+        return values
+    if a.dtype.kind == 'b':
+        a = a.astype('u1')
+    elif a.dtype.kind == 'f':
+        finite = np.isfinite(a)
+        if finite.all() and len(a) and (a == np.round(a)).all():
+            a = a.astype('i8')
+        elif floats:
+            a = a.astype('<f4')
+        else:
+            return values
+    if a.dtype.kind in 'iu':
+        lo, hi = (int(a.min()), int(a.max())) if a.size else (0, 0)
+        for t in _INTS:
+            info = np.iinfo(t)
+            if info.min <= lo and hi <= info.max:
+                a = a.astype('<' + t)
+                break
+        else:
+            a = a.astype('<f8')
+    elif a.dtype.kind != 'f':
+        return values
+    spec = {'dtype': a.dtype.str[1:], 'bdata': base64.b64encode(a.tobytes()).decode('ascii')}
+    if a.ndim > 1:
+        spec['shape'] = ', '.join(str(n) for n in a.shape)
+    return spec
+
+
+def _raw_in_hover(t, name):
+    # Would plotly.js print this property unformatted? A float32 value would show as 12.300000190734863
+    if t.get('hoverinfo') in ('skip', 'none', 'text'):
+        return False
+    template = t.get('hovertemplate')
+    if not isinstance(template, str):
+        return name in ('x', 'y', 'z', 'lat', 'lon')
+    return '%{' + name + '}' in template or '%{' + name + '[' in template
+
+
+def compact(fig):
+    """
+    Figure dict of ``fig`` (a go.Figure or dict) with its numeric trace arrays as typed arrays.
+
+    Floats that the hover prints unformatted stay JSON numbers; string arrays (city names,
+    locations) and mixed customdata are left as they are.
+    """
+    if hasattr(fig, 'to_plotly_json'):
+        fig = fig.to_plotly_json()
+    data = []
+    for t in fig.get('data', []):
+        t = dict(t)
+        for k in TYPED:
+            if t.get(k) is not None:
+                t[k] = typed(t[k], floats=not _raw_in_hover(t, k))
+        marker = t.get('marker')
+        if isinstance(marker, dict):
+            t['marker'] = dict(marker, **{k: typed(marker[k], floats=not _raw_in_hover(t, 'marker.' + k))
+                                         for k in TYPED_MARKER if marker.get(k) is not None})
+        data.append(t)
+    return dict(fig, data=data)
+
+
+def _best(fn, repeat=20):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark():
+    """Build and serialize the scatter callbacks' figures as dicts, and the same figures through go.Figure."""
+    import plotly.graph_objects as go
+
+    import index  # noqa: F401  registers the pages
+    from components import data_prep
+    from pages import cities, countries
+    data = data_prep.current()
+    city = data.DFILT['CityCountry'].iloc[0]
+    cases = [
+        ('cities.update_graph', lambda: cities.scatter_figure.uncached(
+            'PM', 'Log', 2019, city, list(cities.continent_styles(data.DFILT)), 'All Cities', 'Concentration', '1')),
+        ('countries.update_scatter_plot', lambda: countries.scatter_plot_figure.uncached(
+            'India', 'PM', 'Log', 2019, 'Delhi, India', 'Concentration', '1')),
+    ]
+    print('{:<32}{:>12}{:>12}{:>9}'.format('callback', 'go ms', 'dict ms', 'speedup'))
+    for name, build in cases:
+        built = build()
+        # go.Figure(dict) runs the same validation as building the traces one by one
+        t_go = _best(lambda: pio.to_json(go.Figure(build())))
+        t_dict = _best(lambda: pio.to_json(build(), validate=False))
+        assert json.loads(pio.to_json(go.Figure(built)))['data'] == json.loads(pio.to_json(built, validate=False))['data']
+        print('{:<32}{:>12.2f}{:>12.2f}{:>8.1f}x'.format(name, t_go * 1e3, t_dict * 1e3, t_go / t_dict))
+
+
+def check():
+    """Build, compact and serialize a small figure from every template, and validate it with go.Figure."""
+    import plotly.graph_objects as go
+
+    for template in (SCATTER, MAP):
+        fig = figure([trace('scatter', x=np.arange(3), y=np.array([1.5, 2.5, np.nan]), mode='markers')],
+                     layout(template))
+        go.Figure(fig)
+        json.loads(pio.to_json(compact(fig), validate=False))
+    print('figures: ok')
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['check']:
+        check()
+    else:
+        benchmark()
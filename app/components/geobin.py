@@ -0,0 +1,106 @@
+"""
+Latitude/longitude bins of the cities, for the aggregated world map.
+
+Cities are put into a regular grid of MAP_BIN_DEGREES (default 2) degree
+cells; every (Year, cell) gets the population-weighted mean of each value
+column, its number of cities and population, and the population-weighted
+centre of its cities as the marker position. The bins of a dataset version
+are computed once (Dataset.bins) with the grouped-statistics engine, so a
+map redraw only slices one year of a table of a few thousand rows.
+
+The map shows single cities again once the visible area holds at most
+MAP_CITY_POINTS cities (default 2000). relayoutData only carries the keys
+that changed (a pan has the center but not the scale), so the page keeps
+the whole view in a store merged with track().
+"""
+import os
+
+import numpy as np
+
+from components import aggregate
+
+BIN_DEGREES = float(os.environ.get('MAP_BIN_DEGREES', 2))
+CITY_POINTS = int(os.environ.get('MAP_CITY_POINTS', 2000))
+
+
+def bin_frame(frame, cols, degrees=BIN_DEGREES):
+    """
+    Population-weighted bins of ``frame`` per Year.
+
+    Args:
+        frame (pandas.DataFrame): City rows with Year, Latitude, Longitude and Population
+        cols (list): Value columns to average, weighted by Population
+
+    Returns:
+        pandas.DataFrame: Year, Cell, Latitude, Longitude, Cities, Population and ``cols``, sorted by Year
+    """
+    lat = frame['Latitude'].to_numpy(dtype='float64', na_value=np.nan)
+    lon = frame['Longitude'].to_numpy(dtype='float64', na_value=np.nan)
+    ncols = int(np.ceil(360 / degrees))
+    with np.errstate(invalid='ignore'):
+        cell = np.floor((lat + 90) / degrees) * ncols + np.floor((lon + 180) / degrees)
+    df = frame[['Year', 'Latitude', 'Longitude', 'Population'] + [c for c in cols if c != 'Population']]
+    df = df.assign(Cell=cell)
+
+    g = aggregate.Groups(df, ['Year', 'Cell'])
+    out = g.index.copy()
+    w = g.values(df, 'Population')
+    v_lat, v_lon = g.values(df, 'Latitude'), g.values(df, 'Longitude')
+    out['Cities'] = g.reduce(v_lat, 'count')
+    out['Population'] = g.reduce(w, 'sum')
+    # Population-weighted centre, the cell centre where no population is known
+    cell = out['Cell'].to_numpy()
+    centre_lat = (cell // ncols + 0.5) * degrees - 90
+    centre_lon = (cell % ncols + 0.5) * degrees - 180
+    lat_w, lon_w = g.reduce(v_lat, 'mean', w), g.reduce(v_lon, 'mean', w)
+    out['Latitude'] = np.where(np.isnan(lat_w), centre_lat, lat_w)
+    out['Longitude'] = np.where(np.isnan(lon_w), centre_lon, lon_w)
+    for c in cols:
+        if c != 'Population':
+            out[c] = g.reduce(g.values(df, c), 'mean', w)
+    return out
+
+
+def track(view, relayout):
+    """
+    Geo view (the geo.* relayout keys) of a map after ``relayout``.
+
+    Args:
+        view (dict): The view so far, None before any relayout
+        relayout (dict): The graph's relayoutData, only the changed keys
+
+    Returns:
+        dict: ``view`` with the geo.* keys of ``relayout`` merged in; ``view`` itself if none changed
+    """
+    changes = {k: v for k, v in (relayout or {}).items() if k.startswith('geo.')}
+    view = view or {}
+    if all(view.get(k) == v for k, v in changes.items()):
+        return view
+    return dict(view, **changes)
+
+
+def view(relayout):
+    """
+    Visible (lon0, lon1, lat0, lat1) of a geo map from its view (see track()), None at the full-world zoom.
+
+    The span is estimated from the projection scale (360/scale degrees of longitude,
+    180/scale of latitude) and rounded to whole degrees, so nearby views share a cache entry.
+    """
+    if not relayout:
+        return None
+    scale = relayout.get('geo.projection.scale')
+    if not scale or scale <= 1:
+        return None
+    lon = relayout.get('geo.center.lon', 0) or 0
+    lat = relayout.get('geo.center.lat', 0) or 0
+    half_lon, half_lat = 180 / scale, 90 / scale
+    return (int(np.floor(lon - half_lon)), int(np.ceil(lon + half_lon)),
+            int(np.floor(lat - half_lat)), int(np.ceil(lat + half_lat)))
+
+
+def within(frame, window):
+    """Rows of ``frame`` whose Latitude/Longitude fall in ``window`` (see view())."""
+    lon0, lon1, lat0, lat1 = window
+    lon = frame['Longitude']
+    lat = frame['Latitude']
+    return frame[lon.between(lon0, lon1) & lat.between(lat0, lat1)]
@@ -0,0 +1,216 @@
+"""
+Simplified, quantized state geometries at several levels of detail.
+
+The state GeoJSONs are simplified with Douglas-Peucker on shared arcs rather
+than on whole rings: every ring is cut at its junctions (vertices where more
+than two boundary segments meet), each arc is simplified once and both
+neighbouring states get the same result, so borders never open gaps or
+overlap. Coordinates are then rounded to a per-level number of decimals and
+only the property the choropleth matches on is kept.
+
+LEVELS maps a level to (tolerance in degrees, decimals); level() picks one
+from the projection scale of the map's view. A report of vertices
+and bytes per country and level (from the app directory):
+    python -m components.geometry
+
+Each level is served as a static file under ROUTE, named after the SHA-256
+of its content (assets()), so the choropleths reference the shapes by URL
+and the browser downloads every level once and keeps it: the file behind a
+URL never changes, and a change of the shapes gives a new URL.
+"""
+import gzip
+import hashlib
+import json
+
+import numpy as np
+
+LEVELS = {
+    'coarse': (0.02, 3),
+    'medium': (0.005, 3),
+    'full': (0.0, 4),
+}
+DEFAULT_LEVEL = 'coarse'
+# Projection scale at which the next finer level is used (1 = whole country in view)
+SCALES = (('full', 6), ('medium', 2))
+ROUTE = '/_geometry/'
+
+
+def level(view):
+    """Detail level for a geo map's view (components.geobin.track; the coarse level until zoomed in)."""
+    scale = (view or {}).get('geo.projection.scale') or 1
+    for name, at in SCALES:
+        if scale >= at:
+            return name
+    return DEFAULT_LEVEL
+
+
+def _rings(geometry):
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    return geometry['coordinates']
+
+
+def _dp(points, tol):
+    # Douglas-Peucker keep-mask of an open polyline, endpoints always kept
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        p, q = points[a], points[b]
+        seg = points[a + 1:b]
+        d = q - p
+        norm = np.hypot(*d)
+        if norm == 0:
+            dist = np.hypot(*(seg - p).T)
+        else:
+            dist = np.abs(d[0] * (seg[:, 1] - p[1]) - d[1] * (seg[:, 0] - p[0])) / norm
+        i = int(np.argmax(dist))
+        if dist[i] > tol:
+            keep[a + 1 + i] = True
+            stack += [(a, a + 1 + i), (a + 1 + i, b)]
+    return keep
+
+
+class _Topology:
+    """Rings of all features with the junctions shared between them."""
+    def __init__(self, features, decimals=6):
+        self.rings = []  # (feature, polygon, ring) -> list of point tuples, closing point dropped
+        neighbours = {}
+        for f, feature in enumerate(features):
+            for p, polygon in enumerate(_rings(feature['geometry'])):
+                for r, ring in enumerate(polygon):
+                    pts = [(round(x, decimals), round(y, decimals)) for x, y in ring[:-1]]
+                    # Consecutive duplicates would make zero-length segments
+                    pts = [pt for i, pt in enumerate(pts) if pt != pts[i - 1]] or pts[:1]
+                    self.rings.append(((f, p, r), pts))
+                    n = len(pts)
+                    for i, pt in enumerate(pts):
+                        s = neighbours.setdefault(pt, set())
+                        s.add(pts[i - 1])
+                        s.add(pts[(i + 1) % n])
+        self.junctions = {pt for pt, s in neighbours.items() if len(s) > 2}
+
+    def simplify(self, tol):
+        """Simplified rings keyed like self.rings; each shared arc is simplified once."""
+        arcs = {}
+        out = {}
+        for key, pts in self.rings:
+            cuts = [i for i, pt in enumerate(pts) if pt in self.junctions]
+            if tol <= 0 or len(pts) < 4:
+                out[key] = pts
+                continue
+            if not cuts:
+                # Ring shares no junction (island or a single neighbour all around): cut at the first
+                # point and the point farthest from it
+                far = int(np.argmax(np.hypot(*(np.asarray(pts) - pts[0]).T)))
+                cuts = [0, far] if far else [0]
+            start = cuts[0]
+            ring = pts[start:] + pts[:start]
+            cuts = [c - start for c in cuts] + [len(pts)]
+            ring.append(ring[0])
+            kept = []
+            for a, b in zip(cuts[:-1], cuts[1:]):
+                arc = ring[a:b + 1]
+                # Same arc in either direction gets the same key, so both neighbours share the result
+                fwd = tuple(arc)
+                rev = fwd[::-1]
+                canon, reverse = (fwd, False) if fwd <= rev else (rev, True)
+                simplified = arcs.get(canon)
+                if simplified is None:
+                    a_pts = np.asarray(canon, dtype='float64')
+                    simplified = arcs[canon] = [canon[i] for i in np.flatnonzero(_dp(a_pts, tol))]
+                kept += (simplified[::-1] if reverse else simplified)[:-1]
+            # A ring that collapsed keeps its full outline
+            out[key] = kept if len(kept) >= 3 else pts
+        return out
+
+
+def levels(gjson, id_property):
+    """
+    Every level of ``gjson`` (a FeatureCollection of Polygon/MultiPolygon states).
+
+    Args:
+        id_property (str): The only property kept, the one the choropleth matches on (e.g. 'NAME_1')
+
+    Returns:
+        dict: Level name -> FeatureCollection
+    """
+    features = gjson['features']
+    topo = _Topology(features)
+    out = {}
+    for name, (tol, decimals) in LEVELS.items():
+        rings = topo.simplify(tol)
+        shapes = [[] for _ in features]
+        for (f, p, r), pts in rings.items():
+            q = [[round(x, decimals), round(y, decimals)] for x, y in pts]
+            q = [pt for i, pt in enumerate(q) if pt != q[i - 1]] or q[:1]
+            if len(q) < 3:
+                continue
+            q.append(list(q[0]))
+            polys = shapes[f]
+            while len(polys) <= p:
+                polys.append([])
+            polys[p].append(q)
+        collection = []
+        for feature, polys in zip(features, shapes):
+            polys = [poly for poly in polys if poly]
+            geometry = ({'type': 'Polygon', 'coordinates': polys[0]} if len(polys) == 1
+                        else {'type': 'MultiPolygon', 'coordinates': polys})
+            collection.append({'type': 'Feature',
+                               'properties': {id_property: feature['properties'].get(id_property)},
+                               'geometry': geometry})
+        out[name] = {'type': 'FeatureCollection', 'features': collection}
+    return out
+
+
+def assets(geometries):
+    """
+    Fingerprinted files of every country and level.
+
+    Args:
+        geometries (dict): Country -> level -> FeatureCollection, as from levels()
+
+    Returns:
+        tuple: (urls, files): country -> level -> URL under ROUTE, and file name -> bytes, every
+        JSON file with its gzipped copy under the same name plus '.gz'
+    """
+    urls, files = {}, {}
+    for country, by_level in geometries.items():
+        urls[country] = {}
+        for name, gjson in by_level.items():
+            body = json.dumps(gjson, separators=(',', ':')).encode()
+            filename = '{}-{}.{}.json'.format(country.lower(), name, hashlib.sha256(body).hexdigest()[:16])
+            files[filename] = body
+            files[filename + '.gz'] = gzip.compress(body, 9)
+            urls[country][name] = ROUTE + filename
+    return urls, files
+
+
+def _vertices(gjson):
+    return sum(len(ring) for feature in gjson['features']
+               for polygon in _rings(feature['geometry']) for ring in polygon)
+
+
+def _size(gjson):
+    return len(json.dumps(gjson, separators=(',', ':')))
+
+
+def report():
+    """Vertices and JSON bytes of every country and level against the source file."""
+    from components import data_prep, snapshot
+    files = data_prep.inputs()
+    print('{:<10}{:<9}{:>10}{:>12}{:>9}'.format('country', 'level', 'vertices', 'bytes', 'saved'))
+    for country, url in data_prep.GJSON_URLS.items():
+        gjson = snapshot.load_json(url, files[url][0])
+        base = _size(gjson)
+        print('{:<10}{:<9}{:>10}{:>12}{:>9}'.format(country, 'source', _vertices(gjson), base, ''))
+        for name, simplified in levels(gjson, data_prep.GJSON_ID[country]).items():
+            size = _size(simplified)
+            print('{:<10}{:<9}{:>10}{:>12}{:>8.0%}'.format('', name, _vertices(simplified), size, 1 - size / base))
+
+
+if __name__ == '__main__':
+    report()
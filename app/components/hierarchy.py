@@ -0,0 +1,54 @@
+"""
+Country -> State -> City option lists, built once per table.
+
+The chained dropdowns (country, then state, then city) used to select the
+rows of the chosen country or state and sort their unique cities on every
+change. A Hierarchy takes the distinct (Country, State, city) triples of a
+table once, sorts them, and keeps the sorted list of every country and state,
+so a dropdown update is a dict lookup. Dataset.hierarchy builds one per
+table and dataset version on first use; the returned lists are shared, so
+callers must not modify them.
+"""
+import pandas as pd
+
+_ALL = None
+
+
+class Hierarchy:
+    """
+    Sorted countries, states and cities of one table.
+
+    Args:
+        frame (pandas.DataFrame): Table with a ``city`` column and Country and/or State columns where present
+        city (str): City column, CityCountry for the city tables, CityID for the per-country state tables
+    """
+    def __init__(self, frame, city='CityCountry'):
+        cols = [c for c in ('Country', 'State') if c in frame] + [city]
+        triples = frame[cols].drop_duplicates().astype(object)
+        triples = triples[triples[city].notna()]
+        country = triples['Country'] if 'Country' in triples else pd.Series(_ALL, index=triples.index)
+        state = triples['State'] if 'State' in triples else pd.Series(_ALL, index=triples.index)
+
+        self._countries = sorted(country.dropna().unique())
+        self._states = {_ALL: sorted(state.dropna().unique())}
+        self._cities = {(_ALL, _ALL): sorted(triples[city].unique())}
+        for c, group in triples.groupby(country, sort=False):
+            self._states[c] = sorted(group['State'].dropna().unique()) if 'State' in group else []
+            self._cities[(c, _ALL)] = sorted(group[city].unique())
+        for s, group in triples.groupby(state, sort=False):
+            self._cities[(_ALL, s)] = sorted(group[city].unique())
+        if 'Country' in triples and 'State' in triples:
+            for (c, s), group in triples.groupby([country, state], sort=False):
+                self._cities[(c, s)] = sorted(group[city].unique())
+
+    def countries(self):
+        """Sorted countries."""
+        return self._countries
+
+    def states(self, country=None):
+        """Sorted states of ``country`` (of the whole table if None)."""
+        return self._states.get(country, [])
+
+    def cities(self, country=None, state=None):
+        """Sorted cities of ``country`` and/or ``state`` (of the whole table if both are None)."""
+        return self._cities.get((country, state), [])
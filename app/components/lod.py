@@ -0,0 +1,155 @@
+"""
+Level of detail for the city scatter plots.
+
+Above LOD_POINTS points (default 4000) a scatter is thinned before it is
+sent: the visible area is cut into a grid and every cell keeps at most the
+same number of points, chosen so the total fits the limit. Sparse cells
+(outliers, small cities) keep all their points and dense cells are sampled,
+so the shape of the cloud survives while the browser draws a fraction of it.
+The sample is deterministic, so the same view always gets the same points.
+
+When the user zooms, the graph's relayoutData gives the visible range and
+the callback sends the points of that range, thinned again only if still
+above the limit; zooming in far enough shows every city. The range is kept
+in a store (track()) under the graph's uirevision, so a figure redrawn for
+other inputs is thinned to the area still on screen, and a new uirevision
+(which resets the axes) starts from the whole cloud again. The traces are
+drawn with WebGL (scattergl) either way.
+"""
+import math
+import os
+
+import numpy as np
+
+LOD_POINTS = int(os.environ.get('LOD_POINTS', 4000))
+BINS = 64
+
+
+def _round(v):
+    # 3 significant digits: close views share a cache entry
+    return float('{:.3g}'.format(v))
+
+
+def view(relayout):
+    """
+    Visible (x0, x1, y0, y1) from a graph's relayoutData, in axis units (log10 for a log axis).
+
+    Returns None when the graph is autoranged or not zoomed; an axis that wasn't zoomed is (None, None).
+    """
+    if not relayout or relayout.get('xaxis.autorange') or relayout.get('autosize'):
+        return None
+    out = []
+    for axis in ('xaxis', 'yaxis'):
+        r = relayout.get(axis + '.range') or [relayout.get(axis + '.range[0]'), relayout.get(axis + '.range[1]')]
+        out += [None if v is None else _round(v) for v in r[:2]]
+    return None if all(v is None for v in out) else tuple(out)
+
+
+def track(view, relayout, revision):
+    """
+    Axis ranges of a graph after ``relayout``, as view() reads them.
+
+    Args:
+        view (dict): The ranges so far (from track()), None before any relayout
+        relayout (dict): The graph's relayoutData, only the changed keys
+        revision (str): The graph's uirevision; ranges tracked under another one are dropped
+
+    Returns:
+        dict: The revision and the xaxis.range / yaxis.range on screen; ``view`` itself if none changed
+    """
+    view = view or {}
+    new = dict(view) if view.get('revision') == revision else {'revision': revision}
+    relayout = relayout or {}
+    for axis in ('xaxis', 'yaxis'):
+        if relayout.get(axis + '.autorange'):
+            new.pop(axis + '.range', None)
+        r = relayout.get(axis + '.range') or [relayout.get(axis + '.range[0]'), relayout.get(axis + '.range[1]')]
+        if r[0] is not None and r[1] is not None:
+            new[axis + '.range'] = [r[0], r[1]]
+    return view if new == view else new
+
+
+def thin(traces, window=None, log_x=False, limit=None):
+    """
+    Scatter trace dicts (components.figures) cut to ``window`` and sampled down to ``limit`` points in total.
+
+    Every per-point property (x, y, customdata, text, marker color/size arrays) is cut alike.
+
+    Args:
+        traces (list): Trace dicts with x and y arrays; modified in place
+        window (tuple): (x0, x1, y0, y1) from view(); None for everything
+        log_x (bool): x axis is logarithmic (the window and the grid are in log10)
+        limit (int): Point budget, LOD_POINTS by default
+
+    Returns:
+        list: ``traces``
+    """
+    limit = LOD_POINTS if limit is None else limit
+    xs, ys, keep = [], [], []
+    for t in traces:
+        fx = np.asarray(t['x'], dtype='float64')
+        if log_x:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                fx = np.log10(fx)
+        fy = np.asarray(t['y'], dtype='float64')
+        k = np.ones(len(fx), dtype=bool)
+        if window is not None:
+            x0, x1, y0, y1 = window
+            if x0 is not None:
+                k &= (fx >= x0) & (fx <= x1)
+            if y0 is not None:
+                k &= (fy >= y0) & (fy <= y1)
+        xs.append(fx)
+        ys.append(fy)
+        keep.append(k)
+    if sum(int(k.sum()) for k in keep) > limit:
+        keep = _sample(xs, ys, keep, limit)
+    for t, k in zip(traces, keep):
+        if k.all():
+            continue
+        for prop in ('x', 'y', 'customdata', 'text', 'hovertext'):
+            if prop in t and np.ndim(t[prop]) > 0:
+                t[prop] = np.asarray(t[prop])[k]
+        marker = t.get('marker')
+        if isinstance(marker, dict):
+            for prop in ('color', 'size', 'symbol'):
+                if np.ndim(marker.get(prop)) > 0:
+                    marker[prop] = np.asarray(marker[prop])[k]
+    return traces
+
+
+def _sample(xs, ys, keep, limit):
+    sizes = [len(k) for k in keep]
+    fx, fy, fk = np.concatenate(xs), np.concatenate(ys), np.concatenate(keep)
+    rows = np.flatnonzero(fk & np.isfinite(fx) & np.isfinite(fy))
+    if not len(rows):
+        return keep
+    cells = _cells(fx[rows], BINS) * BINS + _cells(fy[rows], BINS)
+    counts = np.bincount(cells, minlength=BINS * BINS)
+
+    # Largest per-cell cap whose total fits the budget
+    lo, hi = 0, int(counts.max())
+    while lo < hi:
+        cap = (lo + hi + 1) // 2
+        if np.minimum(counts, cap).sum() <= limit:
+            lo = cap
+        else:
+            hi = cap - 1
+    cap = max(lo, 1)
+
+    # Fixed pseudo-random order, then the first ``cap`` rows of each cell
+    order = np.random.default_rng(0).permutation(len(rows))
+    order = order[np.argsort(cells[order], kind='stable')]
+    sorted_cells = cells[order]
+    starts = np.searchsorted(sorted_cells, sorted_cells, side='left')
+    rank = np.arange(len(order)) - starts
+    picked = np.zeros(len(fk), dtype=bool)
+    picked[rows[order[rank < cap]]] = True
+    return np.split(picked, np.cumsum(sizes)[:-1])
+
+
+def _cells(v, bins):
+    lo, hi = v.min(), v.max()
+    if not hi > lo or math.isnan(hi - lo):
+        return np.zeros(len(v), dtype=np.int64)
+    return np.minimum(((v - lo) / (hi - lo) * bins).astype(np.int64), bins - 1)
@@ -0,0 +1,136 @@
+"""
+Row index over the long-format tables, so callbacks don't scan them.
+
+The frame is kept sorted by Year, which makes every year (and every range of
+years) a contiguous slice. For each key column (CityCountry, Country, State,
+continent, CityID) the row positions of each value are stored in ascending
+order, so a city's rows are already in year order and "value in year y" is a
+binary search inside that value's positions. Lookups return slices or take()
+of O(k) rows instead of evaluating a query over the whole table.
+
+Per-callback micro-benchmark (from the app directory):
+    python -m components.lookup
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+KEYS = ('CityCountry', 'Country', 'State', 'continent', 'CityID')
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+class FrameIndex:
+    """
+    Year partitions and key -> row positions for one table.
+
+    Args:
+        frame (pandas.DataFrame): Table with a Year column; sorted by Year (stable) if it isn't already
+        keys (tuple): Key columns to index, where present
+    """
+    def __init__(self, frame, keys=KEYS):
+        years = frame['Year'].to_numpy()
+        if len(years) and (np.diff(years) < 0).any():
+            frame = frame.sort_values('Year', kind='stable')
+            years = frame['Year'].to_numpy()
+        self.frame = frame
+        self._years = years
+        self._positions = {}
+        for k in keys:
+            if k not in frame:
+                continue
+            codes, uniques = pd.factorize(frame[k], sort=True)
+            valid = np.flatnonzero(codes >= 0)
+            order = valid[np.argsort(codes[valid], kind='stable')]
+            splits = np.cumsum(np.bincount(codes[valid], minlength=len(uniques)))[:-1]
+            self._positions[k] = dict(zip(list(uniques), np.split(order, splits)))
+
+    def _span(self, first, last):
+        return (np.searchsorted(self._years, first, side='left'),
+                np.searchsorted(self._years, last, side='right'))
+
+    def years(self, first, last=None):
+        """Rows with first <= Year <= last (one year if last is None), as a slice of the frame."""
+        start, stop = self._span(first, first if last is None else last)
+        return self.frame.iloc[start:stop]
+
+    def year_range(self):
+        """(first, last) Year of the frame, None if it is empty."""
+        if not len(self._years):
+            return None
+        return int(self._years[0]), int(self._years[-1])
+
+    def year_positions(self, first, last=None):
+        """Row positions of ``years(first, last)``."""
+        return np.arange(*self._span(first, first if last is None else last))
+
+    def positions(self, key, value, years=None):
+        """
+        Row positions of ``key == value``, ascending (so in year order).
+
+        Args:
+            years (tuple): Optional (first, last) year range to restrict to
+        """
+        pos = self._positions[key].get(value, _EMPTY)
+        if years is not None:
+            start, stop = self._span(*years)
+            pos = pos[np.searchsorted(pos, start):np.searchsorted(pos, stop)]
+        return pos
+
+    def rows(self, key, value, years=None):
+        """Rows where ``key == value`` (optionally within a (first, last) year range)."""
+        return self.frame.take(self.positions(key, value, years))
+
+    def values(self, key):
+        """Sorted distinct values of ``key``."""
+        return list(self._positions[key])
+
+
+def _best(fn, repeat=20):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark():
+    """Filtering step of each callback: query/boolean mask against the index lookup."""
+    from components import data_prep
+    data = data_prep.current()
+    df = data.DFILT
+    index = data.index(df)
+    mean = data.index(data.MEAN)
+    us = data.index(data.DF['United States'])
+    us_mean = data.index(data.STATS['United States']['mean'])
+    city = df['CityCountry'].iloc[len(df) // 2]
+    state = us.frame['State'].dropna().iloc[0]
+    city_id = us.frame['CityID'].iloc[0]
+    cases = [
+        ('home.generate_combined_graph', lambda: df.query('Year == 2019').copy(), lambda: index.years(2019)),
+        ('home.update_table (country)',
+         lambda: df.query('Country == "India"')[lambda d: d.Year.between(2005, 2019)],
+         lambda: index.rows('Country', 'India', (2005, 2019))),
+        ('home.chained_callback_city', lambda: sorted(df.query('Country == "India"')['CityCountry'].unique()),
+         lambda: sorted(index.rows('Country', 'India')['CityCountry'].unique())),
+        ('cities.update_graph', lambda: df.query('Year == 2019').copy(), lambda: index.years(2019)),
+        ('cities.update_pol_timeseries', lambda: df[df['CityCountry'] == city], lambda: index.rows('CityCountry', city)),
+        ('countries.update_graph', lambda: data.MEAN.query('Year == 2019').copy(), lambda: mean.years(2019)),
+        ('countries.update_timeseries', lambda: data.MEAN[data.MEAN['Country'] == 'India'],
+         lambda: mean.rows('Country', 'India')),
+        ('states.update_map', lambda: data.STATS['United States']['mean'].query('Year == 2019').copy(),
+         lambda: us_mean.years(2019)),
+        ('states.update_scatter_plot', lambda: us.frame.query('Year == 2019').query('CityID == @city_id'),
+         lambda: us.rows('CityID', city_id, (2019, 2019))),
+        ('states.chained_callback_city', lambda: us.frame[us.frame['State'] == state],
+         lambda: us.rows('State', state)),
+    ]
+    print('{:<32}{:>12}{:>12}{:>9}'.format('callback', 'scan ms', 'index ms', 'speedup'))
+    for name, scan, lookup in cases:
+        t_scan, t_index = _best(scan), _best(lookup)
+        print('{:<32}{:>12.3f}{:>12.3f}{:>8.0f}x'.format(name, t_scan * 1e3, t_index * 1e3, t_scan / t_index))
+
+
+if __name__ == '__main__':
+    benchmark()
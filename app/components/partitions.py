@@ -0,0 +1,193 @@
+"""
+Ready-made download files of the city table, one per country and per year.
+
+For the current dataset version the city table of the Data Download tab is
+written as CSV and Parquet: whole (all.*), per country (country/<name>.*)
+and per year (year/<year>.*), by a pool of forked processes that inherit the
+loaded tables. manifest.json lists every file with its rows, size and
+SHA-256. Files live under PARTITION_DIR/<version> (default
+~/.cache/urban-aq/partitions) and are served as static files from ROUTE
+(index.py) with conditional and range requests, so downloading a country,
+a year or everything is a file transfer rather than an export per click.
+A version's directory never changes once written.
+
+The files are part of every dataset version: components.artifacts build
+writes them before it publishes the version, so a worker that switches to
+it finds them in place. Writing a version removes every other version
+directory except the published one (which workers serve until they switch),
+including the partial directories of interrupted runs.
+
+From the app directory:
+    python -m components.partitions [--workers N] [--force]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from components import snapshot
+
+log = logging.getLogger(__name__)
+
+PARTITION_DIR = os.environ.get('PARTITION_DIR', os.path.join(snapshot.CACHE_DIR, 'partitions'))
+ROUTE = '/downloads/'
+FORMATS = ('csv', 'parquet')
+
+_manifests = {}
+
+
+def _slug(name):
+    return re.sub(r'\W+', '_', str(name)).strip('_')
+
+
+def path(version, out_dir=PARTITION_DIR):
+    """Directory of the files of ``version``."""
+    return os.path.join(out_dir, version)
+
+
+def _write(job):
+    from components import data_prep, export
+    out, name, key, value = job
+    data = data_prep.current()
+    index = data.index(data.DFILT)
+    frame = index.frame
+    rows = None
+    if key == 'Country':
+        rows = index.positions('Country', value)
+    elif key == 'Year':
+        rows = index.year_positions(value)
+    columns = list(frame.columns)
+    entries = {}
+    for fmt in FORMATS:
+        parts = export.chunks(frame, columns, rows=rows)
+        blocks = (export.write_csv(parts) if fmt == 'csv'
+                  else export.write_parquet(parts, export.arrow_schema(frame, columns)))
+        file = '{}.{}'.format(name, fmt)
+        h = hashlib.sha256()
+        size = 0
+        with open(os.path.join(out, file), 'wb') as f:
+            for block in blocks:
+                h.update(block)
+                size += len(block)
+                f.write(block)
+        entries[file] = {'rows': len(frame) if rows is None else len(rows), 'bytes': size, 'sha256': h.hexdigest()}
+        if key is not None:
+            entries[file][key.lower()] = value
+    return entries
+
+
+def build(workers=None, out_dir=PARTITION_DIR, force=False):
+    """
+    Write the files of the current dataset version with a pool of forked workers.
+
+    Args:
+        workers (int): Pool size, all CPUs by default
+        force (bool): Write them again even if the version already has a manifest
+
+    Returns:
+        dict: The manifest
+    """
+    from components import data_prep
+    data = data_prep.current()
+    final = path(data.version, out_dir)
+    if not force and manifest(data.version, out_dir) is not None:
+        return manifest(data.version, out_dir)
+
+    index = data.index(data.DFILT)
+    years = sorted(int(y) for y in index.frame['Year'].unique())
+    tmp = '{}.tmp-{}'.format(final, os.getpid())
+    for sub in ('country', 'year'):
+        os.makedirs(os.path.join(tmp, sub), exist_ok=True)
+    jobs = [(tmp, 'all', None, None)]
+    jobs += [(tmp, 'country/' + _slug(c), 'Country', c) for c in index.values('Country')]
+    jobs += [(tmp, 'year/{}'.format(y), 'Year', y) for y in years]
+
+    start = time.perf_counter()
+    files = {}
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+        for entries in pool.map(_write, jobs):
+            files.update(entries)
+    out = {'version': data.version, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+           'years': [years[0], years[-1]] if years else None, 'files': files}
+    with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+        json.dump(out, f, indent=1, ensure_ascii=False)
+
+    if os.path.exists(final):
+        shutil.rmtree(final)
+    os.replace(tmp, final)
+    _prune(out_dir, data.version)
+    _manifests.pop(os.path.join(final, 'manifest.json'), None)
+    log.info('Wrote %d files (%.1f MB) to %s in %.1f s with %d workers', len(files),
+             sum(e['bytes'] for e in files.values()) / 2**20, final, time.perf_counter() - start, workers)
+    return out
+
+
+def _prune(out_dir, version):
+    # Builds run one at a time (components.artifacts), so anything else is an older version or a leftover
+    from components import artifacts
+    keep = {version, artifacts.published()}
+    for old in os.listdir(out_dir):
+        if old not in keep:
+            shutil.rmtree(os.path.join(out_dir, old), ignore_errors=True)
+            _manifests.pop(os.path.join(path(old, out_dir), 'manifest.json'), None)
+
+
+def manifest(version, out_dir=PARTITION_DIR):
+    """Manifest of ``version``, or None when its files haven't been written."""
+    file = os.path.join(path(version, out_dir), 'manifest.json')
+    if file not in _manifests:
+        try:
+            with open(file, encoding='utf-8') as f:
+                _manifests[file] = json.load(f)
+        except (OSError, ValueError):
+            return None
+    return _manifests[file]
+
+
+def url(version, fmt, country=None, years=None):
+    """
+    URL of the ready-made file for a Data Download selection, None if there is none.
+
+    A country over every year, every country in one year, or everything match a file.
+
+    Args:
+        years (tuple): (first, last) year of the selection
+    """
+    m = manifest(version)
+    if m is None or fmt not in FORMATS:
+        return None
+    every_year = years is None or list(years) == m['years']
+    if country is not None and every_year:
+        name = 'country/' + _slug(country)
+    elif country is None and every_year:
+        name = 'all'
+    elif country is None and years[0] == years[1]:
+        name = 'year/{}'.format(years[0])
+    else:
+        return None
+    file = '{}.{}'.format(name, fmt)
+    return ROUTE + version + '/' + file if file in m['files'] else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m components.partitions')
+    parser.add_argument('--workers', type=int, default=None, help='pool size (default: all CPUs)')
+    parser.add_argument('--out', default=PARTITION_DIR, help='partition directory')
+    parser.add_argument('--force', action='store_true', help='write the files again even if they exist')
+    args = parser.parse_args(argv)
+    out = build(args.workers, args.out, args.force)
+    files = out['files'].values()
+    print('{}: {} files, {:.1f} MB'.format(path(out['version'], args.out), len(out['files']),
+                                          sum(e['bytes'] for e in files) / 2**20))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,144 @@
+"""
+Pre-render the maps that depend only on (version, pollutant, metric, year[, region]).
+
+The home world map and percent-change map, the country choropleth and the
+state choropleths are built for every combination the controls allow and
+stored in the disk cache the workers share (components.sharedcache), under
+the same keys their memoized builders look up, so these callbacks never build
+a figure at request time. The work is spread over a pool of forked processes
+that inherit the loaded tables. Figures already in the cache are skipped, so
+running it again after a data update only renders the new version.
+
+A figure that fails to render, or a set larger than SHARED_CACHE_MB (which
+would be evicted as it is written), fails the run: warm() raises and the
+command exits non-zero, so a broken builder stops the version from being
+published (components.artifacts build).
+
+From the app directory (components.artifacts build runs it for every new version):
+    python -m components.prerender [--workers N]
+"""
+import argparse
+import importlib
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+log = logging.getLogger(__name__)
+
+VERSIONS = ('1', '2')
+METRICS = ('Concentration', 'PAF', 'Cases', 'Rates')
+DATA_TYPES = ('Unweighted', 'Population Weighted')
+MAP_MODES = ('Cities', 'Aggregated')
+
+
+def _pollutant_metrics():
+    # What the controls allow: CO2 and Version 2 are concentration only
+    from components import const
+    for version in VERSIONS:
+        for pollutant in const.POLS:
+            for metric in METRICS:
+                if metric == 'Concentration' or (version == '1' and pollutant != 'CO2'):
+                    yield version, pollutant, metric
+
+
+def jobs():
+    """(module, memoized builder, args) of every pre-rendered figure, in callback argument order."""
+    from components import const, data_prep, geometry
+    years = sorted(int(y) for y in data_prep.current().DFILT['Year'].unique())
+    out = []
+    for version in VERSIONS:
+        for pollutant in const.POLS:
+            out.append(('pages.home', 'generate_pcgraph', (pollutant, version)))
+    for version, pollutant, metric in _pollutant_metrics():
+        for year in years:
+            for mode in MAP_MODES:
+                out.append(('pages.home', 'world_map', (version, pollutant, year, metric, mode, None)))
+            for data_type in DATA_TYPES:
+                out.append(('pages.countries', 'map_figure', (pollutant, year, metric, version, data_type)))
+                for region in data_prep.countries:
+                    shapes = data_prep.GEOMETRY_URLS.get(region, {}).get(geometry.DEFAULT_LEVEL)
+                    out.append(('pages.states', 'map_figure',
+                                (region, pollutant, year, metric, version, data_type, shapes)))
+    return out
+
+
+def _render(job):
+    from components import figcache
+    module, name, args = job
+    start = time.perf_counter()
+    try:
+        size = figcache.prerender(getattr(importlib.import_module(module), name), *args)
+    except Exception:
+        log.exception('Pre-rendering %s.%s%r failed', module, name, args)
+        size = None
+    return module.rsplit('.', 1)[-1] + '.' + name, size, time.perf_counter() - start
+
+
+def warm(workers=None):
+    """
+    Render every job into the shared cache with a pool of forked workers.
+
+    Args:
+        workers (int): Pool size, all CPUs by default
+
+    Returns:
+        dict: Wall time, figure count, failures and JSON size, overall and per builder
+
+    Raises:
+        RuntimeError: A figure failed, or the figures don't fit the shared cache
+    """
+    import index  # noqa: F401  registers the pages and loads the current dataset
+    from components import sharedcache
+    if not sharedcache.CACHE.max_bytes:
+        log.info('Shared cache disabled (SHARED_CACHE_MB=0); nothing to pre-render')
+        return {'seconds': 0.0, 'workers': 0, 'figures': 0, 'failed': 0, 'bytes': 0, 'builders': {}}
+    todo = jobs()
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    summary = {}
+    failed = 0
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+        for name, size, seconds in pool.map(_render, todo, chunksize=8):
+            if size is None:
+                failed += 1
+                continue
+            s = summary.setdefault(name, {'figures': 0, 'bytes': 0, 'seconds': 0.0})
+            s['figures'] += 1
+            s['bytes'] += size
+            s['seconds'] += seconds
+    report = {
+        'seconds': time.perf_counter() - start,
+        'workers': workers,
+        'figures': sum(s['figures'] for s in summary.values()),
+        'failed': failed,
+        'bytes': sum(s['bytes'] for s in summary.values()),
+        'builders': summary,
+    }
+    log.info('Pre-rendered %d figures (%d failed) in %.1f s with %d workers, %.1f MB of JSON',
+             report['figures'], failed, report['seconds'], workers, report['bytes'] / 2**20)
+    if failed:
+        raise RuntimeError('{} of {} figures failed to pre-render'.format(failed, len(todo)))
+    if report['bytes'] > sharedcache.CACHE.max_bytes:
+        raise RuntimeError('Pre-rendered figures ({:.0f} MB) exceed SHARED_CACHE_MB ({:.0f} MB) and are evicted '
+                           'as they are written'.format(report['bytes'] / 2**20, sharedcache.CACHE.max_bytes / 2**20))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m components.prerender')
+    parser.add_argument('--workers', type=int, default=None, help='pool size (default: all CPUs)')
+    args = parser.parse_args(argv)
+    report = warm(args.workers)
+    print('{:<34}{:>9}{:>11}{:>12}'.format('builder', 'figures', 'MB', 'ms/figure'))
+    for name, s in sorted(report['builders'].items()):
+        print('{:<34}{:>9}{:>11.1f}{:>12.1f}'.format(name, s['figures'], s['bytes'] / 2**20,
+                                                     s['seconds'] * 1e3 / s['figures']))
+    print('{} figures, {} failed, {:.1f} MB in {:.1f} s ({} workers)'.format(
+        report['figures'], report['failed'], report['bytes'] / 2**20, report['seconds'], report['workers']))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
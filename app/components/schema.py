@@ -0,0 +1,158 @@
+"""
+Compact loader schema for the unified dataset.
+
+Repeated strings become categoricals, Year int16, membership flags bool and
+membership counts uint8. Concentrations, PAF, rates, cases and coordinates
+are stored as float32 (7 significant digits, more than the inputs carry);
+Population and V1 CO2 emissions stay float64 because they reach 1e7-1e8 and
+are used as weights and totals.
+
+Memory report (from the app directory):
+    python -m components.schema
+"""
+import numpy as np
+import pandas as pd
+
+CATEGORICAL = ['Country', 'CityCountry', 'continent', 'City', 'State']
+FLAGS = ['C40', 'Global.Covenant.of.Mayors', 'Breathe.Life.2030', 'Climate.Mayors..US.ONLY.',
+         'Carbon.Neutral.Cities.Alliance', 'Resilient.Cities.Network']
+FLOAT32_PREFIXES = ('Pw_', 'PAF_', 'Rates_', 'Cases_')
+FLOAT32 = ['CO2_V2', 'Latitude', 'Longitude']
+# Column groups of the city table, in the order the Data Download column chooser lists them
+COLUMN_GROUPS = ('Identifiers', 'Coordinates', 'V1 concentrations', 'V1 health metrics', 'V2', 'Memberships')
+
+
+def _float32(col):
+    return col.startswith(FLOAT32_PREFIXES) or col in FLOAT32
+
+
+def column_group(col):
+    """The COLUMN_GROUPS entry of a city table column."""
+    if col.endswith('_V2'):
+        return 'V2'
+    if col in FLAGS or col == 'Memberships':
+        return 'Memberships'
+    if col in ('Latitude', 'Longitude'):
+        return 'Coordinates'
+    if col.startswith(('PAF_', 'Rates_', 'Cases_')):
+        return 'V1 health metrics'
+    if col.startswith('Pw_') or col == 'CO2':
+        return 'V1 concentrations'
+    return 'Identifiers'
+
+
+def group_columns(columns, groups):
+    """The ``columns`` (in their order) that belong to one of ``groups``."""
+    groups = set(groups or ())
+    return [c for c in columns if column_group(c) in groups]
+
+
+def apply(df):
+    """Return ``df`` with the compact dtypes; columns a rule can't represent exactly are left as they are."""
+    types = {}
+    for col in df.columns:
+        s = df[col]
+        if col in CATEGORICAL:
+            types[col] = 'category'
+        elif col == 'Year':
+            types[col] = 'int16'
+        elif col == 'ID' and not s.isna().any():
+            types[col] = 'int32'
+        elif col in FLAGS and not s.isna().any() and s.isin([0, 1]).all():
+            types[col] = 'bool'
+        elif col == 'Memberships' and not s.isna().any() and s.between(0, 255).all():
+            types[col] = 'uint8'
+        elif s.dtype == 'float64' and _float32(col):
+            types[col] = 'float32'
+    return df.astype(types)
+
+
+# float32 carries 7 significant decimal digits
+DIGITS = np.finfo(np.float32).precision + 1
+
+
+def _round(values):
+    # float64 copy of float32 values rounded to DIGITS significant digits; 0, NaN and inf as they are
+    x = values.astype('float64')
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        exp = DIGITS - 1 - np.floor(np.log10(np.abs(x)))
+        finite = np.isfinite(exp)
+        exp = np.where(finite, exp, 0)
+        # Powers of ten below 1e23 are exact, so the scaling only adds the rounding itself
+        scale = 10.0 ** np.abs(exp)
+        out = np.where(exp >= 0, np.round(x * scale) / scale, np.round(x / scale) * scale)
+    return np.where(finite, out, x)
+
+
+def widen(data):
+    """
+    Upcast float32 values to float64 for display.
+
+    float32 -> float64 directly shows conversion noise (12.3 -> 12.300000190734863),
+    so the values are rounded to the DIGITS significant digits float32 holds.
+    """
+    if isinstance(data, pd.Series):
+        if data.dtype != 'float32':
+            return data
+        return pd.Series(_round(data.to_numpy()), index=data.index, name=data.name)
+    if not isinstance(data, pd.DataFrame):
+        return data
+    cols = [c for c, t in data.dtypes.items() if t == 'float32']
+    if not cols:
+        return data
+    return data.assign(**{c: _round(data[c].to_numpy()) for c in cols})
+
+
+def _walk(tables, prefix=''):
+    for key, value in tables.items():
+        if isinstance(value, dict):
+            yield from _walk(value, prefix + key + '/')
+        else:
+            yield prefix + key, value
+
+
+def memory_usage(tables):
+    """
+    Deep memory use per structure.
+
+    Args:
+        tables (dict): Tables as returned by data_prep.build_tables
+
+    Returns:
+        dict: Bytes by structure name; nested per-country tables are summed
+        under their top-level name, objects shared between names counted once
+    """
+    seen = set()
+    usage = {}
+    for name, frame in _walk(tables):
+        top = name.split('/')[0]
+        size = 0
+        if id(frame) not in seen:
+            seen.add(id(frame))
+            size = int(frame.memory_usage(deep=True).sum())
+        usage[top] = usage.get(top, 0) + size
+    return usage
+
+
+def memory_report(before, after):
+    """
+    Compare two builds of the derived tables.
+
+    Returns:
+        pandas.DataFrame: MB before/after and the reduction per structure, with a total row
+    """
+    b, a = memory_usage(before), memory_usage(after)
+    report = pd.DataFrame({'before_mb': pd.Series(b), 'after_mb': pd.Series(a)}).fillna(0) / 2**20
+    report.loc['TOTAL'] = report.sum()
+    report['saved_pct'] = np.where(report.before_mb > 0, 100 * (1 - report.after_mb / report.before_mb), 0)
+    return report.round(2)
+
+
+if __name__ == '__main__':
+    from components import data_prep, snapshot
+    entries = snapshot.prefetch(data_prep.table_inputs())
+    raw = snapshot.load_frame(data_prep.DATA_URL, entry=entries[data_prep.DATA_URL])
+    states_df = data_prep.load_states(entries)
+    before = data_prep.build_tables(raw, states_df, data_prep.id_dict, compact=False)
+    after = data_prep.build_tables(raw, states_df, data_prep.id_dict)
+    print(memory_report(before, after).to_string())
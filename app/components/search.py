@@ -0,0 +1,174 @@
+"""
+Typeahead search over the ~13k city names, for dropdowns in search mode.
+
+The city dropdowns used to embed every CityCountry in the page. They now
+start with only their value as an option and ask the server for matches as
+the user types (the dropdown's search_value): match() returns the top
+SEARCH_LIMIT names (default 50) for the typed text.
+
+Names and queries are normalized the same way: NFKD (compatibility forms
+such as full-width letters fold to ASCII, accents split off and dropped,
+Hangul syllables decompose into jamo), then the Latin letters NFKD leaves
+alone (Ł, Ø, Đ, ß, Æ, ...) folded through _FOLD, and casefolded, so
+"sao paulo" finds "São Paulo", "lodz" finds "Łódź" and Korean and Chinese
+names match the text as typed. The index
+holds the sorted normalized names for prefixes and a character-bigram ->
+entries map for anything longer, so a keystroke intersects a few posting
+arrays and checks the candidates instead of scanning every name. Matches
+are ranked whole-name prefix, then word prefix, then anywhere, and by
+population within each rank.
+
+Per-keystroke timing (from the app directory):
+    python -m components.search
+"""
+import bisect
+import os
+import re
+import time
+import unicodedata
+
+import numpy as np
+
+SEARCH_LIMIT = int(os.environ.get('SEARCH_LIMIT', 50))
+_WORD = re.compile(r'\w+')
+# Letters without a decomposition, written the way they are typed on an ASCII keyboard
+_FOLD = str.maketrans({
+    'Ł': 'L', 'ł': 'l', 'Ø': 'O', 'ø': 'o', 'Đ': 'D', 'đ': 'd', 'Ð': 'D', 'ð': 'd',
+    'Ħ': 'H', 'ħ': 'h', 'Ŧ': 'T', 'ŧ': 't', 'Ŀ': 'L', 'ŀ': 'l', 'ı': 'i', 'ĸ': 'k',
+    'Æ': 'AE', 'æ': 'ae', 'Œ': 'OE', 'œ': 'oe', 'ß': 'ss', 'Þ': 'Th', 'þ': 'th',
+    'Ŋ': 'N', 'ŋ': 'n', 'Ə': 'E', 'ə': 'e', 'Ɨ': 'I', 'ɨ': 'i', 'ʻ': "'", 'ʼ': "'",
+})
+
+
+def normalize(text):
+    """Search form of ``text``: NFKD without combining marks, folded through _FOLD, casefolded."""
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).translate(_FOLD).casefold()
+
+
+class Index:
+    """
+    Search index over a list of names.
+
+    Args:
+        names (list): Names as shown (CityCountry)
+        weights (list): Rank within equal matches, larger first (population); by name if None
+        groups (list): Group of each name (Country) that a search can be restricted to
+    """
+    def __init__(self, names, weights=None, groups=None):
+        names = [str(n) for n in names]
+        weights = np.zeros(len(names)) if weights is None else np.nan_to_num(np.asarray(weights, dtype='float64'))
+        # Entry ids in rank order (weight, then name), so lower id = better within a match kind
+        order = sorted(range(len(names)), key=lambda i: (-weights[i], names[i]))
+        self.names = [names[i] for i in order]
+        self.groups = None if groups is None else np.asarray([groups[i] for i in order], dtype=object)
+        self._norm = [normalize(n) for n in self.names]
+        self._sorted = sorted((n, i) for i, n in enumerate(self._norm))
+        self._keys = [n for n, _ in self._sorted]
+        words = {}
+        grams = {}
+        for i, n in enumerate(self._norm):
+            for m in _WORD.finditer(n):
+                words.setdefault(m.group(), []).append(i)
+            for g in {n[j:j + 2] for j in range(len(n) - 1)}:
+                grams.setdefault(g, []).append(i)
+        self._words = sorted(words)
+        self._word_ids = [np.asarray(words[w], dtype=np.int32) for w in self._words]
+        self._grams = {g: np.asarray(ids, dtype=np.int32) for g, ids in grams.items()}
+
+    def _prefix(self, q):
+        # Ids whose whole normalized name starts with q
+        lo = bisect.bisect_left(self._keys, q)
+        hi = bisect.bisect_left(self._keys, q + '\U0010ffff')
+        return np.asarray(sorted(i for _, i in self._sorted[lo:hi]), dtype=np.int32)
+
+    def _word_prefix(self, q):
+        lo = bisect.bisect_left(self._words, q)
+        hi = bisect.bisect_left(self._words, q + '\U0010ffff')
+        if lo == hi:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(self._word_ids[lo:hi]))
+
+    def _anywhere(self, q):
+        if len(q) < 2:
+            return self._word_prefix(q)
+        postings = []
+        for g in {q[j:j + 2] for j in range(len(q) - 1)}:
+            ids = self._grams.get(g)
+            if ids is None:
+                return np.empty(0, dtype=np.int32)
+            postings.append(ids)
+        postings.sort(key=len)
+        ids = postings[0]
+        for p in postings[1:]:
+            ids = np.intersect1d(ids, p, assume_unique=True)
+            if not len(ids):
+                break
+        # Bigrams can all occur without the text occurring; check the candidates
+        return np.asarray([i for i in ids if q in self._norm[i]], dtype=np.int32)
+
+    def match(self, query, limit=SEARCH_LIMIT, group=None):
+        """
+        Top names for ``query``.
+
+        Args:
+            query (str): Text as typed
+            limit (int): Number of names to return
+            group: Only names of this group (see Index); all names if None
+
+        Returns:
+            list: Names, best match first; the top-ranked names of the group for an empty query
+        """
+        q = normalize(query or '').strip()
+        keep = None if group is None or self.groups is None else self.groups == group
+        if not q:
+            ids = np.arange(len(self.names)) if keep is None else np.flatnonzero(keep)
+            return [self.names[i] for i in ids[:limit]]
+        out, seen = [], set()
+        for find in (self._prefix, self._word_prefix, self._anywhere):
+            ids = find(q)
+            if keep is not None:
+                ids = ids[keep[ids]]
+            for i in ids:
+                if i not in seen:
+                    seen.add(i)
+                    out.append(self.names[i])
+                    if len(out) >= limit:
+                        return out
+        return out
+
+
+def options(index, search_value, value=None, group=None, limit=SEARCH_LIMIT):
+    """
+    Dropdown options for a search: the matches, with the current ``value`` kept so it stays displayed.
+
+    Args:
+        value: Selected value (or list of them for a multi dropdown)
+    """
+    out = index.match(search_value, limit, group)
+    selected = [v for v in (value if isinstance(value, list) else [value]) if v is not None]
+    return [v for v in selected if v not in out] + out
+
+
+def benchmark():
+    """Time per keystroke of typing a few city names, against a scan of every name."""
+    from components import data_prep
+    index = data_prep.current().search()
+    names = index.names
+    samples = [names[0], names[len(names) // 2], names[-1]]
+    print('{:<40}{:>12}{:>12}{:>10}'.format('query', 'index ms', 'scan ms', 'matches'))
+    for name in samples:
+        for n in (1, 3, 6, len(name)):
+            q = name[:n]
+            start = time.perf_counter()
+            found = index.match(q)
+            t_index = time.perf_counter() - start
+            start = time.perf_counter()
+            nq = normalize(q)
+            [x for x in names if nq in normalize(x)][:SEARCH_LIMIT]
+            t_scan = time.perf_counter() - start
+            print('{:<40}{:>12.3f}{:>12.3f}{:>10}'.format(q[:38], t_index * 1e3, t_scan * 1e3, len(found)))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,91 @@
+"""
+Fork-shared, read-only data for multi-worker gunicorn.
+
+With ``preload_app`` (see gunicorn.conf.py) the master imports index:server,
+and with it data_prep, once; workers are forked afterwards and map the same
+physical pages copy-on-write. Two things dirty those pages after the fork:
+the cyclic garbage collector writing to the header of every tracked object,
+and refcount updates on Python objects. freeze() moves everything allocated
+before the fork into the collector's permanent generation, and the compact
+schema (components.schema) keeps the columns in numpy/categorical buffers
+rather than one Python object per value, so the tables stay shared.
+
+The memory figures below come from /proc/<pid>/smaps_rollup: PSS splits
+shared pages between the processes that map them, so the sum of PSS over the
+master and workers is the real footprint and should stay nearly flat as
+workers are added.
+"""
+import gc
+import os
+
+_FIELDS = {'Rss': 'rss_mb', 'Pss': 'pss_mb', 'Shared_Clean': 'shared_mb', 'Shared_Dirty': 'shared_mb',
+           'Private_Clean': 'private_mb', 'Private_Dirty': 'private_mb'}
+
+
+def freeze():
+    """Collect once, then exempt every existing object from future collections (call in the master before forking)."""
+    gc.collect()
+    gc.freeze()
+
+
+def memory(pid=None):
+    """
+    Memory of one process.
+
+    Returns:
+        dict: pid plus rss/pss/shared/private in MB (only rss where smaps_rollup is unavailable)
+    """
+    pid = pid or os.getpid()
+    usage = {'pid': pid}
+    try:
+        with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in _FIELDS:
+                    name = _FIELDS[key]
+                    usage[name] = usage.get(name, 0) + int(value.split()[0]) / 1024
+    except OSError:
+        try:
+            with open('/proc/{}/status'.format(pid)) as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        usage['rss_mb'] = int(line.split()[1]) / 1024
+        except OSError:
+            pass
+    return {k: round(v, 1) if isinstance(v, float) else v for k, v in usage.items()}
+
+
+def _children(pid):
+    try:
+        with open('/proc/{0}/task/{0}/children'.format(pid)) as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    children = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open('/proc/{}/stat'.format(entry)) as f:
+                    # Field 4 is the parent pid; the command name before it may contain spaces
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        children.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    return children
+
+
+def report():
+    """
+    Memory of the gunicorn master (this worker's parent) and every worker it runs.
+
+    Returns:
+        dict: 'master', 'workers' and 'total_pss_mb'
+    """
+    master = os.getppid()
+    workers = [memory(pid) for pid in sorted(_children(master))]
+    procs = [memory(master)] + workers
+    return {
+        'master': procs[0],
+        'workers': workers,
+        'total_pss_mb': round(sum(p.get('pss_mb', 0) for p in procs), 1),
+    }
@@ -0,0 +1,153 @@
+"""
+Figure cache on local disk, shared by all gunicorn workers.
+
+An entry is one file under SHARED_DIR/<dataset version>/, named by a hash of
+its key, holding a figure's JSON text. Writes go
+to a temporary file that is renamed into place, so a reader sees a complete
+entry or none. Since the directory is named by the dataset version (the
+content hash of the inputs) an entry can't outlive its data; directories of
+older versions are removed when a worker first writes under a new one.
+
+Reading an entry touches its mtime, and when the directory grows past
+SHARED_CACHE_MB (default 1024, 0 disables) the least recently used files are
+removed. The budget has to hold the pre-rendered maps of a version
+(components.prerender, which fails when they don't fit) plus what the
+workers add. Workers evict independently; a file removed under a reader is a miss.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import threading
+
+from components import snapshot
+
+log = logging.getLogger(__name__)
+
+SHARED_DIR = os.environ.get('SHARED_CACHE_DIR', os.path.join(snapshot.CACHE_DIR, 'shared'))
+SHARED_CACHE_MB = float(os.environ.get('SHARED_CACHE_MB', 1024))
+
+_CREATED = '.created'
+
+
+class DiskCache:
+    """
+    Args:
+        root (str): Directory holding one subdirectory per dataset version
+        max_bytes (int): Budget for the files of one version; 0 disables the cache
+    """
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._version = None
+        self._written = 0  # bytes this process wrote since it last checked the total
+        self._lock = threading.Lock()
+
+    def _path(self, version, key):
+        name = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.root, version, name + '.json')
+
+    def get(self, version, key):
+        """Stored JSON text of ``key`` or None."""
+        if not self.max_bytes:
+            return None
+        path = self._path(version, key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                value = f.read()
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return value
+
+    def put(self, version, key, value):
+        """Store JSON text; errors only skip the write."""
+        if not self.max_bytes:
+            return
+        path = self._path(version, key)
+        tmp = '{}.tmp-{}-{}'.format(path, os.getpid(), threading.get_ident())
+        try:
+            self._enter(version)
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(value)
+            size = os.path.getsize(tmp)
+            os.replace(tmp, path)
+        except (OSError, ValueError) as e:
+            log.debug('Shared cache write failed (%s)', e)
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self._written += size
+            check = self._written > self.max_bytes / 16
+            if check:
+                self._written = 0
+        if check:
+            self._evict(version)
+
+    def _enter(self, version):
+        # First write under a version: create its directory and drop the versions created before it.
+        # A worker still on an older version won't remove the newer directory.
+        if version == self._version:
+            return
+        os.makedirs(os.path.join(self.root, version), exist_ok=True)
+        created = self._created(version, create=True)
+        for old in os.listdir(self.root):
+            if old != version and self._created(old) < created:
+                shutil.rmtree(os.path.join(self.root, old), ignore_errors=True)
+        self._version = version
+
+    def _created(self, version, create=False):
+        path = os.path.join(self.root, version, _CREATED)
+        if create:
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                pass
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return 0.0
+
+    def _evict(self, version):
+        files = []
+        try:
+            with os.scandir(os.path.join(self.root, version)) as it:
+                for e in it:
+                    if e.name == _CREATED:
+                        continue
+                    try:
+                        st = e.stat()
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, e.path))
+        except OSError:
+            return
+        total = sum(f[1] for f in files)
+        if total <= self.max_bytes:
+            return
+        # Down to 90% so the next scan isn't due right away
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(files):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= target:
+                break
+        log.info('Shared cache: evicted down to %.1f MB', total / 2**20)
+
+    def stats(self, version):
+        try:
+            with os.scandir(os.path.join(self.root, version)) as it:
+                sizes = [e.stat().st_size for e in it if e.name != _CREATED and '.tmp-' not in e.name]
+        except OSError:
+            sizes = []
+        return {'entries': len(sizes), 'bytes': sum(sizes), 'max_bytes': self.max_bytes}
+
+
+CACHE = DiskCache(SHARED_DIR, int(SHARED_CACHE_MB * 2**20))
+
@@ -0,0 +1,222 @@
+"""
+Local snapshot cache for the remote input files.
+
+Every remote input (unified dataset, Codebook, IDtoState tables, state
+GeoJSONs) is fetched once and stored on local disk under a name keyed by the
+SHA-256 of its content: tables as uncompressed Feather files that are
+memory-mapped on load, JSON documents as the raw file. Later starts send a
+conditional request with the stored ETag and, when the source is unchanged,
+map the existing snapshot without parsing the CSV again. When the network is
+unavailable the last snapshot is used, and failing that the bundled copy
+passed as ``fallback`` (e.g. the files in ``pages/geojs/``).
+
+Every request has a deadline (FETCH_TIMEOUT seconds for the whole body) and
+is retried FETCH_RETRIES times; prefetch() refreshes several files in
+parallel so startup waits for the slowest file rather than the sum.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import unquote, urlsplit
+from urllib.request import Request, urlopen
+
+import pandas as pd
+import pyarrow.feather as feather
+
+log = logging.getLogger(__name__)
+
+APP_FILES = 'https://raw.githubusercontent.com/anenbergresearch/app-files/main/'
+
+# Root for everything the app writes to disk; /app is read-only for appUser in the container
+CACHE_DIR = os.environ.get('APP_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'urban-aq'))
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, 'snapshots')
+
+FETCH_TIMEOUT = float(os.environ.get('FETCH_TIMEOUT', 30))  # seconds per attempt, whole body
+FETCH_RETRIES = int(os.environ.get('FETCH_RETRIES', 2))
+
+
+def _name(url):
+    base = unquote(os.path.basename(urlsplit(url).path))
+    return re.sub(r'[^\w.-]+', '_', base)
+
+
+def _index_path(url):
+    return os.path.join(SNAPSHOT_DIR, _name(url) + '.index.json')
+
+
+def _read_index(url):
+    try:
+        with open(_index_path(url)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _atomic_write(path, write):
+    """Write ``path`` through a temporary file so readers never see a partial file."""
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _write_index(url, entry):
+    def write(tmp):
+        with open(tmp, 'w') as f:
+            json.dump(entry, f)
+    _atomic_write(_index_path(url), write)
+
+
+def _read(response, deadline):
+    chunks = []
+    while True:
+        chunk = response.read(1 << 20)
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+        if time.monotonic() > deadline:
+            raise TimeoutError('download did not finish within {:g}s'.format(FETCH_TIMEOUT))
+
+
+def _fetch(url, etag=None):
+    """
+    Download ``url``, retrying connection errors, timeouts and 5xx responses.
+
+    Returns:
+        tuple: (body, etag); body is None when the server answers 304 Not Modified
+    """
+    headers = {'If-None-Match': etag} if etag else {}
+    for attempt in range(FETCH_RETRIES + 1):
+        deadline = time.monotonic() + FETCH_TIMEOUT
+        try:
+            with urlopen(Request(url, headers=headers), timeout=FETCH_TIMEOUT) as response:
+                return _read(response, deadline), response.headers.get('ETag')
+        except HTTPError as e:
+            if e.code == 304:
+                return None, etag
+            if e.code < 500 or attempt == FETCH_RETRIES:
+                raise
+        except (URLError, OSError):
+            if attempt == FETCH_RETRIES:
+                raise
+        time.sleep(0.5 * 2 ** attempt)
+
+
+def _snapshot(url, body, digest, kind):
+    """Parse ``body`` once and store it under its content hash; returns the file name."""
+    name = _name(url)
+    if kind == 'frame':
+        file = '{}.{}.feather'.format(name, digest[:16])
+        frame = pd.read_csv(io.BytesIO(body))
+        # Uncompressed so the file can be memory-mapped without decoding
+        _atomic_write(os.path.join(SNAPSHOT_DIR, file),
+                      lambda tmp: feather.write_feather(frame, tmp, compression='uncompressed'))
+    else:
+        file = '{}.{}.json'.format(name, digest[:16])
+        def write(tmp):
+            with open(tmp, 'wb') as f:
+                f.write(body)
+        _atomic_write(os.path.join(SNAPSHOT_DIR, file), write)
+
+    # Drop snapshots of older source versions
+    for old in os.listdir(SNAPSHOT_DIR):
+        if old.startswith(name + '.') and old != file and not old.endswith(('.index.json', '.tmp')):
+            os.remove(os.path.join(SNAPSHOT_DIR, old))
+    return file
+
+
+def refresh(url, fallback=None, kind='frame'):
+    """
+    Make sure the local snapshot of ``url`` matches the source.
+
+    Args:
+        url (str): Remote file
+        fallback (str): Bundled local copy used when the source can't be fetched
+        kind (str): 'frame' for CSV tables, 'json' for JSON documents
+
+    Returns:
+        dict: Index entry with the source 'sha256' and the snapshot 'file'
+    """
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    entry = _read_index(url)
+    have = bool(entry) and os.path.exists(os.path.join(SNAPSHOT_DIR, entry['file']))
+
+    status = 'downloaded'
+    try:
+        body, etag = _fetch(url, entry.get('etag') if have else None)
+    except (URLError, OSError) as e:
+        if have:
+            log.warning('Could not fetch %s (%s); using snapshot %s', url, e, entry['file'])
+            return dict(entry, status='snapshot')
+        if fallback is None:
+            raise
+        log.warning('Could not fetch %s (%s); using local copy %s', url, e, fallback)
+        with open(fallback, 'rb') as f:
+            body, etag = f.read(), None
+        status = 'local copy'
+    if body is None:  # 304, snapshot is current
+        return dict(entry, status='not modified')
+
+    digest = hashlib.sha256(body).hexdigest()
+    if not (have and entry['sha256'] == digest):
+        log.info('Building snapshot of %s (%s)', url, digest[:16])
+        entry = {'url': url, 'sha256': digest, 'file': _snapshot(url, body, digest, kind)}
+    entry['etag'] = etag
+    _write_index(url, entry)
+    return dict(entry, status=status, bytes=len(body))
+
+
+def prefetch(files):
+    """
+    Refresh several inputs concurrently.
+
+    Args:
+        files (dict): url -> (fallback, kind), as for refresh()
+
+    Returns:
+        dict: Index entry per url, to pass to load_frame/load_json
+    """
+    def timed(url):
+        start = time.perf_counter()
+        entry = refresh(url, *files[url])
+        return entry, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(files) or 1) as pool:
+        futures = {url: pool.submit(timed, url) for url in files}
+    entries = {}
+    for url, future in futures.items():
+        entry, elapsed = future.result()  # re-raises if an input has no snapshot and no fallback
+        entries[url] = entry
+        log.info('  %-40s %6.2fs  %s%s', _name(url), elapsed, entry['status'],
+                 ' ({:.1f} MB)'.format(entry['bytes'] / 2**20) if 'bytes' in entry else '')
+    log.info('Fetched %d inputs in %.2fs', len(files), time.perf_counter() - start)
+    return entries
+
+
+def load_frame(url, fallback=None, entry=None):
+    """Return the CSV at ``url`` as a DataFrame, memory-mapped from its snapshot (``entry`` skips the refresh)."""
+    entry = entry or refresh(url, fallback, 'frame')
+    table = feather.read_table(os.path.join(SNAPSHOT_DIR, entry['file']), memory_map=True)
+    return table.to_pandas()
+
+
+def load_json(url, fallback=None, entry=None):
+    """Return the JSON document at ``url`` from its snapshot (``entry`` skips the refresh)."""
+    entry = entry or refresh(url, fallback, 'json')
+    with open(os.path.join(SNAPSHOT_DIR, entry['file']), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def digest(url):
+    """Content hash of the current snapshot of ``url`` (None if never loaded)."""
+    return _read_index(url).get('sha256')
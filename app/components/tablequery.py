@@ -0,0 +1,164 @@
+"""
+Server-side filter_query, sort_by and paging of a DataTable.
+
+With page_action, sort_action and filter_action set to 'custom' the table
+only holds the page on screen; the callback gets the table's filter_query
+and sort_by and returns that page of the rows. Filters become boolean masks
+over whole columns, and a sort orders only the sort columns to get row
+positions, so only the rows of the page are ever taken from the frame. A
+selection can be given as row positions of a larger frame (``rows``); the
+filter and sort then read only those rows of the columns they need.
+
+Supported filter syntax (what the table's filter row writes):
+    {col} = 5 && {col} > 2 && {col} contains abc && {col} datestartswith 20 && {col} is blank
+with eq/ne/lt/le/gt/ge as words too, and the s/i prefixes for case-sensitive
+and case-insensitive matching (e.g. icontains). Parts that don't parse are ignored.
+"""
+import math
+import re
+
+import numpy as np
+import pandas as pd
+
+_OPS = {'=': 'eq', '!=': 'ne', '<': 'lt', '<=': 'le', '>': 'gt', '>=': 'ge'}
+_PART = re.compile(
+    r'^\s*\{(?P<col>[^}]+)\}\s*'
+    r'(?P<case>[si]?)(?P<op>>=|<=|!=|=|<|>|eq|ne|lt|le|gt|ge|contains|datestartswith|is blank)\s*'
+    r'(?P<value>.*?)\s*$'
+)
+
+
+def _value(text, numeric):
+    # Quoted operands are text; bare ones are numbers for the comparison operators only
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in '"\'`':
+        return text[1:-1].replace('\\' + text[0], text[0])
+    if not numeric:
+        return text
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def parse(filter_query):
+    """
+    Parts of a DataTable filter_query.
+
+    Returns:
+        list: (column, operator, value, case_sensitive) per part, operator one of
+            eq, ne, lt, le, gt, ge, contains, datestartswith, is blank
+    """
+    out = []
+    for part in (filter_query or '').split(' && '):
+        m = _PART.match(part)
+        if m is None:
+            continue
+        op = _OPS.get(m['op'], m['op'])
+        value = _value(m['value'], op not in ('contains', 'datestartswith', 'is blank'))
+        out.append((m['col'], op, value, m['case'] != 'i'))
+    return out
+
+
+def _column(frame, col, rows):
+    s = frame[col]
+    return s if rows is None else s.iloc[rows]
+
+
+def mask(frame, filter_query, rows=None):
+    """Boolean array of the rows of ``frame`` (or of its ``rows`` positions) matching every part of ``filter_query``."""
+    keep = np.ones(len(frame) if rows is None else len(rows), dtype=bool)
+    for col, op, value, case in parse(filter_query):
+        if col not in frame:
+            continue
+        s = _column(frame, col, rows)
+        if op == 'is blank':
+            m = s.isna() | (s.astype(str) == '')
+        elif op in ('contains', 'datestartswith'):
+            text = s.astype(str)
+            if not case:
+                text, value = text.str.lower(), value.lower()
+            m = text.str.contains(value, regex=False) if op == 'contains' else text.str.startswith(value)
+        elif pd.api.types.is_numeric_dtype(s):
+            if not isinstance(value, float):
+                m = np.zeros(len(s), dtype=bool)
+            else:
+                m = getattr(s, op)(value)
+        else:
+            text = s.astype(str)
+            # A number typed into a text column: 5.0 -> '5'
+            value = str(int(value)) if isinstance(value, float) and value.is_integer() else str(value)
+            if not case:
+                text, value = text.str.lower(), value.lower()
+            m = getattr(text, op)(value)
+        keep &= np.asarray(m, dtype=bool)
+    return keep
+
+
+def order(frame, sort_by, rows=None):
+    """
+    Row positions of ``frame`` in ``sort_by`` order (stable, missing values last); None if unsorted.
+
+    Args:
+        sort_by (list): DataTable sort_by, dicts with column_id and direction ('asc'/'desc')
+        rows (numpy.ndarray): Positions of the rows to sort; the result then indexes ``rows``
+    """
+    sort_by = [s for s in (sort_by or []) if s.get('column_id') in frame]
+    if not sort_by:
+        return None
+    cols = [s['column_id'] for s in sort_by]
+    keys = frame[cols] if rows is None else frame.iloc[rows, frame.columns.get_indexer(cols)]
+    keys = keys.reset_index(drop=True)
+    keys = keys.sort_values(cols, ascending=[s.get('direction') != 'desc' for s in sort_by],
+                            kind='stable', na_position='last')
+    return keys.index.to_numpy()
+
+
+def apply(frame, filter_query=None, sort_by=None, rows=None):
+    """Every row of ``frame`` (or of its ``rows`` positions) matching ``filter_query``, in ``sort_by`` order."""
+    pos = selected(frame, filter_query, sort_by, rows)
+    return frame if pos is None else frame.take(pos)
+
+
+def page(frame, filter_query, sort_by, page_current, page_size, rows=None):
+    """
+    One page of the filtered and sorted rows.
+
+    Args:
+        page_current (int): Page number from 0; past the last page gives the last page
+        page_size (int): Rows per page
+        rows (numpy.ndarray): Positions of the selection in ``frame``, all rows by default
+
+    Returns:
+        tuple: (rows of the page as a DataFrame, number of pages, page number shown)
+    """
+    pos = selected(frame, filter_query, sort_by, rows)
+    n = len(frame) if pos is None else len(pos)
+    page_count = max(math.ceil(n / page_size), 1)
+    page_current = min(max(page_current or 0, 0), page_count - 1)
+    start = page_current * page_size
+    take = np.arange(start, min(start + page_size, n))
+    if pos is not None:
+        take = pos[take]
+    return frame.take(take), page_count, page_current
+
+
+def positions(frame, filter_query=None, sort_by=None, rows=None):
+    """
+    Row positions of the rows matching ``filter_query`` in ``sort_by`` order; None for every row as is.
+
+    Args:
+        rows (numpy.ndarray): Positions of the selection in ``frame``; the result then indexes ``rows``
+    """
+    keep = mask(frame, filter_query, rows)
+    pos = order(frame, sort_by, rows)
+    if pos is None:
+        return None if keep.all() else np.flatnonzero(keep)
+    return pos[keep[pos]]
+
+
+def selected(frame, filter_query=None, sort_by=None, rows=None):
+    """Positions in ``frame`` of the rows of ``positions``; None for every row of ``frame`` as is."""
+    pos = positions(frame, filter_query, sort_by, rows)
+    if rows is None or pos is None:
+        return rows if pos is None else pos
+    return rows[pos]
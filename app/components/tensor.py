@@ -0,0 +1,149 @@
+"""
+Dense city x year arrays for the time-series callbacks.
+
+Every numeric column of a long-format table (one row per city and year) is
+stored as an (n_cities, n_years) array; a missing city/year is NaN. A city's
+series is one row read, and whole-table operations (changes between years,
+trends, ranks) are plain array arithmetic over the city axis.
+
+A tensor can be saved as one ``.npy`` per column plus ``meta.json`` and
+loaded back memory-mapped, so worker processes share the pages.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+class CityYearTensor:
+    """
+    Args:
+        cities (list): City labels, the row order of every array
+        years (numpy.ndarray): Sorted years, the column order of every array
+        arrays (dict): Column name -> (n_cities, n_years) array
+    """
+    def __init__(self, cities, years, arrays):
+        self.cities = list(cities)
+        self.years = np.asarray(years)
+        self.arrays = arrays
+        self._city_code = {c: i for i, c in enumerate(self.cities)}
+
+    @classmethod
+    def from_frame(cls, frame, city='CityCountry', columns=None):
+        """
+        Pivot ``frame`` into dense arrays.
+
+        Args:
+            city (str): City key column (CityCountry, or CityID within one country)
+            columns (list): Columns to store; all numeric columns except Year/ID by default
+        """
+        if columns is None:
+            columns = [c for c, t in frame.dtypes.items()
+                       if c not in ('Year', 'ID') and pd.api.types.is_numeric_dtype(t)]
+        city_codes, cities = pd.factorize(frame[city], sort=True)
+        year_codes, years = pd.factorize(frame['Year'], sort=True)
+        rows = city_codes >= 0
+        city_codes, year_codes = city_codes[rows], year_codes[rows]
+        arrays = {}
+        for col in columns:
+            values = frame[col].to_numpy(dtype='float64', na_value=np.nan)[rows]
+            dtype = np.float32 if frame[col].dtype == 'float32' else np.float64
+            a = np.full((len(cities), len(years)), np.nan, dtype=dtype)
+            a[city_codes, year_codes] = values
+            arrays[col] = a
+        return cls(list(cities), np.asarray(years), arrays)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        files = {}
+        for i, (col, a) in enumerate(self.arrays.items()):
+            files[col] = '{}.npy'.format(i)
+            np.save(os.path.join(path, files[col]), a)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'cities': self.cities, 'years': self.years.tolist(), 'files': files}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = {col: np.load(os.path.join(path, file), mmap_mode='r' if mmap else None)
+                  for col, file in meta['files'].items()}
+        return cls(meta['cities'], meta['years'], arrays)
+
+    def __contains__(self, city):
+        return city in self._city_code
+
+    def city_code(self, city):
+        return self._city_code[city]
+
+    def year_code(self, year):
+        i = int(np.searchsorted(self.years, year))
+        if i == len(self.years) or self.years[i] != year:
+            raise KeyError(year)
+        return i
+
+    def series(self, col, city):
+        """One city's values over ``years`` (a row view, NaN where the year is missing)."""
+        return self.arrays[col][self._city_code[city]]
+
+    def series_at(self, col, city, years):
+        """One city's values at ``years`` (NaN for unknown cities or years), for plotting against another table's years."""
+        out = pd.Series(np.nan, index=years)
+        if city in self._city_code:
+            s = pd.Series(self.series(col, city), index=self.years)
+            out = s.reindex(years)
+        return out.reset_index(drop=True)
+
+    def change(self, col, low, high, window=2):
+        """Percent change for every city from the ``window``-year mean starting at ``low`` to the one ending at ``high``."""
+        a = self.arrays[col]
+        lo = self.year_code(low)
+        hi = self.year_code(high)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            first = np.nanmean(a[:, lo:lo + window], axis=1)
+            last = np.nanmean(a[:, hi - window + 1:hi + 1], axis=1)
+            return (last - first) / first * 100
+
+    def trend(self, col):
+        """Least-squares slope per year for every city, ignoring missing years."""
+        a = np.asarray(self.arrays[col], dtype='float64')
+        valid = ~np.isnan(a)
+        n = valid.sum(axis=1)
+        x = np.where(valid, self.years.astype('float64'), 0.0)
+        y = np.where(valid, a, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            xm, ym = x.sum(axis=1) / n, y.sum(axis=1) / n
+            cov = (np.where(valid, (x - xm[:, None]) * (y - ym[:, None]), 0.0)).sum(axis=1)
+            var = (np.where(valid, (x - xm[:, None]) ** 2, 0.0)).sum(axis=1)
+            return np.where(n > 1, cov / var, np.nan)
+
+    def rank(self, col, year, ascending=False):
+        """Rank of every city in ``year`` (1 = highest by default; NaN where missing)."""
+        return pd.Series(self.arrays[col][:, self.year_code(year)]).rank(ascending=ascending).to_numpy()
+
+
+def cached(path, build):
+    """
+    Load the tensor saved at ``path`` memory-mapped, or build it, save it and map the saved copy.
+
+    Falls back to the in-memory tensor when the cache directory isn't writable.
+    """
+    try:
+        return CityYearTensor.load(path)
+    except (OSError, ValueError, KeyError):
+        pass
+    t = build()
+    tmp = '{}.tmp-{}'.format(path, os.getpid())
+    try:
+        t.save(tmp)
+        os.replace(tmp, path)
+        return CityYearTensor.load(path)
+    except OSError:
+        # Another process saved it first, or no writable cache
+        shutil.rmtree(tmp, ignore_errors=True)
+        try:
+            return CityYearTensor.load(path)
+        except (OSError, ValueError, KeyError):
+            return t
@@ -0,0 +1,55 @@
+"""
+Gunicorn settings (gunicorn -c gunicorn.conf.py index:server).
+
+PRELOAD_APP=1 (the default) imports the app, and with it every data table, once
+in the master; the workers are forked from it and share those pages. Set
+PRELOAD_APP=0 to have each worker import the app on its own as before.
+Worker count comes from WEB_CONCURRENCY or --workers.
+
+New dataset versions are built by one job started next to the master once the
+server is up (python -m components.artifacts watch, every
+DATA_REFRESH_SECONDS, 0 disables it); the workers only switch to the bundle
+it publishes.
+"""
+import logging
+import os
+import subprocess
+import sys
+
+# App loggers (input fetch timings, dataset refreshes) go to stderr next to gunicorn's own log
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'), format='[%(asctime)s] [%(process)d] [%(name)s] %(message)s')
+
+bind = os.environ.get('BIND', '0.0.0.0:8050')
+preload_app = os.environ.get('PRELOAD_APP', '1') == '1'
+refresh_seconds = int(os.environ.get('DATA_REFRESH_SECONDS', 900))
+
+_updater = None
+
+
+## Hooks are imported lazily: the app directory is only on sys.path once gunicorn has loaded this file
+def pre_fork(server, worker):
+    # Objects created by the preload stay out of the workers' collections, so their pages are not dirtied
+    if preload_app:
+        from components import shared
+        shared.freeze()
+
+
+def post_worker_init(worker):
+    from components import data_prep, shared
+    worker.log.info('Worker %s memory: %s', worker.pid, shared.memory())
+    # Threads don't survive the fork, so each worker polls for a newly published version itself
+    data_prep.start_refresher()
+
+
+def when_ready(server):
+    global _updater
+    if refresh_seconds > 0:
+        _updater = subprocess.Popen([sys.executable, '-m', 'components.artifacts', 'watch'],
+                                    cwd=os.path.dirname(os.path.abspath(__file__)))
+        server.log.info('Dataset update job started (pid %s)', _updater.pid)
+
+
+def on_exit(server):
+    if _updater is not None and _updater.poll() is None:
+        _updater.terminate()
+
@@ -1,5 +1,10 @@
+import hmac
+import json
+import os
+
 from dash import html, dcc
 from dash.dependencies import Input, Output
+import flask
 import dash_bootstrap_components as dbc
 
 from app import app
@@ -7,7 +12,7 @@ from app import server
 from pages import home,countries, cities,states
 
 # Connect the navbar to the index
-from components import navbar
+from components import artifacts, data_prep, export, figcache, geometry, navbar, partitions, shared, sharedcache
 
 # Define the navbar
 nav = navbar.Navbar()
@@ -25,15 +30,86 @@ app.layout = html.Div([
               [Input('url', 'pathname')])
 def display_page(pathname):
     if pathname == '/countries':
-        return countries.layout
+        return countries.layout()
     if pathname == '/networks':
-        return cities.layout
+        return cities.layout()
     if pathname == '/states':
-        return states.layout
+        return states.layout()
     if pathname == '/':
-        return home.layout
+        return home.layout()
     else: # if redirected to unknown link
         return "404 Page Error! Please choose a link"
 
+# Internal reports answer only requests whose X-Admin-Token header matches ADMIN_TOKEN;
+# without ADMIN_TOKEN they don't exist
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+def _admin_only():
+    token = flask.request.headers.get('X-Admin-Token', '')
+    if not ADMIN_TOKEN or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        flask.abort(404)
+
+# Memory of the master and every worker (PSS counts pages shared after the fork once)
+@server.route('/_memory')
+def memory_report():
+    _admin_only()
+    return flask.jsonify(shared.report())
+
+# Figure cache of this worker (size, hits/misses per figure) and of the disk cache shared by the workers
+@server.route('/_figcache')
+def figcache_report():
+    _admin_only()
+    return flask.jsonify(dict(figcache.CACHE.stats(), shared=sharedcache.CACHE.stats(data_prep.current().version)))
+
+# State shapes (components.geometry) from the bundle of the current version: the name holds the
+# content hash, so the browser may keep them forever
+@server.route(geometry.ROUTE + '<filename>')
+def geometry_file(filename):
+    data = data_prep.current()
+    if geometry.ROUTE + filename not in {u for urls in data.GEOMETRY_URLS.values() for u in urls.values()}:
+        flask.abort(404)
+    gzipped = 'gzip' in flask.request.headers.get('Accept-Encoding', '')
+    response = flask.send_from_directory(artifacts.files_dir(data.version), filename + ('.gz' if gzipped else ''),
+                                         mimetype='application/geo+json', conditional=True)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if gzipped:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def _export_years(args):
+    # year_from and year_to are required and must lie within the years of the city table
+    data = data_prep.current()
+    span = data.index(data.DFILT).year_range()
+    try:
+        years = [int(args[k]) for k in ('year_from', 'year_to')]
+    except (KeyError, ValueError):
+        flask.abort(400, 'year_from and year_to must be given as years')
+    if span is None or not all(span[0] <= y <= span[1] for y in years):
+        flask.abort(400, 'year_from and year_to must lie within {}-{}'.format(*(span or ('', ''))))
+    return years
+
+# Data Download selection streamed as CSV/Parquet/XLSX (parameters in components.export)
+@server.route('/export')
+def export_table():
+    args = flask.request.args
+    fmt = args.get('format', 'csv')
+    year_from, year_to = _export_years(args)
+    try:
+        frame, rows = home.selection(year_from, year_to, args.get('country') or None, args.get('city') or None)
+        body = export.stream(frame, fmt, args.get('columns', '').split(','), args.get('filter'),
+                             json.loads(args.get('sort') or '[]'), rows)
+    except ValueError as e:
+        flask.abort(400, str(e))
+    return flask.Response(body, mimetype=export.FORMATS[fmt],
+                          headers={'Content-Disposition': 'attachment; filename=filtered_data.' + fmt})
+
+# Ready-made download files (components.partitions); a version's files never change
+@server.route(partitions.ROUTE + '<version>/<path:filename>')
+def partition_file(version, filename):
+    return flask.send_from_directory(partitions.PARTITION_DIR, version + '/' + filename,
+                                     conditional=True, max_age=31536000)
+
 if __name__== '__main__':
+    data_prep.start_refresher()
     app.run_server(host= '0.0.0.0', debug=True)  
\ No newline at end of file
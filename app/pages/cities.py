@@ -4,13 +4,13 @@ import plotly.express as px
 import plotly.graph_objects as go
 from dash import Dash, callback,dcc,html
 from dash.dependencies import Input, Output,State
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-from components import const,data_prep,buttons
+from components import const,data_prep,buttons,figcache,figures,lod,search
 
 import dash
 
 dash.register_page(__name__, path='/networks')
-df = data_prep.DFILT
 
 # Version 2 column mapping - Added for version control
 V2_COLUMN_MAPPING = {
@@ -26,15 +26,16 @@ V1_COLUMN_MAPPING = {
     'CO2': 'CO2'
 }
 
-cont_l = df.continent.dropna().unique() #getting the list of distinct continent names
-cont_dict = {}
-for i in range(len(cont_l)):
-    cont_dict[cont_l[i]]=const.CITY[i] #style
+def continent_styles(frame):
+    """Continent -> const.CITY style, in order of first appearance in ``frame``."""
+    return dict(zip(frame.continent.dropna().unique(), const.CITY))
 
 available_indicators = const.POLS
 
 # Added version store for tracking active version with unique name
 version_store = dcc.Store(id='cities-version-store', data='1')
+# Axis ranges of the scatter on screen (components.lod.track)
+scatter_view_store = dcc.Store(id='cities-scatter-view', data={})
 
 # Added version selector component with unique IDs
 version_selector = html.Div([
@@ -115,22 +116,23 @@ membership_sel = buttons.membership()
 
 city_drop = html.Div(dcc.Dropdown(
                     id='cities-CityS',  # Unique ID
-                    options=sorted(df["CityCountry"].unique()),
+                    # Filled as the user types (search_cities)
+                    options=['Washington D.C., United States (860)'],
                     value='Washington D.C., United States (860)',
                     placeholder= 'Select city...',
                 style ={'color':'#123C69', 'font-size':'12px'},
                 ),className='single-dropd')
 
-cont_drop = html.Div(dcc.Dropdown(
+def cont_drop(frame):
+    continents = [str(c) for c in continent_styles(frame)]
+    return html.Div(dcc.Dropdown(
             id="cities-ContS",  # Unique ID
-            value=list(cont_l.astype(str)),
-            options=list(cont_l.astype(str)),
+            value=continents,
+            options=continents,
             multi=True, style ={'color':'#123C69'},
             placeholder= 'Select continents...'
         ),className="custom-dropdown")
 
-year_selector = buttons.year_dropdown(df) 
-
 main_graph = dcc.Graph(
             id='cities-crossfilter-indicator-scatter',  # Unique ID
             style={
@@ -218,27 +220,6 @@ title_section = dbc.Row([
     )
 ], justify="center", align="center")
 
-# Left column - Control Panel with three distinct rows (without lin_log)
-left_controls = html.Div([
-    # First row: Data version, Pollutant, Metric (removed lin_log)
-    dbc.Row([
-        dbc.Col(version_selector, lg=4, md=12, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
-        dbc.Col(pollutant_selector, lg=4, md=12, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
-        dbc.Col(metrics, lg=4, md=12, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"})
-    ], className="mb-3", style={"marginLeft": "0", "marginRight": "0", "display": "flex", "flexWrap": "wrap"}),
-    
-    # Second row: Membership, Year
-    dbc.Row([
-        dbc.Col(membership_sel, lg=6, md=6, sm=12, style={"paddingRight": "5px", "paddingLeft": "5px"}),
-        dbc.Col(year_selector, lg=6, md=6, sm=12, style={"paddingRight": "5px", "paddingLeft": "5px"})
-    ], className="mb-3", style={"marginLeft": "0", "marginRight": "0", "display": "flex", "flexWrap": "wrap"}),
-    
-    # Third row: Country (Continent)
-    dbc.Row([
-        dbc.Col(cont_drop, width=12, style={"paddingRight": "5px", "paddingLeft": "5px"})
-    ], className="mb-3", style={"marginLeft": "0", "marginRight": "0"})
-], className="control-panel", style={"padding": "15px", "display": "block"})
-
 # Left column scatter plot with lin_log button underneath (right-aligned)
 left_main_content = html.Div([
     # Graph
@@ -261,17 +242,6 @@ left_main_content = html.Div([
         ], className="g-0"),  # Remove gutters with g-0 class
 ])
 
-# Complete left column
-left_column = dbc.Col([
-    html.H4("Urban Pollution vs. Population", className="mb-3 mt-1 text-center",
-            style={"color": "#123C69", "fontFamily": "Helvetica, Arial, sans-serif",
-                  "fontWeight": "bold", "borderBottom": "2px solid #123C69",
-                  "paddingBottom": "10px", "fontSize": "25px"}),
-    left_controls,
-    left_main_content
-], lg=7, md=12, sm=12, className="pe-4 two-column-divider")
-
-
 # Right column components with fixed heights
 right_controls = dbc.Row([
     dbc.Col(city_drop, width=12)
@@ -308,25 +278,59 @@ right_column = dbc.Col([
 ], width=5, className="ps-4")
 
 
-# Adjust the two-column section to have a minimum height
-two_column_section = dbc.Row([
-    left_column,
-    right_column
-], className="mt-3", style={"height": "1000px"})
-
-
-# Updated layout
-layout = dbc.Container([
-    # Adding version_store to the layout
-    version_store,
-    
-    # Title section
-    title_section,
-  
-    # Two-column section with all controls and graphs
-    two_column_section
-    
-], fluid=True)
+# Updated layout, built per page visit so the year and continent choices follow the current dataset version
+def layout():
+    frame = data_prep.current().DFILT
+
+    # Left column - Control Panel with three distinct rows (without lin_log)
+    left_controls = html.Div([
+        # First row: Data version, Pollutant, Metric (removed lin_log)
+        dbc.Row([
+            dbc.Col(version_selector, lg=4, md=12, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
+            dbc.Col(pollutant_selector, lg=4, md=12, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
+            dbc.Col(metrics, lg=4, md=12, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"})
+        ], className="mb-3", style={"marginLeft": "0", "marginRight": "0", "display": "flex", "flexWrap": "wrap"}),
+
+        # Second row: Membership, Year
+        dbc.Row([
+            dbc.Col(membership_sel, lg=6, md=6, sm=12, style={"paddingRight": "5px", "paddingLeft": "5px"}),
+            dbc.Col(buttons.year_dropdown(frame), lg=6, md=6, sm=12, style={"paddingRight": "5px", "paddingLeft": "5px"})
+        ], className="mb-3", style={"marginLeft": "0", "marginRight": "0", "display": "flex", "flexWrap": "wrap"}),
+
+        # Third row: Country (Continent)
+        dbc.Row([
+            dbc.Col(cont_drop(frame), width=12, style={"paddingRight": "5px", "paddingLeft": "5px"})
+        ], className="mb-3", style={"marginLeft": "0", "marginRight": "0"})
+    ], className="control-panel", style={"padding": "15px", "display": "block"})
+
+    # Complete left column
+    left_column = dbc.Col([
+        html.H4("Urban Pollution vs. Population", className="mb-3 mt-1 text-center",
+                style={"color": "#123C69", "fontFamily": "Helvetica, Arial, sans-serif",
+                      "fontWeight": "bold", "borderBottom": "2px solid #123C69",
+                      "paddingBottom": "10px", "fontSize": "25px"}),
+        left_controls,
+        left_main_content
+    ], lg=7, md=12, sm=12, className="pe-4 two-column-divider")
+
+    # Adjust the two-column section to have a minimum height
+    two_column_section = dbc.Row([
+        left_column,
+        right_column
+    ], className="mt-3", style={"height": "1000px"})
+
+    return dbc.Container([
+        # Adding version_store to the layout
+        version_store,
+        scatter_view_store,
+
+        # Title section
+        title_section,
+
+        # Two-column section with all controls and graphs
+        two_column_section
+
+    ], fluid=True)
 
 # Added callback to update version button styles and store version value
 @callback(
@@ -418,7 +422,8 @@ def update_metrics_for_version(version):
     Input('cities-ContS', 'value'),  # Updated to use cities-specific ID
     Input('membsDrop', 'value'),
     Input('health-metricscities', 'value'),  # Updated to use cities-specific ID
-    Input('cities-version-store', 'data')]  # Added version store input
+    Input('cities-version-store', 'data'),  # Added version store input
+    Input('cities-scatter-view', 'data')]
 )
 def update_graph(yaxis_column_name,
                  xaxis_type,
@@ -427,10 +432,46 @@ def update_graph(yaxis_column_name,
                  contS,
                  memb,
                  metric,
-                 version):  # Removed 'toggle' parameter
-    
-    dff = df.query('Year == @year_value').copy()
-    city_df = dff.query('CityCountry == @cityS').copy()
+                 version,
+                 view=None):  # Removed 'toggle' parameter
+    # Whatever triggered the redraw, thin to the range on screen; a range of other axes (an older uirevision) is gone
+    revision = scatter_revision(yaxis_column_name, xaxis_type, metric, version)
+    window = lod.view(view) if (view or {}).get('revision') == revision else None
+    return scatter_figure(yaxis_column_name, xaxis_type, year_value, cityS, contS, memb, metric, version, window)
+
+
+@callback(
+    Output('cities-scatter-view', 'data'),
+    Input('cities-crossfilter-indicator-scatter', 'relayoutData'),
+    [State('cities-scatter-view', 'data'),
+     State('crossfilter-yaxis-columncities', 'value'),
+     State('crossfilter-xaxis-type', 'value'),
+     State('health-metricscities', 'value'),
+     State('cities-version-store', 'data')],
+    prevent_initial_call=True
+)
+def track_scatter_view(relayout, view, yaxis_column_name, xaxis_type, metric, version):
+    new = lod.track(view, relayout, scatter_revision(yaxis_column_name, xaxis_type, metric, version))
+    if new == view:
+        raise PreventUpdate
+    return new
+
+
+def scatter_revision(yaxis_column_name, xaxis_type, metric, version):
+    # uirevision of the scatter: the zoom is kept until the plotted column or the x scale changes
+    return '{}|{}|{}|{}'.format(version, metric, yaxis_column_name, xaxis_type)
+
+
+@figcache.memoize
+def scatter_figure(yaxis_column_name, xaxis_type, year_value, cityS, contS, memb, metric, version, window=None):
+    # Above lod.LOD_POINTS points (within the zoomed window, see lod.view) a thinned sample is drawn
+
+    data = data_prep.current()
+    index = data.index(data.DFILT)
+    styles = continent_styles(index.frame)
+    # Read-only slices of the shared table, nothing below modifies them
+    dff = index.years(year_value)
+    city_df = index.rows('CityCountry', cityS, (year_value, year_value))
     
     # Resolve metric column and unit based on version
     if version == '1':
@@ -444,11 +485,6 @@ def update_graph(yaxis_column_name,
         unit_title = const.UNITS_V2[metric][yaxis_column_name]
     
     x_axis_label = 'Population'
-    if xaxis_type == 'Log':
-        x_range = [0, 8] 
-    else:
-        x_range = [0, 50_000_000] 
-        
     plot = []
     
     # Define the mapping between dropdown options and actual column names
@@ -465,8 +501,8 @@ def update_graph(yaxis_column_name,
     if memb == 'All Cities':
         # Show all cities grouped by continent
         for i in contS:
-            _c = dff.query('continent == @i')
-            plot.append(go.Scatter(
+            _c = index.rows('continent', i, (year_value, year_value))
+            plot.append(figures.trace('scattergl',
                 name = i, 
                 legendgroup = 'All Cities',
                 legendgrouptitle = {'text': 'All Cities'}, 
@@ -476,7 +512,7 @@ def update_graph(yaxis_column_name,
                 customdata = _c['CityCountry'],
                 hovertemplate = "<b>%{customdata}</b><br>" + 'Population: %{x} <br>' + unit_title + ': %{y}',
                 marker = {
-                    'color': cont_dict[i][1],
+                    'color': styles[i][1],
                     'size': 7,
                     'opacity': 0.75,
                     'line': dict(width=0.2, color=const.DISP['background'])
@@ -489,7 +525,7 @@ def update_graph(yaxis_column_name,
         
         # Add cities with 0 memberships
         _nc = dff.query('Memberships == 0') 
-        plot.append(go.Scatter(
+        plot.append(figures.trace('scattergl',
             name = '0 Memberships', 
             legendgroup = 'Memberships', 
             legendgrouptitle = {'text': 'Number of Memberships'}, 
@@ -506,7 +542,7 @@ def update_graph(yaxis_column_name,
             _nc = dff.query('Memberships == @i')
             if i == 4:
                 _nc = dff.query('Memberships >= @i')
-            plot.append(go.Scatter(
+            plot.append(figures.trace('scattergl',
                 name = str(i) + ' Memberships', 
                 legendgroup = 'Memberships', 
                 legendgrouptitle = {'text': 'Number of Memberships'}, 
@@ -529,7 +565,7 @@ def update_graph(yaxis_column_name,
                 color = const.MEMBERS.get(m_col, [0, '#' + ''.join([hex(hash(m_col) % 256)[2:].zfill(2) for _ in range(3)])])[1]
                 symbol = const.MEMBERS.get(m_col, [0, '#000000'])[0]
                 
-                plot.append(go.Scatter(
+                plot.append(figures.trace('scattergl',
                     name = m_display,  # Use the display name for legend 
                     legendgroup = memb,
                     legendgrouptitle = {'text': memb + ' Cities'}, 
@@ -556,7 +592,7 @@ def update_graph(yaxis_column_name,
             # Check if the column exists in the dataframe
             if column_name in dff.columns:
                 for i in contS:
-                    _c = dff.query('continent == @i')
+                    _c = index.rows('continent', i, (year_value, year_value))
                     _c = _c[_c[column_name] == True]
                     
                     # Generate a consistent symbol if not in const.MEMBERS
@@ -564,7 +600,7 @@ def update_graph(yaxis_column_name,
                     if column_name in const.MEMBERS:
                         symbol = const.MEMBERS[column_name][0]
                     
-                    plot.append(go.Scatter(
+                    plot.append(figures.trace('scattergl',
                         name = i, 
                         legendgroup = memb,
                         legendgrouptitle = {'text': memb + ' Cities'}, 
@@ -574,7 +610,7 @@ def update_graph(yaxis_column_name,
                         customdata = _c['CityCountry'],
                         hovertemplate = "<b>%{customdata}</b><br>" + 'Population: %{x} <br>' + unit_title + ': %{y}',
                         marker = {
-                            'color': cont_dict[i][1], 
+                            'color': styles[i][1], 
                             'symbol': symbol,
                             'size': 10,
                             'line': dict(width=0.8, color=const.DISP['background'])
@@ -587,59 +623,45 @@ def update_graph(yaxis_column_name,
             # If membership is not in our mapping (shouldn't happen), show an empty plot
             print(f"Warning: Unknown membership option '{memb}'")
 
-    fig = go.Figure(data=plot)
-    
-    fig.update_layout(
-        legend = dict(groupclick="toggleitem"),
-        legend_title_text = '',
-        paper_bgcolor = const.DISP['background'],
-        plot_bgcolor = const.DISP['background']
-    )
-    
-    fig.add_trace(
-        go.Scattergl(
-            mode = 'markers',
-            x = city_df['Population'],
-            y = city_df[yaxis_plot],
-            opacity = 1,
-            marker = dict(
-                symbol = 'circle-dot',
-                color = '#FAED26',
-                size = 11,
-                line = dict(
-                    color = const.DISP['text'],
-                    width = 2
-                ),
+    # WebGL for the bulk points, thinned to the point budget (components.lod)
+    lod.thin(plot, window, log_x=xaxis_type != 'Linear')
+
+    # Selected city on top
+    plot.append(figures.trace('scattergl',
+        mode = 'markers',
+        x = city_df['Population'],
+        y = city_df[yaxis_plot],
+        opacity = 1,
+        marker = dict(
+            symbol = 'circle-dot',
+            color = '#FAED26',
+            size = 11,
+            line = dict(
+                color = const.DISP['text'],
+                width = 2
             ),
-            showlegend = False,
-            hoverinfo = 'skip'
-        )
-    )    
-    
+        ),
+        showlegend = False,
+        hoverinfo = 'skip'
+    ))
 
-    fig.update_xaxes(
-        title=x_axis_label, 
-        type='linear' if xaxis_type == 'Linear' else 'log',
-        range=x_range
-    )
-    fig.update_yaxes(title=unit_title)
-    fig.update_layout(
-        margin = {'l': 40, 'b': 40, 't': 10, 'r': 0}, 
-        hovermode = 'closest',
+    # Plain figure dict (components.figures): no graph_objects validation on this hot path
+    return figures.figure(plot, figures.layout(
+        figures.SCATTER,
+        # Keeps the user's zoom while the figure is refined, reset when the axes change
+        uirevision = scatter_revision(yaxis_column_name, xaxis_type, metric, version),
+        xaxis = figures.log_axis(xaxis_type, x_axis_label),
+        yaxis = dict(title = dict(text = unit_title)),
         legend = dict(
+            groupclick = "toggleitem",
+            title = dict(text = ''),
             x = 0,
             y = 1,
             bgcolor = 'rgba(255, 255, 255, 0.5)',
             borderwidth = 0, 
             font = dict(size = 18, color = const.DISP['text'])
         ),
-        font = dict(
-            size = const.FONTSIZE,
-            family = const.FONTFAMILY
-        )
-    )
-    
-    return fig
+    ))
 
 @callback(
     Output('crossfilter-xaxis-type', 'data'),
@@ -657,7 +679,11 @@ def update_pop_timeseries(hoverData, city_sel):
     ctx = dash.callback_context
     input_id = ctx.triggered[0]["prop_id"].split(".")[0]
     city_sel = hoverData['points'][0]['customdata'] if input_id == 'cities-crossfilter-indicator-scatter' and hoverData else city_sel
+    return pop_timeseries_figure(city_sel)
 
+
+@figcache.memoize
+def pop_timeseries_figure(city_sel):
     if not city_sel:
         # Return a default figure with consistent layout
         return go.Figure(layout=go.Layout(
@@ -668,8 +694,9 @@ def update_pop_timeseries(hoverData, city_sel):
             font=dict(size=const.FONTSIZE, family=const.FONTFAMILY)
         ))
 
-    dff = df[df['CityCountry'] == city_sel]
-    if dff.empty:
+    data = data_prep.current()
+    series = data.tensor('DFILT')
+    if city_sel not in series:
         # Return a default figure with consistent layout
         return go.Figure(layout=go.Layout(
             height=325,
@@ -679,13 +706,13 @@ def update_pop_timeseries(hoverData, city_sel):
             font=dict(size=const.FONTSIZE, family=const.FONTFAMILY)
         ))
 
-    country_name = dff['CityCountry'].iloc[0]
+    country_name = city_sel
     
     title_add = f"<b>{country_name}</b>"
 
     fig = go.Figure(go.Scatter(
-        x=dff['Year'], 
-        y=dff['Population'],
+        x=series.years, 
+        y=series.series('Population', city_sel),
         name='Population',
         hovertemplate="<b>Year: </b>%{x}<br><b>Population: </b>%{y:,}<extra></extra>",
         mode='lines+markers'
@@ -704,6 +731,7 @@ def update_pop_timeseries(hoverData, city_sel):
     fig.update_layout(
         height=325,  # Fixed height
         margin={'l': 60, 'b': 30, 'r': 10, 't': 10},
+        legend=dict(orientation='h', x=0, y=1, yanchor='bottom', font=dict(size=10)),
         paper_bgcolor=const.DISP['background'],
         plot_bgcolor=const.DISP['background'],
         font=dict(
@@ -736,7 +764,34 @@ def update_pol_timeseries(hoverData, yaxis_column_name, city_sel, version, metri
     ctx = dash.callback_context
     input_id = ctx.triggered[0]["prop_id"].split(".")[0]
     city_sel = hoverData['points'][0]['customdata'] if input_id == 'cities-crossfilter-indicator-scatter' and hoverData else city_sel
-    
+    return pol_timeseries_figure(yaxis_column_name, city_sel, version, metric)
+
+
+def continent_traces(data, city_sel, column, version):
+    """Population-weighted mean and interquartile band of the city's continent (MEAN_CONT), behind its series."""
+    table = data.MEAN_CONT_V2 if version == '2' else data.MEAN_CONT
+    index = data.index(data.DFILT)
+    pos = index.positions('CityCountry', city_sel)
+    continent = index.frame['continent'].iloc[pos[0]] if len(pos) else None
+    if pd.isna(continent) or 'w_' + column not in table:
+        return []
+    cont = data.index(table).rows('continent', str(continent))
+    low, high = ('w{:g}_{}'.format(q * 100, column) for q in data_prep.CONT_QUANTILES)
+    band = dict(x=cont['Year'], mode='lines', line=dict(width=0), hoverinfo='skip', showlegend=False)
+    return [
+        go.Scatter(y=cont[high], **band),
+        go.Scatter(y=cont[low], fill='tonexty', fillcolor='rgba(172, 59, 97, 0.15)', **band),
+        go.Scatter(x=cont['Year'], y=cont['w_' + column], name=f'{continent} (population-weighted)',
+                   mode='lines', line=dict(color='#AC3B61', dash='dash'),
+                   customdata=np.stack((cont[low], cont[high]), axis=-1),
+                   hovertemplate=(f"<b>{continent}</b><br><b>Mean: </b>%{{y:.4f}}<br>"
+                                  "<b>25th-75th percentile: </b>%{customdata[0]:.4f} - %{customdata[1]:.4f}"
+                                  "<extra></extra>")),
+    ]
+
+
+@figcache.memoize
+def pol_timeseries_figure(yaxis_column_name, city_sel, version, metric):
     if not city_sel or not yaxis_column_name:
         # Return a default figure with consistent layout
         return go.Figure(layout=go.Layout(
@@ -747,8 +802,9 @@ def update_pol_timeseries(hoverData, yaxis_column_name, city_sel, version, metri
             font=dict(size=const.FONTSIZE, family=const.FONTFAMILY)
         ))
 
-    dff = df[df['CityCountry'] == city_sel]
-    if dff.empty:
+    data = data_prep.current()
+    series = data.tensor('DFILT')
+    if city_sel not in series:
         # Return a default figure with consistent layout
         return go.Figure(layout=go.Layout(
             height=325,
@@ -758,8 +814,6 @@ def update_pol_timeseries(hoverData, yaxis_column_name, city_sel, version, metri
             font=dict(size=const.FONTSIZE, family=const.FONTFAMILY)
         ))
 
-    country_name = dff['CityCountry'].iloc[0]
-    
     # Determine which column to plot based on metric and pollutant
     if metric == 'Concentration':
         # Version-dependent concentration mapping
@@ -775,18 +829,18 @@ def update_pol_timeseries(hoverData, yaxis_column_name, city_sel, version, metri
         axis_plot = metric + '_' + yaxis_column_name
         ytitle = metric
 
-    title_add = f"<b>{country_name}</b>"
-    fig = go.Figure(go.Scatter(
-        x=dff['Year'], 
-        y=dff[axis_plot],
-        name=ytitle,
+    fig = go.Figure(continent_traces(data, city_sel, axis_plot, version) + [go.Scatter(
+        x=series.years, 
+        y=series.series(axis_plot, city_sel),
+        name=city_sel,
         hovertemplate=f"<b>Year: </b>%{{x}}<br><b>{ytitle}: </b>%{{y:.4f}}<extra></extra>",
         mode='lines+markers'
-    ))
+    )])
     
     fig.update_traces(
         line=dict(color='#123C69'),  # Use a consistent color
-        marker=dict(color='#123C69', size=8))
+        marker=dict(color='#123C69', size=8),
+        selector=dict(name=city_sel))
     fig.update_xaxes(
         showgrid=True, 
         title='')
@@ -796,6 +850,7 @@ def update_pol_timeseries(hoverData, yaxis_column_name, city_sel, version, metri
     fig.update_layout(
         height=325,  # Fixed height
         margin={'l': 60, 'b': 30, 'r': 10, 't': 10},
+        legend=dict(orientation='h', x=0, y=1, yanchor='bottom', font=dict(size=10)),
         paper_bgcolor=const.DISP['background'],
         plot_bgcolor=const.DISP['background'],
         font=dict(
@@ -818,4 +873,14 @@ def sync_input(city_sel, hoverData):
     input_id = ctx.triggered[0]["prop_id"].split(".")[0]
     if input_id == 'cities-crossfilter-indicator-scatter' and hoverData:
         return hoverData['points'][0]['customdata']
-    return city_sel
\ No newline at end of file
+    return city_sel
+
+
+# Options of the city dropdown: matches of the typed text (components.search) and the selected city
+@callback(
+    Output("cities-CityS", "options"),
+    [Input("cities-CityS", "search_value"),
+     Input("cities-CityS", "value")]
+)
+def search_cities(search_value, city_sel):
+    return search.options(data_prep.current().search(), search_value, city_sel)
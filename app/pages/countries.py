@@ -5,13 +5,12 @@ import plotly.express as px
 import plotly.graph_objects as go
 import plotly.io as pio
 import dash
-import copy
 import dash_bootstrap_components as dbc
 from dash import callback, dcc, html
 from dash.dependencies import Input, Output, State
 
 # Import custom components
-from components import buttons, const, data_prep
+from components import buttons, const, data_prep, figcache, figures, lod, schema, search
 
 # Register the page for Dash
 dash.register_page(__name__)
@@ -19,10 +18,6 @@ dash.register_page(__name__)
 # Set default Plotly template
 pio.templates.default = "simple_white"
 
-# Load preprocessed data
-df = data_prep.DFILT
-fmean, fmax, fmin = data_prep.MEAN, data_prep.MAX, data_prep.MIN
-fmean_v2, fmax_v2, fmin_v2 = data_prep.MEAN_V2, data_prep.MAX_V2, data_prep.MIN_V2
 
 
 
@@ -118,45 +113,48 @@ pollutant_selector = html.Div([
 ], className="control-group")
 
 metrics = buttons.health_metrics('country')  # Using 'country' as a unique identifier
+weighting = buttons.pop_weighted('country')
 
 # Year dropdown
-year_selector = html.Div([
-    html.H6("Year", style={
-        'margin-bottom': '5px',
-        'font-weight': 'bold',
-        'color': '#000000',
-        'font-size': '18px',
-        'font-family': 'helvetica'
-    }),
-    dcc.Dropdown(
-        id='country-year-dropdown',
-        options=[{'label': str(year), 'value': year} for year in sorted(df['Year'].unique())],
-        value=2019,
-        style={'color': '#123C69', 'font-size': '14px'},
-        clearable=False
-    )
-], className="control-group")
+def year_selector(frame):
+    return html.Div([
+        html.H6("Year", style={
+            'margin-bottom': '5px',
+            'font-weight': 'bold',
+            'color': '#000000',
+            'font-size': '18px',
+            'font-family': 'helvetica'
+        }),
+        dcc.Dropdown(
+            id='country-year-dropdown',
+            options=[{'label': str(year), 'value': year} for year in sorted(frame['Year'].unique())],
+            value=2019,
+            style={'color': '#123C69', 'font-size': '14px'},
+            clearable=False
+        )
+    ], className="control-group")
 
 # X-axis scale selector
 lin_log = buttons.lin_log('country')
 
 # Country dropdown
-country_dropdown = html.Div([
-    html.H6("Country", style={
-        'margin-bottom': '5px',
-        'font-weight': 'bold',
-        'color': '#000000',
-        'font-size': '18px',
-        'font-family': 'helvetica'
-    }),
-    dcc.Dropdown(
-        id='country-s',
-        options=sorted(df["Country"].unique()),
-        value='United States',
-        style={'color': '#123C69', 'font-size': '14px'},
-        clearable=False
-    )
-], className="control-group")
+def country_dropdown(frame):
+    return html.Div([
+        html.H6("Country", style={
+            'margin-bottom': '5px',
+            'font-weight': 'bold',
+            'color': '#000000',
+            'font-size': '18px',
+            'font-family': 'helvetica'
+        }),
+        dcc.Dropdown(
+            id='country-s',
+            options=data_prep.current().hierarchy(frame).countries(),
+            value='United States',
+            style={'color': '#123C69', 'font-size': '14px'},
+            clearable=False
+        )
+    ], className="control-group")
 
 # City dropdown
 city_dropdown = html.Div([
@@ -169,7 +167,8 @@ city_dropdown = html.Div([
     }),
     dcc.Dropdown(
         id='city-s',
-        options=sorted(df["CityCountry"].unique()),
+        # Filled as the user types (search_city); the callbacks below only send the country's top cities
+        options=['Washington D.C., United States (860)'],
         value='Washington D.C., United States (860)',
         style={'color': '#123C69', 'font-size': '14px'}
     )
@@ -234,20 +233,6 @@ title_section = dbc.Row([
     )
 ], justify="center", align="center")
 
-# Left column controls - Modified to make buttons fill the width
-left_controls = html.Div([
-    dbc.Row([
-        dbc.Col(version_selector, lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
-        dbc.Col(pollutant_selector, lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
-        dbc.Col(metrics, lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"})
-    ], className="mb-3", style={"marginLeft": "0", "marginRight": "0", "display": "flex", "flexWrap": "wrap"}),
-    
-    dbc.Row([
-        dbc.Col(country_dropdown, lg=6, md=6, sm=12, style={"paddingRight": "5px", "paddingLeft": "5px"}),
-        dbc.Col(year_selector, lg=6, md=6, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
-    ], className="mb-3", style={"marginLeft": "0", "marginRight": "0", "display": "flex", "flexWrap": "wrap"})
-], className="control-panel", style={"padding": "15px", "display": "block"})
-
 # Left column main content
 left_main_content = html.Div([
     dbc.Row([
@@ -263,17 +248,6 @@ left_main_content = html.Div([
         "backgroundColor": "transparent"})
 ])
 
-# Complete left column
-left_column = dbc.Col([
-    html.H4("Country Pollution Map", className="mb-3 mt-1 text-center",
-            style={"color": "#123C69", "fontFamily": "Helvetica, Arial, sans-serif",
-                  "fontWeight": "bold", "borderBottom": "2px solid #123C69",
-                  "paddingBottom": "10px", "fontSize": "25px"}),
-    left_controls,
-    left_main_content
-], lg=7, md=12, sm=12, className="pe-4 two-column-divider")
-
-
 # Right column controls
 right_controls = dbc.Row([
     dbc.Col(city_dropdown, lg=12, md=12, sm=12, style={"paddingRight": "5px", "paddingLeft": "5px"})
@@ -337,23 +311,46 @@ right_column = dbc.Col([
     right_main_content
 ], lg=5, md=12, sm=12, className="ps-4")
 
-# Two-column section
-two_column_section = dbc.Row([
-    left_column,
-    right_column
-], className="mt-3", style={"height": "1000px"})
-
-# Final layout
-layout = dbc.Container([
-    version_store,
-    title_section,
-    two_column_section
-], fluid=True)
-
-
-
-
-
+# Final layout, built per page visit so the year and country choices follow the current dataset version
+def layout():
+    frame = data_prep.current().DFILT
+
+    # Left column controls - Modified to make buttons fill the width
+    left_controls = html.Div([
+        dbc.Row([
+            dbc.Col(version_selector, lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
+            dbc.Col(pollutant_selector, lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
+            dbc.Col(metrics, lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"})
+        ], className="mb-3", style={"marginLeft": "0", "marginRight": "0", "display": "flex", "flexWrap": "wrap"}),
+
+        dbc.Row([
+            dbc.Col(country_dropdown(frame), lg=4, md=4, sm=12, style={"paddingRight": "5px", "paddingLeft": "5px"}),
+            dbc.Col(year_selector(frame), lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
+            dbc.Col(weighting, lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
+        ], className="mb-3", style={"marginLeft": "0", "marginRight": "0", "display": "flex", "flexWrap": "wrap"})
+    ], className="control-panel", style={"padding": "15px", "display": "block"})
+
+    # Complete left column
+    left_column = dbc.Col([
+        html.H4("Country Pollution Map", className="mb-3 mt-1 text-center",
+                style={"color": "#123C69", "fontFamily": "Helvetica, Arial, sans-serif",
+                      "fontWeight": "bold", "borderBottom": "2px solid #123C69",
+                      "paddingBottom": "10px", "fontSize": "25px"}),
+        left_controls,
+        left_main_content
+    ], lg=7, md=12, sm=12, className="pe-4 two-column-divider")
+
+    # Two-column section
+    two_column_section = dbc.Row([
+        left_column,
+        right_column
+    ], className="mt-3", style={"height": "1000px"})
+
+    return dbc.Container([
+        version_store,
+        title_section,
+        two_column_section
+    ], fluid=True)
 
 
 # === CALLBACKS ===
@@ -427,12 +424,10 @@ def chained_callback_city(country, hover_data):
     ctx = dash.callback_context
     trigger_id = ctx.triggered[0]["prop_id"].split(".")[0]
     
-    dff = copy.deepcopy(df)
-    if country is not None:
-        dff = dff.query("Country == @country")
+    data = data_prep.current()
     
     # Get all cities for the selected country
-    city_options = sorted(dff["CityCountry"].unique())
+    city_options = data.hierarchy(data.DFILT).cities(country)
     
     # Determine which city to select
     if trigger_id == "cities-scatter" and hover_data is not None:
@@ -443,17 +438,22 @@ def chained_callback_city(country, hover_data):
                 hovered_city = hover_data['points'][0]['customdata'][0]
                 # Check if the hovered city is in the options
                 if hovered_city in city_options:
-                    return city_options, hovered_city
+                    return search.options(data.search(), '', hovered_city, country), hovered_city
     
     # Default behavior when not triggered by hover or if hovered city isn't valid
-    return city_options, city_options[0] if city_options else None
+    city = city_options[0] if city_options else None
+    return search.options(data.search(), '', city, country), city
 
 
-def get_version_data(version):
+def get_version_data(version, data=None):
+    # One handle per call so all four tables come from the same dataset version.
+    # Each table comes with its row index (components.lookup); the full table is .frame
+    data = data or data_prep.current()
     if version == '1':
-        return data_prep.DFILT, data_prep.MEAN, data_prep.MAX, data_prep.MIN
+        tables = data.DFILT, data.MEAN, data.MAX, data.MIN
     else:  # version == '2'
-        return data_prep.DFILT_V2, data_prep.MEAN_V2, data_prep.MAX_V2, data_prep.MIN_V2
+        tables = data.DFILT_V2, data.MEAN_V2, data.MAX_V2, data.MIN_V2
+    return tuple(data.index(t) for t in tables)
 
 
 
@@ -465,21 +465,33 @@ def get_version_data(version):
      Input('country-year-dropdown', 'value'),
      Input('country-s','value'),
      Input('health-metricscountry','value'),
-     Input('country-version-store', 'data')]
+     Input('country-version-store', 'data'),
+     Input('crossfilter-data-typecountry', 'value')]
 )
-def update_graph(pollutant, year_value, countryS, metric, version):
+def update_graph(pollutant, year_value, countryS, metric, version, data_type='Unweighted'):
+    # Map of the year is cached (and pre-rendered, components.prerender); the selected country is outlined on top
+    if version == '2':
+        metric = 'Concentration'
+    fig = map_figure(pollutant, year_value, metric, version, data_type)
+    return figcache.outline(fig, [countryS], dict(width=2.3, color='#3d3d3d'))
+
+
+@figcache.memoize
+def map_figure(pollutant, year_value, metric, version, data_type='Unweighted'):
     # Get appropriate datasets based on version
     DFILT_V, MEAN_V, MAX_V, MIN_V = get_version_data(version)
     
     # Get the column to plot based on version and metric
     plot_column = data_prep.get_column_name(version, metric, pollutant)
+    if data_type == 'Population Weighted':
+        plot_column = 'w_' + plot_column  # precomputed in data_prep.find_stats
     
     # Force 'Concentration' metric for Version 2 (as it doesn't have health metrics)
     if version == '2':
         metric = 'Concentration'
     
     # Query data for the selected year
-    m = MEAN_V.query('Year == @year_value').copy()
+    m = MEAN_V.years(year_value).copy()
     
     # Set display units based on pollutant and version
     unit_s = pollutant
@@ -487,7 +499,7 @@ def update_graph(pollutant, year_value, countryS, metric, version):
     # Format text and set color scale limits based on pollutant, metric and version
     if version == '1':
         if 'CO2' in plot_column:
-            maxx = 4e6
+            maxx = 50e6 if 'w_' in plot_column else 4e6
             m['text'] = '<b>'+m['Country'] + '</b><br>'+const.UNITS['Concentration'][unit_s]+': '+ round((m[plot_column].astype(float)/1000000),3).astype(str) + 'M'
         else:
             m['text'] = '<b>'+m['Country'] + '</b><br>'+const.UNITS[metric][unit_s]+': '+ m[plot_column].round(2).astype(str)
@@ -520,23 +532,6 @@ def update_graph(pollutant, year_value, countryS, metric, version):
         zmax=maxx
     ))
     
-    # Add highlight for selected country
-    ctry = m.query('Country ==@countryS')
-    fig.add_traces(data=go.Choropleth(
-        locations = ctry['Country'],
-        locationmode = 'country names',
-        z = ctry[plot_column],
-        hoverinfo='skip',
-        colorscale=const.CS[metric],
-        zmin=0,
-        zmax=maxx,
-        marker = dict(
-            line=dict(           # Fix: Use "line" not "ine"
-                width=2.3,       # Increased width for better visibility
-                color='#3d3d3d',   # White border that will contrast with any color
-        ))))
-    
-    
     # Update layout
     fig.update_geos(showframe=False)
     fig.update_layout(
@@ -580,10 +575,22 @@ def update_graph(pollutant, year_value, countryS, metric, version):
         Input('country-s', 'value'),
         Input('city-s', 'value'),
         Input('health-metricscountry', 'value'),
-        Input('country-version-store', 'data')
+        Input('country-version-store', 'data'),
+        Input('cities-scatter', 'relayoutData')
     ]
 )
-def update_scatter_plot(hoverData, pollutant, xaxis_type, year_value, countryS, cityS, metric, version):
+def update_scatter_plot(hoverData, pollutant, xaxis_type, year_value, countryS, cityS, metric, version, relayout=None):
+    # Get data for the selected country
+    ctx = dash.callback_context
+    input_id = ctx.triggered[0]["prop_id"].split(".")[0]
+    country_name = hoverData['points'][0]['customdata'] if input_id == 'shaded-map' else countryS
+    # Refine to the zoomed range when the zoom changed (components.lod)
+    window = lod.view(relayout) if ctx.triggered[0]["prop_id"] == 'cities-scatter.relayoutData' else None
+    return scatter_plot_figure(country_name, pollutant, xaxis_type, year_value, cityS, metric, version, window)
+
+
+@figcache.memoize
+def scatter_plot_figure(country_name, pollutant, xaxis_type, year_value, cityS, metric, version, window=None):
     # Get appropriate datasets
     DFILT_V, MEAN_V, MAX_V, MIN_V = get_version_data(version)
     
@@ -594,15 +601,9 @@ def update_scatter_plot(hoverData, pollutant, xaxis_type, year_value, countryS,
     # Get the column to plot
     plot_column = data_prep.get_column_name(version, metric, pollutant)
     
-    # Get data for the selected country
-    ctx = dash.callback_context
-    input_id = ctx.triggered[0]["prop_id"].split(".")[0]
-    country_name = hoverData['points'][0]['customdata'] if input_id == 'shaded-map' else countryS
-    
     # Filter data for year and city
-    dff = DFILT_V[DFILT_V['Country'] == country_name]
-    dff = dff.query('Year == @year_value')
-    city_df = dff.query('CityCountry == @cityS')
+    dff = DFILT_V.rows('Country', country_name, (year_value, year_value))
+    city_df = dff[dff['CityCountry'] == cityS]
     
     # Set title and units based on version
     unit_s = pollutant
@@ -625,9 +626,9 @@ def update_scatter_plot(hoverData, pollutant, xaxis_type, year_value, countryS,
         # Handle different hover data for Version 1 vs Version 2
         if version == '1' and metric != 'Concentration':
             # For Version 1 with health metrics, include PAF and Cases in hover
-            customdata = np.stack((_c['CityCountry'], _c[pollutant], 
-                                  _c.get(f'PAF_{pollutant}', np.zeros(len(_c))), 
-                                  _c.get(f'Cases_{pollutant}', np.zeros(len(_c)))), axis=-1)
+            customdata = np.stack((_c['CityCountry'], schema.widen(_c[pollutant]), 
+                                  schema.widen(_c.get(f'PAF_{pollutant}', np.zeros(len(_c)))), 
+                                  schema.widen(_c.get(f'Cases_{pollutant}', np.zeros(len(_c))))), axis=-1)
             hovertemplate = ("<b>%{customdata[0]}</b><br>" + 
                             'Population: %{x} <br>' + 
                             f"{const.UNITS['Concentration'][unit_s]}: " + '%{customdata[1]} <br>' + 
@@ -635,7 +636,7 @@ def update_scatter_plot(hoverData, pollutant, xaxis_type, year_value, countryS,
                             f"{const.UNITS['Cases'][unit_s]}: " + '%{customdata[3]}')
         else:
             # For Version 2 or Concentration metric, simpler hover data
-            customdata = np.stack((_c['CityCountry'], _c[plot_column]), axis=-1)
+            customdata = np.stack((_c['CityCountry'], schema.widen(_c[plot_column])), axis=-1)
             
             if version == '1':
                 hovertemplate = ("<b>%{customdata[0]}</b><br>" + 
@@ -647,7 +648,7 @@ def update_scatter_plot(hoverData, pollutant, xaxis_type, year_value, countryS,
                                 f"{const.UNITS_V2['Concentration'][unit_s]}: " + '%{customdata[1]} <br>')
         
         # Add scatter trace
-        plot.append(go.Scatter(
+        plot.append(figures.trace('scattergl',
             name=const.COUNTRY_SCATTER[i]['name'],
             x=_c['Population'],
             y=_c[plot_column],
@@ -661,73 +662,50 @@ def update_scatter_plot(hoverData, pollutant, xaxis_type, year_value, countryS,
             }
         ))
     
-    # Create the figure
-    fig = go.Figure(data=plot)
+    # WebGL for the bulk points, thinned to the point budget when a country has very many cities
+    lod.thin(plot, window, log_x=xaxis_type != 'Linear')
     
     # Highlight selected city
     if not city_df.empty:
-        fig.add_trace(
-            go.Scattergl(
-                mode='markers',
-                x=city_df['Population'],
-                y=city_df[plot_column],
-                customdata=np.stack((city_df['CityCountry'], city_df[plot_column]), axis=-1),
-                opacity=1,
-                marker=dict(
-                    symbol='circle-open-dot',
-                    color='#FAED26',
-                    size=10,
-                    line=dict(width=2)
-                ),
-                showlegend=False,
-                hoverinfo='skip'
-            )
-        )
-    
-    # Update layout
-    if xaxis_type == 'Log':
-        x_range = [0, 8] 
-    else:
-        x_range = [0, 50_000_000] 
-        
-    fig.update_xaxes(
-        title='Population',
-        type='linear' if xaxis_type == 'Linear' else 'log',
-        range=x_range
-    )
-    
-    fig.update_yaxes(title=units_display)
+        plot.append(figures.trace('scattergl',
+            mode='markers',
+            x=city_df['Population'],
+            y=city_df[plot_column],
+            customdata=np.stack((city_df['CityCountry'], city_df[plot_column]), axis=-1),
+            opacity=1,
+            marker=dict(
+                symbol='circle-open-dot',
+                color='#FAED26',
+                size=10,
+                line=dict(width=2)
+            ),
+            showlegend=False,
+            hoverinfo='skip'
+        ))
     
-    fig.update_layout(
+    # Plain figure dict (components.figures): no graph_objects validation on this hot path
+    return figures.figure(plot, figures.layout(
+        figures.SCATTER,
         height=325,
-        margin={'l': 40, 'b': 40, 't': 10, 'r': 0},
-        hovermode='closest',
-        legend_title_text='',
-        legend_x=1,
-        legend_y=0,
-        paper_bgcolor=const.DISP['background'],
-        plot_bgcolor=const.DISP['background'],
-        font=dict(
-            size=const.FONTSIZE,
-            family=const.FONTFAMILY
-        )
-    )
-    
-    fig.add_annotation(
-        x=0,
-        y=0.9,
-        xanchor='left',
-        yanchor='bottom',
-        xref='paper',
-        yref='paper',
-        showarrow=False,
-        align='left',
-        bgcolor='rgba(255, 255, 255, 0.5)',
-        text=title,
-        font=dict(size=12)
-    )
-    
-    return fig
+        # Keeps the user's zoom while the figure is refined, reset when the axes or the country change
+        uirevision='{}|{}|{}'.format(country_name, plot_column, xaxis_type),
+        xaxis=figures.log_axis(xaxis_type, 'Population'),
+        yaxis=dict(title=dict(text=units_display)),
+        legend=dict(title=dict(text=''), x=1, y=0),
+        annotations=[dict(
+            x=0,
+            y=0.9,
+            xanchor='left',
+            yanchor='bottom',
+            xref='paper',
+            yref='paper',
+            showarrow=False,
+            align='left',
+            bgcolor='rgba(255, 255, 255, 0.5)',
+            text=title,
+            font=dict(size=12)
+        )],
+    ))
 
 
 
@@ -881,13 +859,6 @@ def create_time_series_v2(city, means, title, cityname, axiscol_name, units):
     ]
 )
 def update_timeseries(cityName, country_name, pollutant, cityS, metric, version):
-    # Get appropriate datasets
-    DFILT_V, MEAN_V, MAX_V, MIN_V = get_version_data(version)
-    
-    # Force 'Concentration' metric for Version 2 (as it doesn't have health metrics)
-    if version == '2' and metric != 'Concentration':
-        metric = 'Concentration'
-    
     # Handle city selection from hover data
     ctx = dash.callback_context
     input_id = ctx.triggered[0]["prop_id"].split(".")[0]
@@ -899,18 +870,30 @@ def update_timeseries(cityName, country_name, pollutant, cityS, metric, version)
             city_sel = cityS
     else:
         city_sel = cityS
+    return timeseries_figure(city_sel, country_name, pollutant, metric, version)
+
+
+@figcache.memoize
+def timeseries_figure(city_sel, country_name, pollutant, metric, version):
+    # Get appropriate datasets
+    data = data_prep.current()
+    DFILT_V, MEAN_V, MAX_V, MIN_V = get_version_data(version, data)
+    
+    # Force 'Concentration' metric for Version 2 (as it doesn't have health metrics)
+    if version == '2' and metric != 'Concentration':
+        metric = 'Concentration'
     
     # Get column to plot
     plot_column = data_prep.get_column_name(version, metric, pollutant)
     units = pollutant
     
-    # Get data for selected city
-    city = DFILT_V[DFILT_V.CityCountry == city_sel][plot_column]
-    
     # Get country data
-    _df = MEAN_V[MEAN_V['Country'] == country_name][['Year', plot_column]]
-    _df['Minimum'] = MIN_V[MIN_V['Country'] == country_name][plot_column]
-    _df['Maximum'] = MAX_V[MAX_V['Country'] == country_name][plot_column]
+    _df = MEAN_V.rows('Country', country_name)[['Year', plot_column]]
+    _df['Minimum'] = MIN_V.rows('Country', country_name)[plot_column]
+    _df['Maximum'] = MAX_V.rows('Country', country_name)[plot_column]
+    
+    # Selected city at the country's years: one row of the city x year arrays
+    city = data.tensor('DFILT' if version == '1' else 'DFILT_V2').series_at(plot_column, city_sel, _df['Year'])
     
     # Create time series based on version
     if version == '1':
@@ -928,18 +911,24 @@ def update_timeseries(cityName, country_name, pollutant, cityS, metric, version)
     prevent_initial_call=True
 )
 def update_city_dropdown(country, version):
-    # Get appropriate dataset
-    DFILT_V, _, _, _ = get_version_data(version)
-    
-    # Filter cities for selected country
-    if country is not None:
-        dff = DFILT_V.query("Country == @country")
-    else:
-        dff = DFILT_V
+    # Cities of the selected country in the version's table
+    data = data_prep.current()
+    cities = data.hierarchy(data.DFILT if version == '1' else data.DFILT_V2).cities(country)
         
-    # Return sorted list of cities and select first one
-    cities = sorted(dff["CityCountry"].unique())
-    return cities, cities[0] if cities else None
+    # Select the first city; the options are the country's top cities (search_city)
+    city = cities[0] if cities else None
+    return search.options(data.search(), '', city, country), city
+
+# Options of the city dropdown while typing: matches within the selected country (components.search)
+@callback(
+    Output("city-s", "options", allow_duplicate=True),
+    Input("city-s", "search_value"),
+    [State("country-s", "value"),
+     State("city-s", "value")],
+    prevent_initial_call=True
+)
+def search_city(search_value, country, city):
+    return search.options(data_prep.current().search(), search_value, city, country)
 
 @callback(
     Output('health-metricscountry', 'options', allow_duplicate=True),
@@ -1,23 +1,21 @@
+import json
+from urllib.parse import urlencode
+
 import dash
+from dash.exceptions import PreventUpdate
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from dash import Input, Output, dcc, html, callback, dash_table, State
 import dash_bootstrap_components as dbc
-from components import buttons, const, data_prep
-import copy
+from components import buttons, const, data_prep, figcache, geobin, partitions, schema, search, tablequery
 
 # ---------------------------------------------------
 # INITIALIZE RESOURCES AND DATA
 # ---------------------------------------------------
 dash.register_page(__name__, path='/')
 
-# Load data
-cb = pd.read_csv('https://raw.githubusercontent.com/anenbergresearch/app-files/main/Codebook.csv')
-df = data_prep.DFILT
-pc_df = data_prep.DF_CHANGE
-
 # Define limits and mappings
 conc = {'CO2': 15e6, 'NO2': 20, 'O3': 75, 'PM': 100}
 conc_v2 = {'CO2': 10, 'NO2': 20, 'O3': 75, 'PM': 100} #for version 2 
@@ -98,6 +96,8 @@ title_section = dbc.Row([
 # 1. MAP TAB COMPONENTS
 # Version tracking - Used to store active version
 version_store = dcc.Store(id='version-store', data='1')
+# Geo view of the world map, merged from its relayoutData (components.geobin.track)
+map_view_store = dcc.Store(id='welcome-map-view', data={})
 
 # Version selector component
 version_selector = html.Div([
@@ -176,6 +176,9 @@ pollutant_selector = html.Div([
 # Health metrics selector
 metrics = buttons.health_metrics('home')
 
+# Every city, or population-weighted bins until zoomed in (components.geobin)
+map_mode = buttons.map_mode('home')
+
 # Map graphs
 graph = dcc.Graph(
     id='welcome-map',
@@ -199,7 +202,6 @@ graph = dcc.Graph(
         'modeBarButtonsToRemove': ['select2d', 'lasso2d']  # Optionally remove some default buttons
     }
 )
-slider = buttons.sliders(df)
 
 # 2. PERCENT CHANGE TAB COMPONENTS
 pc_graph = dcc.Graph(
@@ -226,20 +228,21 @@ pc_graph = dcc.Graph(
 )
 
 # 3. CODEBOOK TAB COMPONENTS
-table = html.Div(
-    [
-        html.H4("Data Codebook", style={'fontFamily': 'Helvetica Neue, Helvetica, Arial, sans-serif'}),
-        html.P("(* Use the button below to download the full dataset.)", 
-               style={'fontSize': '0.8em', 'fontFamily': '"Helvetica Neue", Helvetica, Arial, sans-serif'}
-        ),
-        dash_table.DataTable(
-            id="table",
-            columns=[{"name": i, "id": i} for i in cb.columns],
-            data=cb.to_dict("records"),
-            style_cell=dict(textAlign="left"),
-        ),
-    ]
-)
+def table():
+    return html.Div(
+        [
+            html.H4("Data Codebook", style={'fontFamily': 'Helvetica Neue, Helvetica, Arial, sans-serif'}),
+            html.P("(* Use the button below to download the full dataset.)", 
+                   style={'fontSize': '0.8em', 'fontFamily': '"Helvetica Neue", Helvetica, Arial, sans-serif'}
+            ),
+            dash_table.DataTable(
+                id="table",
+                columns=[{"name": i, "id": i} for i in data_prep.CODEBOOK.columns],
+                data=data_prep.CODEBOOK.to_dict("records"),
+                style_cell=dict(textAlign="left"),
+            ),
+        ]
+    )
 
 download = html.Div(
     [
@@ -263,24 +266,25 @@ tt = dbc.Tooltip(
 )
 
 # 4. DATA DOWNLOAD TAB COMPONENTS
-country_dropdown = dbc.Col(
-    [
-        html.Label("Country:", style={
-            'fontWeight': 'bold',
-            'color': 'black',
-            'fontFamily': 'Helvetica, Arial, sans-serif',
-            'marginBottom': '5px', 'fontSize': '15px'
-        }),
-        dcc.Dropdown(
-            id='CountrySe',
-            options=sorted(df["Country"].unique()),
-            value='United States',
-            clearable=False,
-            style={'color': '#123C69'}
-        )
-    ],
-    width=3  # Equal width (4 columns of width 3 = 12 total)
-)
+def country_dropdown(frame):
+    return dbc.Col(
+        [
+            html.Label("Country:", style={
+                'fontWeight': 'bold',
+                'color': 'black',
+                'fontFamily': 'Helvetica, Arial, sans-serif',
+                'marginBottom': '5px', 'fontSize': '15px'
+            }),
+            dcc.Dropdown(
+                id='CountrySe',
+                options=data_prep.current().hierarchy(frame).countries(),
+                value='United States',
+                clearable=False,
+                style={'color': '#123C69'}
+            )
+        ],
+        width=3  # Equal width (4 columns of width 3 = 12 total)
+    )
 
 city_dropdown = dbc.Col(
     [
@@ -292,7 +296,8 @@ city_dropdown = dbc.Col(
         }),
         dcc.Dropdown(
             id='CitySe',
-            options=sorted(df["CityCountry"].unique()),
+            # Filled as the user types (search_city)
+            options=['Washington D.C., United States (860)'],
             value='Washington D.C., United States (860)',
             clearable=False,
             style={'color': '#123C69'}
@@ -343,34 +348,76 @@ year_to_dropdown = dbc.Col(
     width=3
 )
 
-dtable = dash_table.DataTable(
-    id="filtered-data-table",
-    columns=[{"name": i, "id": i} for i in df.columns],
-    sort_action="native",
-    page_size=10,
-    style_table={"overflowX": "auto"},
-    css=[ # Use !important to override default styles
-        {
-            'selector': 'td.dash-cell',
-            'rule': 'font-size: 17px !important; padding: 1px !important;'
-        },
-        {
-            'selector': 'th.dash-header',
-            'rule': 'font-size: 17px !important; padding: 1px !important; '
-        },
-        {
-            'selector': '.dash-spreadsheet',
-            'rule': 'font-family: Helvetica, Arial, sans-serif !important;'
-        },
-        {
-            'selector': '.dash-cell-value',
-            'rule': 'font-size: 17px !important;'
-        }
-    ]
-)
+# Column groups shown in the table and exported (components.schema.COLUMN_GROUPS)
+TABLE_GROUPS = ['Identifiers', 'V1 concentrations', 'V2']
+
+def table_columns(groups):
+    """DataTable columns of the city table that belong to ``groups``."""
+    frame = data_prep.current().DFILT
+    return [{"name": i, "id": i, "type": 'numeric' if pd.api.types.is_numeric_dtype(frame[i]) else 'text'}
+            for i in schema.group_columns(frame.columns, groups)]
 
-download_button = dbc.Button("Download Filtered CSV", id="download-button", color='secondary')
-download_component = dcc.Download(id="download-filtered-data")
+def column_chooser(frame):
+    return html.Div([
+        html.Label("Columns:", style={
+            'fontWeight': 'bold',
+            'color': 'black',
+            'fontFamily': 'Helvetica, Arial, sans-serif',
+            'marginBottom': '5px', 'fontSize': '15px'
+        }),
+        dcc.Checklist(
+            id='column-groups',
+            options=[g for g in schema.COLUMN_GROUPS if schema.group_columns(frame.columns, [g])],
+            value=TABLE_GROUPS,
+            inline=True,
+            inputStyle={'marginRight': '5px', 'marginLeft': '15px'}
+        )
+    ])
+
+def dtable():
+    return dash_table.DataTable(
+        id="filtered-data-table",
+        columns=table_columns(TABLE_GROUPS),
+        # Filtered, sorted and paged in update_table (components.tablequery); the table only holds the page on screen
+        page_action="custom",
+        sort_action="custom",
+        filter_action="custom",
+        page_current=0,
+        page_size=10,
+        style_table={"overflowX": "auto"},
+        css=[ # Use !important to override default styles
+            {
+                'selector': 'td.dash-cell',
+                'rule': 'font-size: 17px !important; padding: 1px !important;'
+            },
+            {
+                'selector': 'th.dash-header',
+                'rule': 'font-size: 17px !important; padding: 1px !important; '
+            },
+            {
+                'selector': '.dash-spreadsheet',
+                'rule': 'font-family: Helvetica, Arial, sans-serif !important;'
+            },
+            {
+                'selector': '.dash-cell-value',
+                'rule': 'font-size: 17px !important;'
+            }
+        ]
+    )
+
+# The button links to the streamed export of the selection (index.py, components.export)
+download_format = dbc.RadioItems(
+    id='download-format',
+    className="btn-group",
+    inputClassName="btn-check",
+    labelClassName="btn btn-outline-secondary",
+    labelCheckedClassName="selected-button",
+    options=[{'label': label, 'value': fmt} for label, fmt in [('CSV', 'csv'), ('Parquet', 'parquet'), ('Excel', 'xlsx')]],
+    value='csv',
+    labelStyle={'display': 'inline-block'}
+)
+download_button = dbc.Button("Download Filtered Data", id="download-button", color='secondary',
+                             href='/export', external_link=True)
 
 # 6. ABOUT TAB COMPONENTS
 about_acc = html.Div(
@@ -428,25 +475,27 @@ about_acc = html.Div(
 # LAYOUT
 # ---------------------------------------------------
 
-# Main layout with all tabs
-layout = dbc.Container([
-    version_store,  # Add store for version tracking
-    title_section,
-    html.Hr(),
-    dbc.Tabs([
-        dbc.Tab(label='Map', tab_id='welcome_map',style={'font-color':'blue'}),
-        dbc.Tab(label='Percent Change', tab_id='percent_change'),
-        dbc.Tab(label='Data Codebook', tab_id='codebook'),
-        dbc.Tab(label='Data Download', tab_id='download'),
-        dbc.Tab(label='About', tab_id='about'),
-    ],
-    id='tabs',
-    active_tab='welcome_map'
-    ),
-    html.Div(id="tab-content", className="p-4"),
-    html.Hr(),
+# Main layout with all tabs, built per page visit like the other pages' layouts
+def layout():
+    return dbc.Container([
+        version_store,  # Add store for version tracking
+        map_view_store,
+        title_section,
+        html.Hr(),
+        dbc.Tabs([
+            dbc.Tab(label='Map', tab_id='welcome_map',style={'font-color':'blue'}),
+            dbc.Tab(label='Percent Change', tab_id='percent_change'),
+            dbc.Tab(label='Data Codebook', tab_id='codebook'),
+            dbc.Tab(label='Data Download', tab_id='download'),
+            dbc.Tab(label='About', tab_id='about'),
+        ],
+        id='tabs',
+        active_tab='welcome_map'
+        ),
+        html.Div(id="tab-content", className="p-4"),
+        html.Hr(),
 
-], fluid=True)
+    ], fluid=True)
 
 # ---------------------------------------------------
 # CALLBACKS BY TAB ORDER
@@ -523,13 +572,42 @@ def reset_health_metrics_on_version_change(version):
     [Input('version-store', 'data'),
      Input('pollutant-selector', 'value'),
      Input('crossfilter-year--slider', 'value'),
-     Input('health-metricshome', 'value')]
+     Input('health-metricshome', 'value'),
+     Input('map-modehome', 'value'),
+     Input('welcome-map-view', 'data')]
 )
-def generate_combined_graph(version, pollutant, year_value, metric):
+def generate_combined_graph(version, pollutant, year_value, metric, mode='Cities', view=None):
+    # The visible area only matters to the aggregated display (single cities once zoomed in);
+    # in the Cities display a zoom or pan needs no new figure
+    triggered = {t['prop_id'] for t in dash.callback_context.triggered}
+    if triggered == {'welcome-map-view.data'} and mode != 'Aggregated':
+        raise PreventUpdate
+    window = geobin.view(view) if mode == 'Aggregated' else None
+    return world_map(version, pollutant, year_value, metric, mode, window)
+
+
+@callback(
+    Output('welcome-map-view', 'data'),
+    Input('welcome-map', 'relayoutData'),
+    State('welcome-map-view', 'data'),
+    prevent_initial_call=True
+)
+def track_world_view(relayout, view):
+    new = geobin.track(view, relayout)
+    if new == view:
+        raise PreventUpdate
+    return new
+
+
+@figcache.memoize
+def world_map(version, pollutant, year_value, metric, mode='Cities', window=None):
     if not pollutant or not metric or not year_value:
         return go.Figure()  # Return empty figure if anything missing
 
-    plot = df.query('Year == @year_value').copy()
+    data = data_prep.current()
+    plot = data.index(data.DFILT).years(year_value)
+    if window is not None:
+        plot = geobin.within(plot, window)
 
     if version == '1':
         # Use standard metric logic
@@ -546,8 +624,32 @@ def generate_combined_graph(version, pollutant, year_value, metric):
         limits = m_limits_v2
         unit_label = const.UNITS_V2[metric][pollutant] 
 
-    # Prepare hover text
-    plot['Text'] = '<b>' + plot['CityCountry'] + '</b><br>' + unit_label + ': ' + plot[axis_plot].round(2).astype(str)
+    # Hover: only the city name goes per point, the rest is in the template
+    hovertemplate = '<b>%{text}</b><br>' + unit_label + ': %{marker.color:.2~f}<extra></extra>'
+
+    # Aggregated display: population-weighted bins until the visible area holds few enough cities
+    if mode == 'Aggregated' and (window is None or len(plot) > geobin.CITY_POINTS):
+        b = data.bins().years(year_value).dropna(subset=[axis_plot])
+        if window is not None:
+            b = geobin.within(b, window)
+        fig = go.Figure(data=go.Scattergeo(
+            lon=b['Longitude'],
+            lat=b['Latitude'],
+            text=b['Cities'],
+            hovertemplate='<b>%{text} cities</b><br>' + unit_label + ' (population-weighted): %{marker.color:.2~f}<extra></extra>',
+            name='Cities (binned)',
+            marker=dict(
+                colorscale=const.CS[metric],
+                cmin=0,
+                color=b[axis_plot],
+                symbol='square',
+                line_width=0,
+                cmax=limits[metric][pollutant],
+                colorbar_title=dict(text=unit_label, side='right'),
+                size=np.clip(3 + 2 * np.sqrt(b['Cities']), 4, 18)
+            )
+        ))
+        return _world_layout(fig)
 
     # Separate C40 and non-C40
     p1 = plot[plot['C40'] == False].copy().dropna(subset=[axis_plot])
@@ -557,8 +659,8 @@ def generate_combined_graph(version, pollutant, year_value, metric):
     fig = go.Figure(data=go.Scattergeo(
         lon=p1['Longitude'],
         lat=p1['Latitude'],
-        text=p1['Text'],
-        hoverinfo='text',
+        text=p1['CityCountry'],
+        hovertemplate=hovertemplate,
         name='Non-C40 Cities',
         marker=dict(
             colorscale=const.CS[metric],
@@ -575,8 +677,8 @@ def generate_combined_graph(version, pollutant, year_value, metric):
     fig.add_trace(go.Scattergeo(
         lon=p2['Longitude'],
         lat=p2['Latitude'],
-        text=p2['Text'],
-        hoverinfo='text',
+        text=p2['CityCountry'],
+        hovertemplate=hovertemplate,
         name='C40 Cities',
         marker=dict(
             colorscale=const.CS[metric],
@@ -591,6 +693,11 @@ def generate_combined_graph(version, pollutant, year_value, metric):
         )
     ))
 
+    return _world_layout(fig)
+
+
+def _world_layout(fig):
+    # Layout shared by the city and the binned map
     fig.update_layout(
         legend=dict(
             bgcolor=const.DISP['fades'],
@@ -619,7 +726,9 @@ def generate_combined_graph(version, pollutant, year_value, metric):
         legend_title_text=' * Click to isolate cities  ',
         margin={'l': 40, 'b': 40, 't': 10, 'r': 0},
         hovermode='closest',
-        font=dict(size=const.FONTSIZE, family=const.FONTFAMILY)
+        font=dict(size=const.FONTSIZE, family=const.FONTFAMILY),
+        # Keep the user's zoom when the map is redrawn for the visible area
+        uirevision='world'
     )
 
     fig.update_geos(showframe=False)
@@ -632,6 +741,7 @@ def generate_combined_graph(version, pollutant, year_value, metric):
     [Input('pollutant-selector', 'value'),
      Input('version-store', 'data')]
 )
+@figcache.memoize
 def generate_pcgraph(pollutant, version):
     """
     Generate the percent change map based on selected pollutant and version
@@ -643,21 +753,22 @@ def generate_pcgraph(pollutant, version):
     Returns:
         go.Figure: Plotly figure object with the percent change map
     """
+    data = data_prep.current()
     # Get the appropriate column based on version and pollutant
     if version == '1':
         # Use standard column for Version 1
         yaxis_column_name = V1_COLUMN_MAPPING[pollutant]
-        plot = data_prep.DF_CHANGE
+        plot = data.DF_CHANGE
         unit_label = const.UNITS_PC[pollutant]
 
     else:
         # Use V2 column for Version 2
         yaxis_column_name = V2_COLUMN_MAPPING[pollutant]
-        plot = data_prep.DF_CHANGE_V2
+        plot = data.DF_CHANGE_V2
         unit_label = const.UNITS_PC_V2[pollutant]  
               
-    plot['Text'] = '<b>' + plot['CityCountry'] + '</b><br>' + unit_label + ': ' + plot[
-        yaxis_column_name].round(2).astype(str)
+    # Hover text built by plotly.js from the city name and the marker color (the change)
+    hovertemplate = '<b>%{text}</b><br>' + unit_label + ': %{marker.color:.2f}<extra></extra>'
     
     # Separate C40 and non-C40 cities
     p1 = plot[plot['C40'] == False].copy().dropna(subset=[yaxis_column_name])
@@ -667,8 +778,8 @@ def generate_pcgraph(pollutant, version):
     fig = go.Figure(data=go.Scattergeo(
         lon=p1['Longitude'],
         lat=p1['Latitude'],
-        text=p1['Text'],
-        hoverinfo='text',
+        text=p1['CityCountry'],
+        hovertemplate=hovertemplate,
         name='Non-C40 Cities',
         marker=dict(
             colorscale=[[0, '#072aed'], [0.5, 'white'],
@@ -685,8 +796,8 @@ def generate_pcgraph(pollutant, version):
     fig.add_trace(go.Scattergeo(
         lon=p2['Longitude'],
         lat=p2['Latitude'],
-        text=p2['Text'],
-        hoverinfo='text',
+        text=p2['CityCountry'],
+        hovertemplate=hovertemplate,
         name='C40 Cities',
         marker=dict(
             colorscale=[[0, 'blue'], [0.5, 'white'],
@@ -736,52 +847,106 @@ def generate_pcgraph(pollutant, version):
     return fig
 
 # 4. DATA DOWNLOAD TAB CALLBACKS
-# Creates dropdown list based on selected country
+# Clears the city when the country changes
 @callback(
-    [Output("CitySe", "options"),
-     Output("CitySe", "value")],
+    Output("CitySe", "value"),
     Input("CountrySe", "value")
 )
 def chained_callback_city(country):
-    dff = copy.deepcopy(df)
-    if country is not None:
-        dff = dff.query("Country == @country")
-    return sorted(dff["CityCountry"].unique()), None
+    return None
 
-# Filter data table
+# City options: matches of the typed text within the selected country (components.search)
 @callback(
-    Output("download-filtered-data", "data"),
-    Input("download-button", "n_clicks"),
-    State("filtered-data-table", "derived_virtual_data"),
-    prevent_initial_call=True,
+    Output("CitySe", "options"),
+    [Input("CitySe", "search_value"),
+     Input("CountrySe", "value")],
+    State("CitySe", "value")
 )
-def download_data(n_clicks, data):
-    if not data:
-        return None
-    dff = pd.DataFrame(data)
-    return dcc.send_data_frame(dff.to_csv, "filtered_csv.csv")
+def search_city(search_value, country, city):
+    if "CountrySe.value" in {t['prop_id'] for t in dash.callback_context.triggered}:
+        city = None
+    return search.options(data_prep.current().search(), search_value, city, country)
 
-@callback(
-    Output("filtered-data-table", "data"),
-    [Input('year-from-dropdown', "value"),
-     Input('year-to-dropdown', "value"),
-     Input('CountrySe', "value"),
-     Input('CitySe', "value")],
-)
-def update_table(year_from, year_to, country, city):
+def selection(year_from, year_to, country, city):
+    """
+    Data Download selection, before the table's own filter and sort.
+
+    Returns:
+        tuple: (the city table, positions of the selected rows in it)
+    """
     # Ensure year_from is not greater than year_to
     if year_from > year_to:
         year_from, year_to = year_to, year_from
-        
+    data = data_prep.current()
+    index = data.index(data.DFILT)
     if city is None and country is not None:
-        dff = df.query('Country==@country')
+        rows = index.positions('Country', country, (year_from, year_to))
     elif city is not None:
-        dff = df.query('CityCountry==@city')
+        rows = index.positions('CityCountry', city, (year_from, year_to))
     else:
-        dff = df.copy()
-    
-    dff = dff[dff.Year.between(year_from, year_to)]
-    return dff.to_dict("records")
+        rows = index.year_positions(year_from, year_to)
+    return index.frame, rows
+
+# Link of the download button: the whole selection, filtered and sorted like the table
+@callback(
+    Output("download-button", "href"),
+    [Input('year-from-dropdown', "value"),
+     Input('year-to-dropdown', "value"),
+     Input('CountrySe', "value"),
+     Input('CitySe', "value"),
+     Input('download-format', "value"),
+     Input("filtered-data-table", "filter_query"),
+     Input("filtered-data-table", "sort_by"),
+     Input('column-groups', "value")],
+)
+def download_link(year_from, year_to, country, city, fmt, filter_query, sort_by, groups):
+    frame = data_prep.current().DFILT
+    columns = schema.group_columns(frame.columns, groups)
+    every_column = len(columns) == len(frame.columns)
+    # A country, a year or everything, unfiltered and with every column, is a ready-made file
+    if city is None and not filter_query and not sort_by and every_column:
+        url = partitions.url(data_prep.current().version, fmt, country, tuple(sorted((year_from, year_to))))
+        if url is not None:
+            return url
+    params = dict(format=fmt, year_from=year_from, year_to=year_to, country=country, city=city,
+                  filter=filter_query, sort=json.dumps(sort_by) if sort_by else None,
+                  columns=None if every_column else ','.join(columns))
+    return '/export?' + urlencode({k: v for k, v in params.items() if v})
+
+# One page of the table
+@callback(
+    [Output("filtered-data-table", "data"),
+     Output("filtered-data-table", "page_count"),
+     Output("filtered-data-table", "page_current")],
+    [Input('year-from-dropdown', "value"),
+     Input('year-to-dropdown', "value"),
+     Input('CountrySe', "value"),
+     Input('CitySe', "value"),
+     Input("filtered-data-table", "page_current"),
+     Input("filtered-data-table", "page_size"),
+     Input("filtered-data-table", "sort_by"),
+     Input("filtered-data-table", "filter_query"),
+     Input('column-groups', "value")],
+)
+def update_table(year_from, year_to, country, city, page_current=0, page_size=10, sort_by=None, filter_query='',
+                 groups=TABLE_GROUPS):
+    # Back to the first page when the selection, filter or sort changes
+    triggered = {t['prop_id'] for t in dash.callback_context.triggered}
+    if not triggered & {'filtered-data-table.page_current', 'column-groups.value'}:
+        page_current = 0
+    frame, selected = selection(year_from, year_to, country, city)
+    rows, page_count, page_current = tablequery.page(frame, filter_query, sort_by, page_current, page_size or 10,
+                                                     selected)
+    # Only the chosen columns of the page are widened and serialized
+    rows = schema.widen(rows[schema.group_columns(rows.columns, groups)])
+    return rows.to_dict("records"), page_count, page_current
+
+@callback(
+    Output("filtered-data-table", "columns"),
+    Input('column-groups', "value")
+)
+def update_table_columns(groups):
+    return table_columns(groups)
 
 @callback(
     [Output('year-to-dropdown', 'options'),
@@ -833,12 +998,13 @@ def render_tab_content(active_tab):
                 html.Div([
                     version_selector,
                     pollutant_selector,
-                    metrics
+                    metrics,
+                    map_mode
                 ], className="control-panel"),
                 
                 # Map and slider remain the same
                 dbc.Row(graph),
-                dbc.Row(dbc.Col(slider))
+                dbc.Row(dbc.Col(buttons.sliders(data_prep.current().DFILT)))
             ]
         
         # 2. PERCENT CHANGE TAB    
@@ -858,7 +1024,7 @@ def render_tab_content(active_tab):
                 dbc.Stack([
                     dbc.Row(tt), 
                     dbc.Row(html.Hr()), 
-                    dbc.Row(dbc.Col(table)),
+                    dbc.Row(dbc.Col(table())),
                     dbc.Row(download), 
                 ], gap=2)
             )]
@@ -891,14 +1057,15 @@ def render_tab_content(active_tab):
                     )
                 ),
                 dbc.Row([
-                    country_dropdown,
+                    country_dropdown(data_prep.current().DFILT),
                     city_dropdown,
                     year_from_dropdown,
                     year_to_dropdown
                 ], className="mb-4"),  
-                dbc.Row(dtable),
-                dbc.Row(download_button),
-                dbc.Row(download_component)
+                dbc.Row(column_chooser(data_prep.current().DFILT)),
+                dbc.Row(dtable()),
+                dbc.Row(download_format),
+                dbc.Row(download_button)
             ], gap=2)
 
         # 6. ABOUT TAB
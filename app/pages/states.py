@@ -8,36 +8,23 @@ from dash import Dash, callback, dcc, html
 import dash_bootstrap_components as dbc 
 from dash.dependencies import Input, Output, State
 import dash
-from components import buttons, const, data_prep
+from dash.exceptions import PreventUpdate
+from components import buttons, const, data_prep, figcache, figures, geobin, geometry, schema
 
 dash.register_page(__name__)
 
 countries = ['United States', 'China', 'India']
-feature_id = {'China': 'properties.NAME_1', 'India': 'properties.st_nm'}
-
-# Import dictionary with geojson of states
-states_df = data_prep.STATES_DF
-
-# Import dictionary with state applied dataframes
-df = data_prep.DF
-
-# Import dictionary with mean region values of pollutants
-mean_df = data_prep.MEAN_DF
-
-# Import dataframe with stats for each state
-stats = data_prep.STATS
-c_gjson = data_prep.GJSON
+feature_id = {i: 'properties.' + p for i, p in data_prep.GJSON_ID.items()}
 
 # Added version store for tracking active version
 version_store = dcc.Store(id='state-version-store', data='1')
-
-# Add support for version 2 data
-stats_v2 = data_prep.STATS_V2 if hasattr(data_prep, 'STATS_V2') else stats
-df_v2 = data_prep.DF_V2 if hasattr(data_prep, 'DF_V2') else df
-mean_df_v2 = data_prep.MEAN_DF_V2 if hasattr(data_prep, 'MEAN_DF_V2') else mean_df
+# Geo view of the state map (components.geobin.track) and the level of detail of its shapes
+map_view_store = dcc.Store(id='state-map-view', data={})
+map_level_store = dcc.Store(id='state-map-level', data=geometry.DEFAULT_LEVEL)
 
 # Set up UI components with unique IDs for states page
 metrics = buttons.health_metrics('state')
+weighting = buttons.pop_weighted('state')
 
 # Version selector component
 version_selector = html.Div([
@@ -136,57 +123,60 @@ region_selector = html.Div([
 ], className="control-group")
 
 # Year dropdown
-year_selector = html.Div([
-    html.H6("Year", style={
-        'margin-bottom': '5px',
-        'font-weight': 'bold',
-        'color': '#000000',
-        'font-size': '18px',
-        'font-family': 'helvetica'
-    }),
-    dcc.Dropdown(
-        id='state-year-dropdown',
-        options=[{'label': str(year), 'value': year} for year in sorted(df['United States']['Year'].unique())],
-        value=2019,
-        style={'color': '#123C69', 'font-size': '14px'},
-        clearable=False
-    )
-], className="control-group")
+def year_selector(frame):
+    return html.Div([
+        html.H6("Year", style={
+            'margin-bottom': '5px',
+            'font-weight': 'bold',
+            'color': '#000000',
+            'font-size': '18px',
+            'font-family': 'helvetica'
+        }),
+        dcc.Dropdown(
+            id='state-year-dropdown',
+            options=[{'label': str(year), 'value': year} for year in sorted(frame['Year'].unique())],
+            value=2019,
+            style={'color': '#123C69', 'font-size': '14px'},
+            clearable=False
+        )
+    ], className="control-group")
 
 # State dropdown
-state_dropdown = html.Div([
-    html.H6("State/province", style={
-        'margin-bottom': '5px',
-        'font-weight': 'bold',
-        'color': '#000000',
-        'font-size': '18px',
-        'font-family': 'helvetica'
-    }),
-    dcc.Dropdown(
-        id='state-s',
-        options=sorted(states_df['United States']['State'].unique()),
-        value='CA',
-        style={'color': '#123C69', 'font-size': '14px'},
-        clearable=False
-    )
-], className="control-group")
+def state_dropdown(frame):
+    return html.Div([
+        html.H6("State/province", style={
+            'margin-bottom': '5px',
+            'font-weight': 'bold',
+            'color': '#000000',
+            'font-size': '18px',
+            'font-family': 'helvetica'
+        }),
+        dcc.Dropdown(
+            id='state-s',
+            options=data_prep.current().hierarchy(frame, 'CityID').states(),
+            value='CA',
+            style={'color': '#123C69', 'font-size': '14px'},
+            clearable=False
+        )
+    ], className="control-group")
 
 # City dropdown
-city_dropdown = html.Div([
-    html.H6("City", style={
-        'margin-bottom': '5px',
-        'font-weight': 'bold',
-        'color': '#000000',
-        'font-size': '18px',
-        'font-family': 'helvetica'
-    }),
-    dcc.Dropdown(
-        id='city-sel',
-        options=sorted(df['United States']["CityID"].unique()),
-        value='Honolulu (1)',
-        style={'color': '#123C69', 'font-size': '14px'}
-    )
-], className="control-group")
+def city_dropdown(frame):
+    return html.Div([
+        html.H6("City", style={
+            'margin-bottom': '5px',
+            'font-weight': 'bold',
+            'color': '#000000',
+            'font-size': '18px',
+            'font-family': 'helvetica'
+        }),
+        dcc.Dropdown(
+            id='city-sel',
+            options=data_prep.current().hierarchy(frame, 'CityID').cities(),
+            value='Honolulu (1)',
+            style={'color': '#123C69', 'font-size': '14px'}
+        )
+    ], className="control-group")
 
 # Define graphs
 main_graph = dcc.Graph(
@@ -259,23 +249,6 @@ title_section = dbc.Row([
     )
 ], justify="center", align="center")
 
-# Left column controls
-left_controls = html.Div([
-    # First row: Version, Pollutant, Metrics
-    dbc.Row([
-        dbc.Col(version_selector, lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
-        dbc.Col(pollutant_selector, lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
-        dbc.Col(metrics, lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
-    ], className="mb-3", style={"marginLeft": "0", "marginRight": "0", "display": "flex", "flexWrap": "wrap"}),
-    
-    # Second row: Region, Year
-    dbc.Row([
-        dbc.Col(region_selector, lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
-        dbc.Col(state_dropdown, lg=4, md=4, sm=12,style={"paddingRight": "2px", "paddingLeft": "2px"}),
-        dbc.Col(year_selector, lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
-    ], className="mb-3", style={"marginLeft": "0", "marginRight": "0", "display": "flex", "flexWrap": "wrap"}),
-])
-
 # Left column main content
 left_main_content = html.Div([
     dbc.Row([
@@ -287,25 +260,6 @@ left_main_content = html.Div([
     ], className="g-0")
 ])
 
-# Complete left column
-left_column = dbc.Col([
-    html.H4("State/province Pollution Map", className="mb-3 mt-1 text-center",
-            style={"color": "#123C69", "fontFamily": "Helvetica, Arial, sans-serif",
-                  "fontWeight": "bold", "borderBottom": "2px solid #123C69",
-                  "paddingBottom": "10px", "fontSize": "25px"}),
-    left_controls,
-    left_main_content
-], lg=7, md=12, sm=12, className="pe-4 two-column-divider")
-
-# Right column controls
-right_controls = dbc.Row([
-    dbc.Col(city_dropdown, lg=12, md=12, sm=12, style={"paddingRight": "5px", "paddingLeft": "5px"})
-], className="mb-3")
-
-right_controls_panel = html.Div([
-    right_controls
-], className="control-panel", style={"padding": "15px", "display": "block"})
-
 graph_stack = dbc.Stack([
     dcc.Graph(
         id='states-scatter',
@@ -348,31 +302,77 @@ right_main_content = dbc.Row([
     )
 ])
 
-# Complete right column
-right_column = dbc.Col([
-    html.H4("Summary for selected state/province & city", className="mb-3 mt-1 text-center", 
-            style={"color": "#123C69", "fontFamily": "Helvetica, Arial, sans-serif", 
-                  "fontWeight": "bold", "borderBottom": "2px solid #123C69", 
-                  "paddingBottom": "10px", "fontSize": "25px"}),
-    right_controls_panel,
-    right_main_content
-], lg=5, md=12, sm=12, className="ps-4")
+# Final layout, built per page visit so the year, state and city choices follow the current dataset version
+def layout():
+    frame = data_prep.current().DF['United States']
+
+    # Left column controls
+    left_controls = html.Div([
+        # First row: Version, Pollutant, Metrics
+        dbc.Row([
+            dbc.Col(version_selector, lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
+            dbc.Col(pollutant_selector, lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
+            dbc.Col(metrics, lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
+        ], className="mb-3", style={"marginLeft": "0", "marginRight": "0", "display": "flex", "flexWrap": "wrap"}),
+
+        # Second row: Region, Year
+        dbc.Row([
+            dbc.Col(region_selector, lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
+            dbc.Col(state_dropdown(frame), lg=4, md=4, sm=12,style={"paddingRight": "2px", "paddingLeft": "2px"}),
+            dbc.Col(year_selector(frame), lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
+        ], className="mb-3", style={"marginLeft": "0", "marginRight": "0", "display": "flex", "flexWrap": "wrap"}),
+
+        # Third row: Unweighted/population-weighted state means
+        dbc.Row([
+            dbc.Col(weighting, lg=4, md=4, sm=12, style={"paddingRight": "2px", "paddingLeft": "2px"}),
+        ], className="mb-3", style={"marginLeft": "0", "marginRight": "0", "display": "flex", "flexWrap": "wrap"}),
+    ])
+
+    # Complete left column
+    left_column = dbc.Col([
+        html.H4("State/province Pollution Map", className="mb-3 mt-1 text-center",
+                style={"color": "#123C69", "fontFamily": "Helvetica, Arial, sans-serif",
+                      "fontWeight": "bold", "borderBottom": "2px solid #123C69",
+                      "paddingBottom": "10px", "fontSize": "25px"}),
+        left_controls,
+        left_main_content
+    ], lg=7, md=12, sm=12, className="pe-4 two-column-divider")
 
-# Two-column section
-two_column_section = dbc.Row([
-    left_column,
-    right_column
-], className="mt-3", style={"height": "1000px"})
+    # Right column controls
+    right_controls = dbc.Row([
+        dbc.Col(city_dropdown(frame), lg=12, md=12, sm=12, style={"paddingRight": "5px", "paddingLeft": "5px"})
+    ], className="mb-3")
 
-# Final layout
-layout = dbc.Container([
-    # Add version store to layout
-    version_store,
-    # Title section
-    title_section,
-    # Two-column section with all controls and graphs
-    two_column_section
-], fluid=True)
+    right_controls_panel = html.Div([
+        right_controls
+    ], className="control-panel", style={"padding": "15px", "display": "block"})
+
+    # Complete right column
+    right_column = dbc.Col([
+        html.H4("Summary for selected state/province & city", className="mb-3 mt-1 text-center", 
+                style={"color": "#123C69", "fontFamily": "Helvetica, Arial, sans-serif", 
+                      "fontWeight": "bold", "borderBottom": "2px solid #123C69", 
+                      "paddingBottom": "10px", "fontSize": "25px"}),
+        right_controls_panel,
+        right_main_content
+    ], lg=5, md=12, sm=12, className="ps-4")
+
+    # Two-column section
+    two_column_section = dbc.Row([
+        left_column,
+        right_column
+    ], className="mt-3", style={"height": "1000px"})
+
+    return dbc.Container([
+        # Add version store to layout
+        version_store,
+        map_view_store,
+        map_level_store,
+        # Title section
+        title_section,
+        # Two-column section with all controls and graphs
+        two_column_section
+    ], fluid=True)
 
 
 
@@ -384,16 +384,19 @@ layout = dbc.Container([
 
 
 # Helper function to get version-specific data
-def get_version_data(version, region):
+def get_version_data(version, region, data=None):
     """Get the appropriate data based on version selection"""
+    # One handle per call so all tables come from the same dataset version.
+    # City and state stats tables come with their row index (components.lookup); the full table is .frame
+    data = data or data_prep.current()
     if version == '1':
-        return df[region], stats[region], mean_df[region]
+        df_v, stats_v, mean_v = data.DF[region], data.STATS[region], data.MEAN_DF[region]
     else:  # version == '2'
         # Handle cases where V2 data might not exist or have different structure
-        df_v = df_v2.get(region, df[region]) if hasattr(data_prep, 'DF_V2') else df[region]
-        stats_v = stats_v2.get(region, stats[region]) if hasattr(data_prep, 'STATS_V2') else stats[region]
-        mean_v = mean_df_v2.get(region, mean_df[region]) if hasattr(data_prep, 'MEAN_DF_V2') else mean_df[region]
-        return df_v, stats_v, mean_v
+        df_v = data.DF_V2.get(region, data.DF[region])
+        stats_v = data.STATS_V2.get(region, data.STATS[region])
+        mean_v = data.MEAN_DF_V2.get(region, data.MEAN_DF[region])
+    return data.index(df_v), {k: data.index(t) for k, t in stats_v.items()}, mean_v
 
 
 # Update state dropdown based on selected region and version
@@ -406,9 +409,11 @@ def get_version_data(version, region):
 )
 def chained_callback_state(country, version):
     # Get appropriate dataset based on version
-    df_data, _, _ = get_version_data(version, country)
+    data = data_prep.current()
+    df_data, _, _ = get_version_data(version, country, data)
     
-    return sorted(df_data['State'].dropna().unique()), sorted(df_data['State'].unique())[0]
+    states = data.hierarchy(df_data.frame, 'CityID').states()
+    return states, states[0]
 
 # Update city dropdown based on selected state and version
 @callback(
@@ -421,10 +426,11 @@ def chained_callback_state(country, version):
 )
 def chained_callback_city(country, state, version):
     # Get appropriate dataset based on version
-    df_data, _, _ = get_version_data(version, country)
+    data = data_prep.current()
+    df_data, _, _ = get_version_data(version, country, data)
     
-    l = df_data[df_data['State'] == state]
-    return sorted(l['CityID'].unique()), sorted(l['CityID'].unique())[0]
+    cities = data.hierarchy(df_data.frame, 'CityID').cities(state=state)
+    return cities, cities[0]
 
 # Version button toggling (based on countries.py)
 @callback(
@@ -459,7 +465,7 @@ def update_year_dropdown(country, version):
     # Get appropriate dataset based on version
     df_data, _, _ = get_version_data(version, country)
     
-    years = sorted(df_data['Year'].unique())
+    years = sorted(df_data.frame['Year'].unique())
     return [{'label': str(year), 'value': year} for year in years], 2019
 
 # Reset health metrics when version changes
@@ -509,20 +515,56 @@ def update_dropdown_options(selected_pollutant, selected_metric, version):
      Input('state-year-dropdown', 'value'),
      Input('state-s', 'value'),
      Input('health-metricsstate', 'value'),
-     Input('state-version-store', 'data')]
+     Input('state-version-store', 'data'),
+     Input('crossfilter-data-typestate', 'value'),
+     Input('state-map-level', 'data')]
 )
-def update_map(region, pollutant, year_value, state, metric, version):
+def update_map(region, pollutant, year_value, state, metric, version, data_type='Unweighted', level=None):
     # Force 'Concentration' metric for Version 2 (as it doesn't have health metrics)
     if version == '2' and metric != 'Concentration':
         metric = 'Concentration'
-    
+    # Finer state shapes when zoomed in; the US map uses plotly's built-in states
+    urls = data_prep.GEOMETRY_URLS.get(region)
+    shapes = urls[level or geometry.DEFAULT_LEVEL] if urls else None
+    # Map of the year is cached (and pre-rendered, components.prerender); the selected state is outlined on top
+    fig = map_figure(region, pollutant, year_value, metric, version, data_type, shapes)
+    return figcache.outline(fig, [state], dict(width=3))
+
+
+# Zooms and pans only reach the map when they change the level of detail
+@callback(
+    [Output('state-map-view', 'data'),
+     Output('state-map-level', 'data')],
+    [Input('shaded-states', 'relayoutData'),
+     Input('region-selection', 'value')],
+    [State('state-map-view', 'data'),
+     State('state-map-level', 'data')],
+    prevent_initial_call=True
+)
+def track_state_view(relayout, region, view, level):
+    if 'region-selection.value' in {t['prop_id'] for t in dash.callback_context.triggered}:
+        # A new region is fitted to its bounds again
+        new_view, new_level = {}, geometry.DEFAULT_LEVEL
+    else:
+        new_view = geobin.track(view, relayout)
+        new_level = geometry.level(new_view)
+    if new_view == view and new_level == level:
+        raise PreventUpdate
+    return (dash.no_update if new_view == view else new_view,
+            dash.no_update if new_level == level else new_level)
+
+
+@figcache.memoize
+def map_figure(region, pollutant, year_value, metric, version, data_type='Unweighted', shapes=None):
+
     # Get plot column based on version
     plot_column = data_prep.get_column_name(version, metric, pollutant)
+    if data_type == 'Population Weighted':
+        plot_column = 'w_' + plot_column  # precomputed in data_prep.find_stats
     
     # Get data for selected year
     df_data, stats_data, _ = get_version_data(version, region)
-    m = stats_data['mean'].query('Year == @year_value').copy()
-    st = m.query('State == @state')
+    m = stats_data['mean'].years(year_value).copy()
     
     unit_s = pollutant
     
@@ -530,7 +572,7 @@ def update_map(region, pollutant, year_value, state, metric, version):
     if version == '1':
         # Version 1 formatting
         if 'CO2' in plot_column:
-            if 'w_' in plot_column:  # We're not using this anymore but kept for compatibility
+            if 'w_' in plot_column:  # population-weighted CO2 is on a larger scale
                 maxx = 50e6
             else:
                 maxx = 7e6
@@ -567,32 +609,22 @@ def update_map(region, pollutant, year_value, state, metric, version):
             z=m[plot_column], hovertext=m['text'], hoverinfo='text',
             colorscale=const.CS[metric], zmin=0, zmax=maxx, 
         ))
-        fig.add_traces(data=go.Choropleth(
-            locations=st['State'], locationmode='USA-states',
-            z=st[plot_column], hoverinfo='skip',
-            colorscale=const.CS[metric],
-            marker=dict(line_width=3), zmin=0, zmax=maxx, 
-        ))
         fig.update_geos(scope='usa')
         
     else:  ##Use the uploaded geojson files for China and India states
         fig = go.Figure(data=go.Choropleth(
-            locations=m["State"], geojson=c_gjson[region], z=m[plot_column],
+            locations=m["State"], geojson=shapes or data_prep.GEOMETRY_URLS[region][geometry.DEFAULT_LEVEL], z=m[plot_column],
             hovertext=m['text'], featureidkey=feature_id[region], hoverinfo='text',
             colorscale=const.CS[metric], zmin=0, zmax=maxx
         ))
-        fig.add_traces(data=go.Choropleth(
-            locations=st['State'], geojson=c_gjson[region], featureidkey=feature_id[region],
-            z=st[plot_column], hoverinfo='skip',
-            colorscale=const.CS[metric], zmin=0, zmax=maxx,
-            marker=dict(line_width=3)
-        ))
         fig.update_geos(fitbounds='locations', visible=False)
     
     fig.update_layout(
         legend_title_text='',
         margin={'l': 10, 'b': 10, 't': 10, 'r': 0},
         hovermode='closest',
+        # Keeps the zoom when a finer level of the shapes is swapped in
+        uirevision=region,
         font=dict(
             size=const.FONTSIZE,
             family=const.FONTFAMILY
@@ -640,20 +672,23 @@ def update_map(region, pollutant, year_value, state, metric, version):
      Input('state-version-store', 'data')]
 )
 def update_scatter_plot(region, hoverData, pollutant, xaxis_type, year_value, stateS, cityS, metric, version):
-    # Force 'Concentration' metric for Version 2 (as it doesn't have health metrics)
-    if version == '2' and metric != 'Concentration':
-        metric = 'Concentration'
-    
     ctx = dash.callback_context
     input_id = ctx.triggered[0]["prop_id"].split(".")[0]
     state_name = hoverData['points'][0]['customdata'] if input_id == 'shaded-states' else stateS
+    return scatter_plot_figure(region, state_name, pollutant, xaxis_type, year_value, cityS, metric, version)
+
+
+@figcache.memoize
+def scatter_plot_figure(region, state_name, pollutant, xaxis_type, year_value, cityS, metric, version):
+    # Force 'Concentration' metric for Version 2 (as it doesn't have health metrics)
+    if version == '2' and metric != 'Concentration':
+        metric = 'Concentration'
     
     # Get appropriate dataset based on version
     df_data, _, _ = get_version_data(version, region)
     
-    dff = df_data[df_data['State'] == state_name]
-    dff = dff.query('Year == @year_value')
-    city_df = dff.query('CityID == @cityS')
+    dff = df_data.rows('State', state_name, (year_value, year_value))
+    city_df = dff[dff['CityID'] == cityS]
     
     # Get column to plot
     unit_s = pollutant
@@ -680,9 +715,9 @@ def update_scatter_plot(region, hoverData, pollutant, xaxis_type, year_value, st
             # Create different hover templates based on version and metric
             if version == '1' and unit_s != 'CO2' and metric != 'Concentration':
                 # For Version 1 with health metrics, include PAF and Cases
-                customdata = np.stack((_c['CityID'], _c[unit_s], 
-                                     _c.get(f'PAF_{unit_s}', np.zeros(len(_c))), 
-                                     _c.get(f'Cases_{unit_s}', np.zeros(len(_c)))), axis=-1)
+                customdata = np.stack((_c['CityID'], schema.widen(_c[unit_s]), 
+                                     schema.widen(_c.get(f'PAF_{unit_s}', np.zeros(len(_c)))), 
+                                     schema.widen(_c.get(f'Cases_{unit_s}', np.zeros(len(_c))))), axis=-1)
                 
                 hover_template = ("<b>%{customdata[0]}</b><br>" + 
                                 'Population: %{x} <br>' + 
@@ -691,13 +726,13 @@ def update_scatter_plot(region, hoverData, pollutant, xaxis_type, year_value, st
                                 f"{const.UNITS['Cases'][unit_s]}: " + '%{customdata[3]}')
             else:
                 # For Version 2 or Concentration metric, simpler hover data
-                customdata = np.stack((_c['CityID'], _c[plot_column]), axis=-1)
+                customdata = np.stack((_c['CityID'], schema.widen(_c[plot_column])), axis=-1)
                 hover_template = ("<b>%{customdata[0]}</b><br>" + 
                                 'Population: %{x} <br>' + 
                                 f"{units_label}: " + '%{customdata[1]} <br>')
             
             # Add scatter trace for this group
-            plot.append(go.Scatter(
+            plot.append(figures.trace('scatter',
                 name=const.COUNTRY_SCATTER[i]['name'],
                 x=_c['Population'],
                 y=_c[plot_column],
@@ -712,68 +747,46 @@ def update_scatter_plot(region, hoverData, pollutant, xaxis_type, year_value, st
                 }
             ))
     
-    # Create figure with the scatter plots
-    fig = go.Figure(data=plot)
-    
     # Add highlighted point for selected city
     if not city_df.empty:
-        fig.add_trace(
-            go.Scattergl(
-                mode='markers',
-                x=city_df['Population'],
-                y=city_df[plot_column],
-                opacity=1,
-                marker=dict(
-                    symbol='circle-open-dot',
-                    color='#FAED26',
-                    size=10,
-                    line=dict(width=2)
-                ),
-                showlegend=False,
-                hoverinfo='skip'
-            )
-        )
+        plot.append(figures.trace('scattergl',
+            mode='markers',
+            x=city_df['Population'],
+            y=city_df[plot_column],
+            opacity=1,
+            marker=dict(
+                symbol='circle-open-dot',
+                color='#FAED26',
+                size=10,
+                line=dict(width=2)
+            ),
+            showlegend=False,
+            hoverinfo='skip'
+        ))
 
-    # Set axis properties
-    if xaxis_type == 'Log':
-        x_range = [0, 8] 
-    else:
-        x_range = [0, 50_000_000]
-            
-    fig.update_xaxes(
-        title='Population', 
-        type='linear' if xaxis_type == 'Linear' else 'log',
-        range=x_range if xaxis_type == 'Log' else None
-    )
-    fig.update_yaxes(title=metric if metric != 'Concentration' else units_label)
+    # Set axis properties (the linear axis autoranges)
+    xaxis = figures.log_axis(xaxis_type, 'Population')
+    if xaxis_type != 'Log':
+        del xaxis['range']
     
-    # Add title annotation
-    fig.add_annotation(
-        x=0, y=0.9,
-        xanchor='left', yanchor='bottom',
-        xref='paper', yref='paper',
-        showarrow=False, align='left',
-        bgcolor='rgba(255, 255, 255, 0.5)',
-        text=title,
-        font=dict(size=12)
-    )
-    
-    # Update layout
-    fig.update_layout(
+    # Plain figure dict (components.figures): no graph_objects validation on this hot path
+    return figures.figure(plot, figures.layout(
+        figures.SCATTER,
         height=325,
-        margin={'l': 40, 'b': 40, 't': 10, 'r': 0},
-        hovermode='closest',
-        legend_title_text='',
-        legend=dict(x=1, y=0),
-        paper_bgcolor=const.DISP['background'],
-        plot_bgcolor=const.DISP['background'],
-        font=dict(
-            size=const.FONTSIZE,
-            family=const.FONTFAMILY
-        )
-    )
-    
-    return fig
+        xaxis=xaxis,
+        yaxis=dict(title=dict(text=metric if metric != 'Concentration' else units_label)),
+        legend=dict(title=dict(text=''), x=1, y=0),
+        # Title annotation
+        annotations=[dict(
+            x=0, y=0.9,
+            xanchor='left', yanchor='bottom',
+            xref='paper', yref='paper',
+            showarrow=False, align='left',
+            bgcolor='rgba(255, 255, 255, 0.5)',
+            text=title,
+            font=dict(size=12)
+        )],
+    ))
 
 
 
@@ -849,38 +862,43 @@ def create_time_series(region, city, means, title, cityname, axiscol_name, metri
      Input('state-version-store', 'data')]
 )
 def update_timeseries(region, cityName, pollutant, cityS, stateS, metric, version):
-    # Force 'Concentration' metric for Version 2
-    if version == '2' and metric != 'Concentration':
-        metric = 'Concentration'
-    
     # Get city selection from hover data if available
     ctx = dash.callback_context
     city_sel = cityS
     if ctx.triggered[0]["prop_id"].split(".")[0] == 'states-scatter':
         if cityName and 'points' in cityName and 'customdata' in cityName['points'][0]:
             city_sel = cityName['points'][0]['customdata'][0]
+    return timeseries_figure(region, city_sel, pollutant, stateS, metric, version)
+
+
+@figcache.memoize
+def timeseries_figure(region, city_sel, pollutant, stateS, metric, version):
+    # Force 'Concentration' metric for Version 2
+    if version == '2' and metric != 'Concentration':
+        metric = 'Concentration'
     
     try:
         # Get data based on version
-        df_data, stats_data, _ = get_version_data(version, region)
+        data = data_prep.current()
+        df_data, stats_data, _ = get_version_data(version, region, data)
         
         # Get column name based on version and metric
         plot_column = data_prep.get_column_name(version, metric, pollutant)
         
         # Get state data
-        state_data = stats_data['mean'][stats_data['mean']['State'] == stateS]
+        state_data = stats_data['mean'].rows('State', stateS)
         if state_data.empty or plot_column not in state_data.columns:
             raise ValueError(f"No data for {stateS} or column {plot_column}")
         
         _df = state_data[['Year', plot_column]].copy()
-        _df['Minimum'] = stats_data['min'][stats_data['min']['State'] == stateS][plot_column]
-        _df['Maximum'] = stats_data['max'][stats_data['max']['State'] == stateS][plot_column]
+        _df['Minimum'] = stats_data['min'].rows('State', stateS)[plot_column]
+        _df['Maximum'] = stats_data['max'].rows('State', stateS)[plot_column]
         
-        # Get city data
+        # Get city data: one row of the city x year arrays, at the state's years
         city = pd.Series()
-        city_rows = df_data[df_data.CityID == city_sel]
-        if not city_rows.empty and plot_column in city_rows.columns:
-            city = city_rows[plot_column]
+        series = data.tensor('DF' if version == '1' else 'DF_V2', region)
+        if city_sel in series and plot_column in series.arrays:
+            city = series.series_at(plot_column, city_sel, _df['Year'])
         
         # Create the time series
         return create_time_series(region, city, _df, stateS, city_sel, pollutant, metric, version)
@@ -934,16 +952,18 @@ def sync_input(state_sel, hoverData):
      State('states-scatter', 'hoverData'),
      State('shaded-states', 'hoverData'),
      State('city-sel', 'value'),
-     State('crossfilter-xaxis-typestate', 'value')],
+     State('crossfilter-xaxis-typestate', 'value'),
+     State('crossfilter-data-typestate', 'value'),
+     State('state-map-level', 'data')],
     prevent_initial_call=True
 )
 def refresh_on_version_change(version, region, pollutant, year_value, state, metric, 
-                             scatter_hover, map_hover, city_sel, xaxis_type):
+                             scatter_hover, map_hover, city_sel, xaxis_type, data_type, level=None):
     # Force update all figures when version changes
     # This will trigger the individual callbacks for each figure
     
     # Main map
-    fig1 = update_map(region, pollutant, year_value, state, metric, version)
+    fig1 = update_map(region, pollutant, year_value, state, metric, version, data_type, level)
     
     # Scatter plot
     fig2 = update_scatter_plot(region, map_hover, pollutant, xaxis_type, 
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from components import aggregate
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(1)
+    n = 500
+    df = pd.DataFrame({
+        'Country': rng.choice(['India', 'China', 'Brazil', None], n),
+        'Year': rng.integers(2000, 2004, n),
+        'Pw_PM': rng.gamma(2.0, 20.0, n),
+        'Population': rng.integers(1000, 10**7, n).astype('float64'),
+    })
+    df.loc[rng.choice(n, 40, replace=False), 'Pw_PM'] = np.nan
+    df.loc[rng.choice(n, 10, replace=False), 'Population'] = np.nan
+    return df
+
+
+def _groups(df):
+    # (key, rows) per group of the engine, in its order
+    return [(k, g) for k, g in df.dropna(subset=['Country']).groupby(['Country', 'Year'], sort=True)]
+
+
+def _weighted_quantile(v, w, q):
+    # Reference: the first value in sorted order at which the cumulative weight reaches q of the total
+    keep = ~np.isnan(v) & ~np.isnan(w)
+    v, w = v[keep], w[keep]
+    order = np.argsort(v, kind='stable')
+    v, cw = v[order], np.cumsum(w[order])
+    return v[min(np.searchsorted(cw, q * cw[-1], side='left'), len(v) - 1)]
+
+
+def test_unweighted_stats_match_pandas(frame):
+    res = aggregate.group_stats(frame, ['Country', 'Year'], ['Pw_PM'], ('mean', 'min', 'max', 'sum', 'count'))
+    g = frame.groupby(['Country', 'Year'])['Pw_PM']
+    for stat in ('mean', 'min', 'max', 'sum', 'count'):
+        expected = getattr(g, stat)().to_numpy('float64')
+        np.testing.assert_allclose(res[stat]['Pw_PM'].to_numpy('float64'), expected, rtol=1e-12)
+    assert list(res['mean'].columns) == ['Country', 'Year', 'Pw_PM']
+
+
+def test_missing_keys_are_dropped(frame):
+    res = aggregate.group_stats(frame, ['Country', 'Year'], ['Pw_PM'])
+    assert res['mean']['Country'].notna().all()
+    assert len(res['mean']) == len(_groups(frame))
+
+
+def test_quantiles_match_numpy(frame):
+    res = aggregate.group_stats(frame, ['Country', 'Year'], ['Pw_PM'], stats=(), quantiles=(0.1, 0.5, 0.9))
+    for q in (0.1, 0.5, 0.9):
+        expected = [np.nanquantile(g['Pw_PM'].to_numpy(), q) for _, g in _groups(frame)]
+        np.testing.assert_allclose(res[q]['Pw_PM'].to_numpy(), expected, rtol=1e-12)
+
+
+def test_weighted_mean_matches_numpy(frame):
+    res = aggregate.group_stats(frame, ['Country', 'Year'], ['Pw_PM'], weights='Population')
+    expected = []
+    for _, g in _groups(frame):
+        keep = g['Pw_PM'].notna() & g['Population'].notna()
+        expected.append(np.average(g['Pw_PM'][keep], weights=g['Population'][keep]))
+    np.testing.assert_allclose(res['mean']['Pw_PM'].to_numpy(), expected, rtol=1e-12)
+
+
+def test_weighted_quantiles_match_reference(frame):
+    res = aggregate.group_stats(frame, ['Country', 'Year'], ['Pw_PM'], stats=(), quantiles=(0.25, 0.5, 0.75),
+                                weights='Population')
+    for q in (0.25, 0.5, 0.75):
+        expected = [_weighted_quantile(g['Pw_PM'].to_numpy(), g['Population'].to_numpy(), q)
+                    for _, g in _groups(frame)]
+        np.testing.assert_array_equal(res[q]['Pw_PM'].to_numpy(), expected)
+
+
+def test_weighted_quantile_follows_the_weights():
+    df = pd.DataFrame({'g': ['a'] * 4 + ['b'] * 4, 'v': [1.0, 2, 3, 4] * 2, 'w': [1.0, 1, 1, 1, 0, 0, 0, 5]})
+    res = aggregate.group_stats(df, ['g'], ['v'], stats=('mean',), quantiles=(0.5,), weights='w')
+    assert res[0.5]['v'].tolist() == [2.0, 4.0]
+    assert res['mean']['v'].tolist() == [2.5, 4.0]
+
+
+def test_group_without_weight_is_nan():
+    df = pd.DataFrame({'g': ['a', 'a', 'b'], 'v': [1.0, 2.0, 3.0], 'w': [0.0, 0.0, 1.0]})
+    res = aggregate.group_stats(df, ['g'], ['v'], quantiles=(0.5,), weights='w')
+    assert np.isnan(res['mean']['v'][0]) and np.isnan(res[0.5]['v'][0])
+    assert res['mean']['v'][1] == 3.0
+
+
+def test_float32_columns_stay_float32(frame):
+    frame = frame.astype({'Pw_PM': 'float32'})
+    res = aggregate.group_stats(frame, ['Country', 'Year'], ['Pw_PM'], ('mean', 'count'))
+    assert res['mean']['Pw_PM'].dtype == 'float32'
+    assert res['count']['Pw_PM'].dtype != 'float32'
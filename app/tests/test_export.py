@@ -0,0 +1,67 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from components import export, schema
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        'City': pd.Categorical(['Delhi', 'Lagos', 'Paris', 'Lima', 'Pune']),
+        'Year': np.array([2018, 2018, 2019, 2019, 2019], dtype='int16'),
+        'Pw_PM': np.array([98.7, 12.3, 0.1, np.nan, 1.5e-4], dtype='float32'),
+        'Population': [3e7, 1.5e7, 2.1e6, 1e7, 3.1e6],
+    })
+
+
+def test_widen_drops_float32_noise(frame):
+    wide = schema.widen(frame)
+    assert wide['Pw_PM'].dtype == 'float64'
+    assert wide['Pw_PM'].tolist()[:3] == [98.7, 12.3, 0.1]
+    assert np.isnan(wide['Pw_PM'][3]) and wide['Pw_PM'][4] == 1.5e-4
+    assert wide['Population'].equals(frame['Population'])
+    assert schema.widen(frame['Pw_PM']).tolist()[1] == 12.3
+    assert schema.widen(frame['Population']) is frame['Population']
+
+
+def test_widen_keeps_seven_digits():
+    values = pd.Series(np.array([123456.7, 1234567.0, 98765.43, 0.0, -2.5e-7, np.inf], dtype='float32'))
+    assert schema.widen(values).tolist() == [123456.7, 1234567.0, 98765.43, 0.0, -2.5e-7, np.inf]
+
+
+def test_chunks_of_rows(frame):
+    parts = list(export.chunks(frame, ['City', 'Pw_PM'], '{Year} = 2019', [{'column_id': 'Pw_PM'}], size=2,
+                               rows=np.array([1, 2, 3, 4])))
+    assert [len(p) for p in parts] == [2, 1]
+    assert pd.concat(parts)['City'].tolist() == ['Pune', 'Paris', 'Lima']
+    assert all(p['Pw_PM'].dtype == 'float64' for p in parts)
+
+
+def test_count(frame):
+    assert export.count(frame, '{Year} = 2019') == 3
+    assert export.count(frame, '{Year} = 2019', np.array([0, 2])) == 1
+
+
+def test_write_csv_has_one_header(frame):
+    text = b''.join(export.write_csv(export.chunks(frame, ['City', 'Pw_PM'], size=2))).decode()
+    lines = text.splitlines()
+    assert lines[0] == 'City,Pw_PM'
+    assert lines[1:] == ['Delhi,98.7', 'Lagos,12.3', 'Paris,0.1', 'Lima,', 'Pune,0.00015']
+
+
+def test_stream_parquet(frame):
+    body = b''.join(export.stream(frame, 'parquet', ['City', 'Pw_PM'], rows=np.array([0, 1])))
+    table = pq.read_table(io.BytesIO(body))
+    assert table.schema.field('Pw_PM').type == pa.float64()
+    assert table.column('Pw_PM').to_pylist() == [98.7, 12.3]
+    assert pq.ParquetFile(io.BytesIO(body)).metadata.num_rows == 2
+
+
+def test_stream_rejects_unknown_formats(frame):
+    with pytest.raises(ValueError):
+        export.stream(frame, 'pdf')
@@ -0,0 +1,83 @@
+import math
+
+import pytest
+
+from components import geometry
+
+# Wiggly border x ~ 1 from y = 0 to y = 1, finer than the coarse tolerance
+BORDER = [(round(1 + 0.004 * math.sin(i * 1.7), 6), round(i / 60, 6)) for i in range(61)]
+
+
+def _feature(name, ring):
+    return {'type': 'Feature', 'properties': {'NAME_1': name, 'extra': 1},
+            'geometry': {'type': 'Polygon', 'coordinates': [[list(p) for p in ring + ring[:1]]]}}
+
+
+@pytest.fixture
+def states():
+    # West goes up the border, east comes down it; an island state stands apart
+    west = [(0.0, 0.0)] + BORDER + [(0.0, 1.0)]
+    east = [BORDER[0], (2.0, 0.0), (2.0, 1.0)] + BORDER[::-1][:-1]
+    island = [(5 + math.cos(a / 20 * math.pi), math.sin(a / 20 * math.pi)) for a in range(40)]
+    return {'type': 'FeatureCollection',
+            'features': [_feature('West', west), _feature('East', east), _feature('Island', island)]}
+
+
+def _points(feature):
+    return {tuple(p) for polygon in geometry._rings(feature['geometry']) for ring in polygon for p in ring}
+
+
+def _border(feature, decimals):
+    border = {(round(x, decimals), round(y, decimals)) for x, y in BORDER}
+    return _points(feature) & border
+
+
+def test_junctions_are_where_three_states_meet(states):
+    topo = geometry._Topology(states['features'])
+    assert topo.junctions == {BORDER[0], BORDER[-1]}
+
+
+def test_neighbours_keep_identical_borders(states):
+    out = geometry.levels(states, 'NAME_1')
+    for name, (tol, decimals) in geometry.LEVELS.items():
+        west, east, _ = out[name]['features']
+        assert _border(west, decimals) == _border(east, decimals), name
+    # The coarse level actually dropped border vertices; the full level kept them
+    assert len(_border(out['coarse']['features'][0], 3)) < len(BORDER)
+    assert len(_border(out['full']['features'][0], 4)) == len(BORDER)
+
+
+def test_shared_arcs_are_simplified_once(states):
+    topo = geometry._Topology(states['features'])
+    rings = dict(topo.simplify(0.02))
+    west = [p for p in rings[(0, 0, 0)] if p in set(BORDER)]
+    east = [p for p in rings[(1, 0, 0)] if p in set(BORDER)]
+    assert set(west) == set(east)
+    assert len(west) < len(BORDER)
+
+
+def test_levels_keep_closed_rings_and_the_id_only(states):
+    out = geometry.levels(states, 'NAME_1')
+    for name in geometry.LEVELS:
+        for feature, source in zip(out[name]['features'], states['features']):
+            assert feature['properties'] == {'NAME_1': source['properties']['NAME_1']}
+            ring = feature['geometry']['coordinates'][0]
+            assert ring[0] == ring[-1] and len(ring) >= 4
+    # The island has no neighbour and is still simplified
+    assert len(out['coarse']['features'][2]['geometry']['coordinates'][0]) < 41
+
+
+def test_level_follows_the_zoom():
+    assert geometry.level(None) == geometry.DEFAULT_LEVEL
+    assert geometry.level({'geo.projection.scale': 3}) == 'medium'
+    assert geometry.level({'geo.projection.scale': 8}) == 'full'
+
+
+def test_assets_are_named_by_content(states):
+    urls, files = geometry.assets({'India': geometry.levels(states, 'NAME_1')})
+    assert set(urls['India']) == set(geometry.LEVELS)
+    for url in urls['India'].values():
+        name = url[len(geometry.ROUTE):]
+        assert name.startswith('india-') and name + '.gz' in files
+    again, _ = geometry.assets({'India': geometry.levels(states, 'NAME_1')})
+    assert again == urls
@@ -0,0 +1,61 @@
+import numpy as np
+
+from components import lod
+
+
+def _traces(n=20000):
+    rng = np.random.default_rng(3)
+    # A dense cloud and a few outliers, in two traces
+    x = np.r_[rng.normal(1e5, 1e4, n), [1e7, 2e7, 3e7]]
+    y = np.r_[rng.normal(30, 3, n), [300, 310, 320]]
+    half = len(x) // 2
+    return [{'x': x[:half], 'y': y[:half], 'customdata': np.arange(half), 'marker': {'size': np.ones(half)}},
+            {'x': x[half:], 'y': y[half:], 'customdata': np.arange(half, len(x)), 'marker': {'color': 'red'}}]
+
+
+def test_thin_to_the_budget_keeping_outliers():
+    traces = lod.thin(_traces(), limit=1000)
+    assert sum(len(t['x']) for t in traces) <= 1000
+    assert {300.0, 310.0, 320.0} <= set(traces[1]['y'])
+    # Per-point properties are cut alike, scalar ones left alone
+    for t in traces:
+        assert len(t['customdata']) == len(t['x']) == len(t['y'])
+    assert len(traces[0]['marker']['size']) == len(traces[0]['x'])
+    assert traces[1]['marker']['color'] == 'red'
+
+
+def test_thin_is_deterministic():
+    a, b = lod.thin(_traces(), limit=1000), lod.thin(_traces(), limit=1000)
+    for ta, tb in zip(a, b):
+        np.testing.assert_array_equal(ta['customdata'], tb['customdata'])
+
+
+def test_under_the_budget_nothing_is_dropped():
+    traces = lod.thin(_traces(100), limit=1000)
+    assert sum(len(t['x']) for t in traces) == 103
+
+
+def test_window_cuts_before_thinning():
+    window = (4.9, 5.1, None, None)  # log10 of the x axis
+    traces = lod.thin(_traces(), window, log_x=True, limit=10**6)
+    x = np.concatenate([t['x'] for t in traces])
+    assert len(x) and ((x >= 10**4.9) & (x <= 10**5.1)).all()
+
+
+def test_view():
+    assert lod.view(None) is None
+    assert lod.view({'autosize': True}) is None
+    assert lod.view({'xaxis.range[0]': 4.12345, 'xaxis.range[1]': 5.6789}) == (4.12, 5.68, None, None)
+    assert lod.view({'xaxis.range': [1, 2], 'yaxis.range': [10, 20]}) == (1, 2, 10, 20)
+
+
+def test_track_keeps_the_range_until_the_revision_changes():
+    view = lod.track(None, {'xaxis.range[0]': 1, 'xaxis.range[1]': 2}, 'a')
+    assert view == {'revision': 'a', 'xaxis.range': [1, 2]}
+    view = lod.track(view, {'yaxis.range[0]': 5, 'yaxis.range[1]': 6}, 'a')
+    assert lod.view(view) == (1, 2, 5, 6)
+    # Nothing changed: the same object, so the callback can skip the update
+    assert lod.track(view, {'autosize': True}, 'a') is view
+    assert lod.track(view, {'xaxis.autorange': True}, 'a') == {'revision': 'a', 'yaxis.range': [5, 6]}
+    assert lod.track(view, {'yaxis.range[0]': 5, 'yaxis.range[1]': 6}, 'b') == {'revision': 'b',
+                                                                                'yaxis.range': [5, 6]}
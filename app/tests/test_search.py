@@ -0,0 +1,60 @@
+import pytest
+
+from components import search
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('São Paulo', 'sao paulo'),
+    ('Łódź', 'lodz'),
+    ('Øresund', 'oresund'),
+    ('Straße', 'strasse'),
+    ('ＴＯＫＹＯ', 'tokyo'),  # full-width letters
+    ('Đà Nẵng', 'da nang'),
+])
+def test_normalize(text, expected):
+    assert search.normalize(text) == expected
+
+
+def test_normalize_keeps_other_scripts_matchable():
+    assert search.normalize('서') in search.normalize('서울')
+    assert search.normalize('北京') == '北京'
+
+
+@pytest.fixture
+def index():
+    names = ['São Paulo, Brazil', 'Paulínia, Brazil', 'Łódź, Poland', 'San Paulo Town, Chile', 'Pau, France',
+             '서울, South Korea', 'Bielsko-Biała, Poland']
+    weights = [12e6, 1e5, 7e5, 1e3, 8e4, 9.7e6, 1.7e5]
+    groups = ['Brazil', 'Brazil', 'Poland', 'Chile', 'France', 'South Korea', 'Poland']
+    return search.Index(names, weights, groups)
+
+
+def test_rank_prefix_then_word_then_anywhere(index):
+    # Whole-name prefixes by population, then word prefixes, then matches inside a word
+    assert index.match('pau') == ['Paulínia, Brazil', 'Pau, France', 'São Paulo, Brazil', 'San Paulo Town, Chile']
+    assert index.match('aulo') == ['São Paulo, Brazil', 'San Paulo Town, Chile']
+
+
+def test_match_as_typed(index):
+    assert index.match('sao paulo') == ['São Paulo, Brazil']
+    assert index.match('LODZ') == ['Łódź, Poland']
+    assert index.match('biala') == ['Bielsko-Biała, Poland']
+    assert index.match('서울') == ['서울, South Korea']
+
+
+def test_no_match(index):
+    assert index.match('xyz') == []
+    # Every bigram occurs, the text doesn't
+    assert index.match('saulo') == []
+
+
+def test_group_and_limit(index):
+    assert index.match('', group='Poland') == ['Łódź, Poland', 'Bielsko-Biała, Poland']
+    assert index.match('pau', group='Brazil') == ['Paulínia, Brazil', 'São Paulo, Brazil']
+    assert index.match('', limit=2) == ['São Paulo, Brazil', '서울, South Korea']
+    assert index.match('p', limit=3) == ['Paulínia, Brazil', 'Pau, France', 'São Paulo, Brazil']
+
+
+def test_options_keep_the_selection(index):
+    assert search.options(index, 'lodz', 'Pau, France') == ['Pau, France', 'Łódź, Poland']
+    assert search.options(index, 'lodz', ['Łódź, Poland']) == ['Łódź, Poland']
@@ -0,0 +1,44 @@
+import os
+
+from components import sharedcache
+
+
+def test_round_trip(tmp_path):
+    cache = sharedcache.DiskCache(str(tmp_path), 2**20)
+    assert cache.get('v1', ('fig', 2019)) is None
+    cache.put('v1', ('fig', 2019), '{"data": []}')
+    assert cache.get('v1', ('fig', 2019)) == '{"data": []}'
+    assert cache.get('v2', ('fig', 2019)) is None
+    assert cache.stats('v1')['entries'] == 1
+
+
+def test_disabled(tmp_path):
+    cache = sharedcache.DiskCache(str(tmp_path), 0)
+    cache.put('v1', 'key', 'text')
+    assert cache.get('v1', 'key') is None
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_a_new_version_removes_the_older_ones(tmp_path):
+    cache = sharedcache.DiskCache(str(tmp_path), 2**20)
+    cache.put('v1', 'key', 'old')
+    # Versions are ordered by when they were first written
+    os.utime(os.path.join(str(tmp_path), 'v1', '.created'), (1, 1))
+    cache.put('v2', 'key', 'new')
+    assert sorted(os.listdir(str(tmp_path))) == ['v2']
+    assert cache.get('v2', 'key') == 'new'
+
+
+def test_least_recently_used_are_evicted(tmp_path):
+    cache = sharedcache.DiskCache(str(tmp_path), 2**20)
+    for i in range(20):
+        cache.put('v1', i, 'x' * 1000)
+        # Distinct, increasing mtimes without sleeping
+        os.utime(cache._path('v1', i), (i, i))
+    os.utime(cache._path('v1', 0), (100, 100))  # read recently
+    cache.max_bytes = 16 * 1000
+    cache._evict('v1')
+    stats = cache.stats('v1')
+    assert stats['bytes'] <= 16 * 1000 * 0.9
+    assert os.path.exists(cache._path('v1', 0))
+    assert not os.path.exists(cache._path('v1', 1))
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from components import tablequery
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        'City': pd.Categorical(['Delhi', 'Łódź', 'delhi north', 'Paris', None]),
+        'Year': np.array([2019, 2019, 2018, 2020, 2019], dtype='int16'),
+        'Pw_PM': np.array([98.5, 20.0, np.nan, 12.25, 40.0], dtype='float32'),
+    })
+
+
+def test_parse():
+    parts = tablequery.parse('{Pw_PM} >= 20 && {City} icontains "del" && {Year} eq 2019 && {City} is blank')
+    assert parts == [('Pw_PM', 'ge', 20.0, True), ('City', 'contains', 'del', False),
+                     ('Year', 'eq', 2019.0, True), ('City', 'is blank', '', True)]
+
+
+def test_parse_skips_what_it_cant_read():
+    assert tablequery.parse('{Pw_PM} >= 20 && nonsense && ') == [('Pw_PM', 'ge', 20.0, True)]
+    assert tablequery.parse(None) == []
+
+
+def test_quoted_operands_stay_text():
+    assert tablequery.parse('{City} = "2019"') == [('City', 'eq', '2019', True)]
+    assert tablequery.parse("{City} = 'it\\'s'") == [('City', 'eq', "it's", True)]
+
+
+def test_mask_numeric(frame):
+    assert tablequery.mask(frame, '{Pw_PM} > 15 && {Year} = 2019').tolist() == [True, True, False, False, True]
+    # NaN fails every comparison
+    assert not tablequery.mask(frame, '{Pw_PM} < 1000')[2]
+    # Text against a number column matches nothing
+    assert not tablequery.mask(frame, '{Pw_PM} = abc').any()
+
+
+def test_mask_text(frame):
+    assert tablequery.mask(frame, '{City} contains Delhi').tolist() == [True, False, False, False, False]
+    assert tablequery.mask(frame, '{City} icontains delhi').tolist() == [True, False, True, False, False]
+    assert tablequery.mask(frame, '{City} datestartswith Pa').tolist() == [False, False, False, True, False]
+    assert tablequery.mask(frame, '{City} is blank').tolist() == [False, False, False, False, True]
+
+
+def test_mask_ignores_unknown_columns(frame):
+    assert tablequery.mask(frame, '{Nope} > 1').all()
+
+
+def test_order_is_stable_with_missing_last(frame):
+    assert tablequery.order(frame, [{'column_id': 'Pw_PM', 'direction': 'asc'}]).tolist() == [3, 1, 4, 0, 2]
+    assert tablequery.order(frame, [{'column_id': 'Pw_PM', 'direction': 'desc'}]).tolist() == [0, 4, 1, 3, 2]
+    assert tablequery.order(frame, [{'column_id': 'Year', 'direction': 'asc'}]).tolist() == [2, 0, 1, 4, 3]
+    assert tablequery.order(frame, []) is None
+
+
+def test_positions(frame):
+    assert tablequery.positions(frame) is None
+    assert tablequery.positions(frame, '{Year} = 2019').tolist() == [0, 1, 4]
+    pos = tablequery.positions(frame, '{Year} = 2019', [{'column_id': 'Pw_PM', 'direction': 'desc'}])
+    assert pos.tolist() == [0, 4, 1]
+
+
+def test_selection_of_rows(frame):
+    rows = np.array([1, 3, 4])
+    # Positions within the selection, and positions in the frame
+    assert tablequery.positions(frame, '{Pw_PM} > 15', rows=rows).tolist() == [0, 2]
+    assert tablequery.selected(frame, '{Pw_PM} > 15', rows=rows).tolist() == [1, 4]
+    assert tablequery.selected(frame, rows=rows) is rows
+    assert tablequery.selected(frame) is None
+    pos = tablequery.selected(frame, None, [{'column_id': 'Pw_PM', 'direction': 'asc'}], rows)
+    assert pos.tolist() == [3, 1, 4]
+
+
+def test_page(frame):
+    rows, count, current = tablequery.page(frame, '{Year} = 2019', None, 1, 2)
+    assert (count, current) == (2, 1)
+    assert rows.index.tolist() == [4]
+    # Past the last page shows the last page
+    rows, count, current = tablequery.page(frame, None, None, 9, 2)
+    assert (count, current) == (3, 2)
+    assert rows.index.tolist() == [4]
+
+
+def test_page_of_rows(frame):
+    rows, count, current = tablequery.page(frame, None, [{'column_id': 'Pw_PM', 'direction': 'asc'}], 0, 2,
+                                           np.array([0, 1, 3]))
+    assert (count, current) == (2, 0)
+    assert rows.index.tolist() == [3, 1]
+
+
+def test_empty_result_has_one_page(frame):
+    rows, count, current = tablequery.page(frame, '{Year} = 1990', None, 0, 10)
+    assert (len(rows), count, current) == (0, 1, 0)